@@ -0,0 +1,196 @@
+"""
+Benchmark for reading the load commands of Mach-O files.
+
+This compares building a ``macholib.MachO.MachO`` object for a file
+and converting that to a ``MachOModel`` with scanning the load commands
+of a memory mapping of the file using ``scan_macho``.
+
+By default the benchmark uses a synthetic corpus of thin and universal
+binaries, which works on any platform. Use ``--path`` to measure with
+the Mach-O files in a directory tree instead, for example a Python
+installation on macOS. Usage::
+
+    $ python benchmarks/bench_macho_scan.py [--files N] [--path DIR]
+"""
+
+import argparse
+import pathlib
+import statistics
+import struct
+import tempfile
+import time
+import typing
+
+from macholib import mach_o
+from macholib.MachO import MachO
+
+from py2app._machofiles import MachOFileTable, MachOModel, scan_macho
+
+CPU_TYPE_X86_64 = 0x01000007
+CPU_TYPE_ARM64 = 0x0100000C
+
+# Size of the __text section in the synthetic binaries
+TEXT_SIZE = 256 * 1024
+
+
+def _lc_str(cmd: int, fields: bytes, value: str) -> bytes:
+    data = value.encode() + b"\0"
+    size = (8 + len(fields) + len(data) + 7) & ~7
+    return struct.pack("<II", cmd, size) + (fields + data).ljust(size - 8, b"\0")
+
+
+def make_macho(cputype: int, idx: int) -> bytes:
+    """
+    Return a 64-bit Mach-O library with a text section and load
+    commands similar to those in a typical extension module.
+    """
+    header_space = 4096
+    segment = struct.pack(
+        "<II16sQQQQiiII",
+        mach_o.LC_SEGMENT_64,
+        72 + 80,
+        b"__TEXT",
+        0,
+        header_space + TEXT_SIZE,
+        0,
+        header_space + TEXT_SIZE,
+        5,
+        5,
+        1,
+        0,
+    ) + struct.pack(
+        "<16s16sQQIIIIIIII",
+        b"__text",
+        b"__TEXT",
+        header_space,
+        TEXT_SIZE,
+        header_space,
+        4,
+        0,
+        0,
+        0,
+        0,
+        0,
+        0,
+    )
+    dylib_fields = struct.pack("<IIII", 24, 2, 0x10000, 0x10000)
+    commands = [
+        segment,
+        _lc_str(mach_o.LC_ID_DYLIB, dylib_fields, f"@rpath/libbench{idx}.dylib"),
+        struct.pack("<IIIIII", mach_o.LC_BUILD_VERSION, 24, 1, 0xB0000, 0xE0000, 0),
+        _lc_str(mach_o.LC_RPATH, struct.pack("<I", 12), "@loader_path/../lib"),
+    ]
+    for name in (
+        "/usr/lib/libSystem.B.dylib",
+        "/usr/lib/libc++.1.dylib",
+        "/System/Library/Frameworks/CoreFoundation.framework/CoreFoundation",
+        "@rpath/libssl.3.dylib",
+        "@rpath/libcrypto.3.dylib",
+        f"@rpath/libdep{idx % 10}.dylib",
+    ):
+        commands.append(_lc_str(mach_o.LC_LOAD_DYLIB, dylib_fields, name))
+
+    body = b"".join(commands)
+    header = struct.pack(
+        "<IiiIIIII",
+        mach_o.MH_MAGIC_64,
+        cputype,
+        0,
+        mach_o.MH_DYLIB,
+        len(commands),
+        len(body),
+        0,
+        0,
+    )
+    return (header + body).ljust(header_space + TEXT_SIZE, b"\0")
+
+
+def make_fat(slices: typing.Sequence[bytes]) -> bytes:
+    """
+    Return a universal binary containing *slices*
+    """
+    header = struct.pack(">II", mach_o.FAT_MAGIC, len(slices))
+    offset = 4096
+    data = b""
+    for contents in slices:
+        (cputype,) = struct.unpack_from("<i", contents, 4)
+        header += struct.pack(">iiIII", cputype, 0, offset, len(contents), 12)
+        data += contents
+        offset += len(contents)
+    return header.ljust(4096, b"\0") + data
+
+
+def make_corpus(root: pathlib.Path, count: int) -> typing.List[pathlib.Path]:
+    """
+    Write *count* binaries to *root*, alternating between
+    thin and universal binaries.
+    """
+    result = []
+    for idx in range(count):
+        if idx % 2:
+            contents = make_fat(
+                [make_macho(CPU_TYPE_X86_64, idx), make_macho(CPU_TYPE_ARM64, idx)]
+            )
+        else:
+            contents = make_macho(CPU_TYPE_ARM64, idx)
+        path = root / f"libbench{idx}.dylib"
+        path.write_bytes(contents)
+        result.append(path)
+    return result
+
+
+def measure(
+    paths: typing.Sequence[pathlib.Path],
+    function: typing.Callable[[pathlib.Path], MachOModel],
+    repeat: int,
+) -> typing.List[float]:
+    """
+    Returns the time for calling *function* for all
+    *paths*, for *repeat* runs.
+    """
+    result = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            function(path)
+        result.append(time.perf_counter() - start)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--path", type=pathlib.Path, default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.path is not None:
+            paths = list(MachOFileTable().iter_files(args.path))
+        else:
+            paths = make_corpus(pathlib.Path(tmpdir), args.files)
+
+        size = sum(path.stat().st_size for path in paths)
+        print(
+            f"{len(paths)} Mach-O files ({size / 1_000_000:.1f} MB), "
+            f"{args.repeat} runs"
+        )
+
+        for path in paths:
+            if scan_macho(path) != MachOModel.from_macho(MachO(str(path))):
+                print(f"Warning: different results for {path}")
+
+        for label, function in (
+            ("macholib", lambda path: MachOModel.from_macho(MachO(str(path)))),
+            ("scan", scan_macho),
+        ):
+            timings = [t * 1000 for t in measure(paths, function, args.repeat)]
+            print(
+                f"{label:>10}: median {statistics.median(timings):8.2f} ms "
+                f"(min {min(timings):8.2f} ms), "
+                f"{statistics.median(timings) * 1000 / len(paths):8.1f} us per file"
+            )
+
+
+if __name__ == "__main__":
+    main()
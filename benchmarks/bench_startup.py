@@ -0,0 +1,251 @@
+"""
+Startup benchmark for the Python part of a bundle.
+
+This lays out the "Contents/Resources" tree for a script the same way
+as py2app does when building a bundle ("python-libraries.zip",
+"lib-dynload", "__preboot__.py" and "__boot__.py"), and then launches
+the bundle code in a fresh interpreter like the bundle launcher does:
+``sys.path`` contains the bundle locations, ``sys.py2app_bundle_resources``
+and ``sys.py2app_argv0`` are set, and the preboot and boot scripts are
+run in the ``__main__`` namespace.
+
+The Mach-O processing that py2app does on macOS is skipped, which means
+this benchmark can be used on Linux as well. It measures the bootstrap
+code and the layout of the library archive, not the launcher itself.
+
+For every run the benchmark records the total wall time, the time
+and the number of newly imported modules for the preboot and boot
+scripts, and the remaining time ("interpreter": starting and stopping
+the interpreter). The results are written as JSON. With ``--baseline`` the results are
+compared with an earlier run and the script exits with status 1 when
+the median wall time for a stage regressed by more than ``--tolerance``
+percent. Usage::
+
+    $ python benchmarks/bench_startup.py --runs 20 --output result.json
+    $ python benchmarks/bench_startup.py --baseline result.json
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+from py2app import _builder, _config
+from py2app._bundlepaths import BundlePaths, bundle_paths
+from py2app._bytecode import BytecodeCompiler
+from py2app._progress import Progress
+from py2app._recipes import process_recipes
+
+DEFAULT_SCRIPT = pathlib.Path(__file__).resolve().parent / "startup_app" / "main.py"
+
+STAGES = ("interpreter", "preboot", "boot")
+
+# Script that emulates the launcher, the startup time of the
+# interpreter is measured by the parent process.
+LAUNCHER_SCRIPT = """\
+import sys, time
+stages = {{"start": time.perf_counter()}}
+modules = {{"start": len(sys.modules)}}
+
+sys.path[:] = {search_path!r}
+sys.py2app_bundle_resources = {resources!r}
+sys.py2app_argv0 = {argv0!r}
+
+import __main__
+for stage in ("preboot", "boot"):
+    path = f"{resources}/__{{stage}}__.py"
+    with open(path) as stream:
+        code = compile(stream.read(), path, "exec")
+    exec(code, __main__.__dict__)
+    stages[stage] = time.perf_counter()
+    modules[stage] = len(sys.modules)
+
+import json
+result = json.dumps({{"stages": stages, "modules": modules}})
+sys.__stdout__.write(f"\\n@@BENCH@@{{result}}\\n")
+"""
+
+
+def build_resources(
+    root: pathlib.Path,
+    script: pathlib.Path,
+    zip_index: bool,
+    prune_imports: bool,
+    progress: Progress,
+) -> BundlePaths:
+    """
+    Create the resources for a bundle for *script* at *root*
+    """
+    config = _config.parse_pyproject(
+        {
+            "tool": {
+                "py2app": {
+                    "python": {
+                        "zip-index": zip_index,
+                        "prune-imports": prune_imports,
+                    },
+                    "bundle": {"bench": {"script": str(script), "name": "Bench"}},
+                }
+            }
+        },
+        script.parent,
+    )
+    bundle = config.bundles[0]
+
+    graph = _builder.get_module_graph(bundle, progress)
+    graph.add_module("zipfile")
+    process_recipes(graph, config.recipe, progress)
+    if bundle.python_prune_imports:
+        _builder.prune_graph(graph, bundle, progress)
+
+    paths = bundle_paths(root / "Bench.app")
+    for path in paths.all_directories():
+        path.mkdir(parents=True, exist_ok=True)
+
+    compiler = BytecodeCompiler(optimize=bundle.python_optimize, cache=None)
+    ext_map = _builder.collect_python(bundle, paths, graph, compiler, progress)
+    _builder.add_bootstrap(
+        paths,
+        bundle,
+        graph,
+        progress,
+        [path.name.removesuffix(".so") for path in ext_map],
+    )
+    return paths
+
+
+def run_once(paths: BundlePaths) -> typing.Dict[str, typing.Any]:
+    """
+    Launch the bundle code once, returns the timings (in seconds)
+    and the number of loaded modules per stage.
+    """
+    script = LAUNCHER_SCRIPT.format(
+        search_path=[str(paths.pylib_zipped), str(paths.pylib), str(paths.extlib)],
+        resources=str(paths.resources),
+        argv0=str(paths.main / "Bench"),
+    )
+
+    # -I and -S to avoid using the user environment and site-packages
+    # of the interpreter running the benchmark.
+    env = {k: v for k, v in os.environ.items() if not k.startswith("PYTHON")}
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-I", "-S", "-c", script],
+        check=True,
+        stdout=subprocess.PIPE,
+        env=env,
+        text=True,
+    ).stdout
+    wall = time.perf_counter() - start
+
+    data = json.loads(output.rpartition("@@BENCH@@")[-1])
+    stages = data["stages"]
+    modules = data["modules"]
+    return {
+        "wall": wall,
+        "stages": {
+            "interpreter": wall - (stages["boot"] - stages["start"]),
+            "preboot": stages["preboot"] - stages["start"],
+            "boot": stages["boot"] - stages["preboot"],
+        },
+        "modules": {
+            "interpreter": modules["start"],
+            "preboot": modules["preboot"] - modules["start"],
+            "boot": modules["boot"] - modules["preboot"],
+        },
+    }
+
+
+def _summary(values: typing.List[float]) -> typing.Dict[str, float]:
+    return {
+        "median": statistics.median(values),
+        "min": min(values),
+        "max": max(values),
+    }
+
+
+def summarize(runs: typing.List[typing.Dict[str, typing.Any]]) -> typing.Dict:
+    return {
+        "runs": len(runs),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "wall": _summary([r["wall"] for r in runs]),
+        "stages": {
+            stage: _summary([r["stages"][stage] for r in runs]) for stage in STAGES
+        },
+        "modules": {stage: runs[0]["modules"][stage] for stage in STAGES},
+    }
+
+
+def compare(
+    result: typing.Dict, baseline: typing.Dict, tolerance: float
+) -> typing.List[str]:
+    """
+    Return descriptions of stages where the median time in *result*
+    is more than *tolerance* percent slower than in *baseline*.
+    """
+    regressions = []
+    pairs = [("wall", result["wall"], baseline["wall"])] + [
+        (stage, result["stages"][stage], baseline["stages"][stage]) for stage in STAGES
+    ]
+    for label, current, previous in pairs:
+        limit = previous["median"] * (1 + tolerance / 100)
+        if current["median"] > limit:
+            regressions.append(
+                f"{label}: {current['median'] * 1000:.2f} ms, "
+                f"baseline {previous['median'] * 1000:.2f} ms"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--script", type=pathlib.Path, default=DEFAULT_SCRIPT)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--zip-index", action="store_true")
+    parser.add_argument("--prune-imports", action="store_true")
+    parser.add_argument("--output", type=pathlib.Path)
+    parser.add_argument("--baseline", type=pathlib.Path)
+    parser.add_argument("--tolerance", type=float, default=10.0)
+    args = parser.parse_args()
+
+    progress = Progress(level=0)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = build_resources(
+            pathlib.Path(tmpdir),
+            args.script.resolve(),
+            args.zip_index,
+            args.prune_imports,
+            progress,
+        )
+        progress.stop()
+
+        # Warm up the filesystem cache
+        run_once(paths)
+        runs = [run_once(paths) for _ in range(args.runs)]
+
+    result = summarize(runs)
+    text = json.dumps(result, indent=2)
+    if args.output is not None:
+        args.output.write_text(text)
+    else:
+        print(text)
+
+    if args.baseline is not None:
+        regressions = compare(
+            result, json.loads(args.baseline.read_text()), args.tolerance
+        )
+        for line in regressions:
+            print(f"Regression: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
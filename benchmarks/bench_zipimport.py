@@ -0,0 +1,140 @@
+"""
+Startup benchmark for importing from python-libraries.zip.
+
+This compares importing modules from a synthetic library archive
+using ``zipimport`` with the indexed importer that py2app installs
+when the ``python.zip-index`` option is enabled.
+
+Each measurement runs in a fresh interpreter, and reports the time
+needed to set up the importer (parsing the zip directory for zipimport,
+loading the index for the indexed importer) and the time needed for
+the imports themselves. When the standard library is stored in the
+archive the interpreter already uses zipimport during initialization,
+the setup time for zipimport is then part of every launch. Usage::
+
+    $ python benchmarks/bench_zipimport.py [--modules N] [--imports N]
+"""
+
+import argparse
+import importlib.resources
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import typing
+
+from py2app._archive import ArchiveWriter, write_archive_index
+from py2app._bytecode import code_to_bytes
+
+MODULE_SOURCE = '''\
+"""Synthetic module"""
+
+def function(a, b):
+    return a + b
+
+class Class:
+    def method(self):
+        return function(1, 2)
+'''
+
+TIMING_SCRIPT = """\
+import sys, time
+import importlib.abc, importlib.machinery, marshal, mmap, os, zipimport
+start = time.perf_counter()
+sys.path.insert(0, {archive!r})
+{setup}
+mid = time.perf_counter()
+for name in {names!r}:
+    __import__(name)
+end = time.perf_counter()
+print(mid - start, end - mid)
+"""
+
+ZIPIMPORT_SETUP = """\
+sys.path_importer_cache[{archive!r}] = zipimport.zipimporter({archive!r})
+"""
+
+
+def make_archive(path: pathlib.Path, module_count: int) -> list:
+    """
+    Write an archive with *module_count* modules in packages
+    of 100 modules, returns the module names.
+    """
+    code = code_to_bytes(compile(MODULE_SOURCE, "mod.py", "exec"))
+    empty = code_to_bytes(compile("", "__init__.py", "exec"))
+    names = []
+    with ArchiveWriter(path) as zf:
+        for idx in range(module_count):
+            package = f"bench_pkg{idx // 100}"
+            if idx % 100 == 0:
+                zf.mkdir(package)
+                zf.writestr(f"{package}/__init__.pyc", empty)
+                zf.writestr(f"{package}/data.txt", b"x" * 1024)
+            zf.writestr(f"{package}/mod{idx}.pyc", code)
+            names.append(f"{package}.mod{idx}")
+    return names
+
+
+def measure(
+    archive: pathlib.Path, setup: str, names: list, repeat: int
+) -> typing.List[typing.Tuple[float, float]]:
+    """
+    Returns a list of (setup time, import time) for *repeat* runs
+    """
+    script = TIMING_SCRIPT.format(
+        archive=str(archive), setup=setup.format(archive=str(archive)), names=names
+    )
+    result = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, "-S", "-c", script])
+        setup_time, import_time = output.split()
+        result.append((float(setup_time), float(import_time)))
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", type=int, default=20000)
+    parser.add_argument("--imports", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    bootstrap = (
+        importlib.resources.files("py2app.bootstrap")
+        .joinpath("_setup_importlib.py")
+        .read_text(encoding="utf-8")
+    )
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        archive = pathlib.Path(tmpdir) / "python-libraries.zip"
+        names = make_archive(archive, args.modules)
+        write_archive_index(archive, archive.with_suffix(".idx"))
+        names = names[:: max(1, len(names) // args.imports)][: args.imports]
+
+        print(
+            f"Archive with {args.modules} modules "
+            f"({archive.stat().st_size / 1_000_000:.1f} MB), "
+            f"importing {len(names)} modules, {args.repeat} runs"
+        )
+
+        # Note that "{" and "}" in the bootstrap code must be escaped
+        # for use with str.format.
+        indexed_setup = bootstrap.replace("{", "{{").replace("}", "}}")
+
+        for label, setup in (
+            ("zipimport", ZIPIMPORT_SETUP),
+            ("indexed", indexed_setup),
+        ):
+            timings = measure(archive, setup, names, args.repeat)
+            setup_times = [t[0] * 1000 for t in timings]
+            import_times = [t[1] * 1000 for t in timings]
+            print(
+                f"{label:>10}: setup median {statistics.median(setup_times):7.2f} ms, "
+                f"imports median {statistics.median(import_times):7.2f} ms "
+                f"(min {min(import_times):7.2f} ms)"
+            )
+
+
+if __name__ == "__main__":
+    main()
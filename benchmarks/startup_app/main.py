@@ -0,0 +1,19 @@
+"""
+Script used by bench_startup.py, imports a representative
+set of standard library modules and exits.
+"""
+
+import argparse
+import email.message
+import json
+import logging
+import pathlib
+import subprocess  # noqa: F401
+import urllib.parse
+
+parser = argparse.ArgumentParser()
+parser.parse_args([])
+
+message = email.message.EmailMessage()
+message["Subject"] = json.dumps({"path": str(pathlib.Path("."))})
+logging.getLogger(__name__).debug(urllib.parse.quote(message["Subject"]))
@@ -0,0 +1,202 @@
+import marshal
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+from importlib.util import MAGIC_NUMBER
+
+from modulegraph2 import SourceModule
+
+from py2app import _bytecode
+from py2app._modulegraph import ATTR_REWRITE_FILE
+
+
+def make_node(path, source, name="mod"):
+    path.write_text(source)
+    return SourceModule(
+        name=name,
+        loader=None,
+        distribution=None,
+        filename=path,
+        extension_attributes={},
+        globals_written=set(),
+        globals_read=set(),
+        code=compile(source, str(path), "exec"),
+    )
+
+
+class TestCodeToBytes(unittest.TestCase):
+    def test_header(self):
+        data = _bytecode.code_to_bytes(compile("x = 1", "x.py", "exec"))
+        self.assertEqual(data[:4], MAGIC_NUMBER)
+        self.assertEqual(data[4:16], b"\0" * 12)
+
+
+class TestBytecodeCache(unittest.TestCase):
+    def test_lookup_and_store(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = _bytecode.BytecodeCache(pathlib.Path(tmpdir))
+
+            self.assertIsNone(cache.lookup("abcdef"))
+            self.assertEqual(cache.misses, 1)
+            self.assertEqual(cache.hits, 0)
+
+            cache.store("abcdef", b"data")
+            self.assertEqual(cache.lookup("abcdef"), b"data")
+            self.assertEqual(cache.hits, 1)
+            self.assertTrue(
+                (pathlib.Path(tmpdir) / "bytecode" / "ab" / "cdef.pyc").exists()
+            )
+
+    def test_trim(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = _bytecode.BytecodeCache(pathlib.Path(tmpdir), max_size=25)
+
+            for idx, key in enumerate(("aa1", "bb2", "cc3")):
+                cache.store(key, b"x" * 10)
+                path = pathlib.Path(tmpdir) / "bytecode" / key[:2] / f"{key[2:]}.pyc"
+                os.utime(path, (1000 + idx, 1000 + idx))
+
+            # Using an entry makes it the most recently used one
+            cache.lookup("aa1")
+
+            self.assertEqual(cache.trim(), 1)
+            self.assertIsNotNone(cache.lookup("aa1"))
+            self.assertIsNone(cache.lookup("bb2"))
+            self.assertIsNotNone(cache.lookup("cc3"))
+
+    def test_trim_shared_cache_dir(self):
+        # Other caches in the same directory are not
+        # counted against the bytecode cache.
+        with tempfile.TemporaryDirectory() as tmpdir:
+            other = pathlib.Path(tmpdir) / "module-graph" / "graph.pickle"
+            other.parent.mkdir()
+            other.write_bytes(b"x" * 100)
+            os.utime(other, (1000, 1000))
+
+            cache = _bytecode.BytecodeCache(pathlib.Path(tmpdir), max_size=25)
+            cache.store("aa1", b"x" * 10)
+
+            self.assertEqual(cache.trim(), 0)
+            self.assertTrue(other.exists())
+            self.assertIsNotNone(cache.lookup("aa1"))
+
+
+class TestBytecodeCompiler(unittest.TestCase):
+    @unittest.skipIf(sys.flags.optimize, "Test requires -O0")
+    def test_uses_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = pathlib.Path(tmpdir)
+            node = make_node(tmp / "mod.py", "x = 1\n")
+
+            cache = _bytecode.BytecodeCache(tmp / "cache")
+            compiler = _bytecode.BytecodeCompiler(optimize=2, cache=cache)
+
+            data = compiler.pyc_for_node(node)
+            self.assertEqual(
+                data, _bytecode.code_to_bytes(compiler.code_for_node(node))
+            )
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+            self.assertEqual(compiler.pyc_for_node(node), data)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+            # Changing the source results in a new key
+            key = compiler.cache_key(node)
+            st = os.stat(tmp / "mod.py")
+            (tmp / "mod.py").write_text("x = 2\n")
+            os.utime(tmp / "mod.py", ns=(st.st_atime_ns, st.st_mtime_ns))
+            self.assertNotEqual(compiler.cache_key(node), key)
+
+            # The key only depends on the contents of the source
+            (tmp / "mod.py").write_text("x = 1\n")
+            os.utime(tmp / "mod.py", ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+            self.assertEqual(compiler.cache_key(node), key)
+
+            # As does the optimization level
+            other = _bytecode.BytecodeCompiler(optimize=1, cache=cache)
+            self.assertNotEqual(other.cache_key(node), key)
+
+    @unittest.skipIf(sys.flags.optimize, "Test requires -O0")
+    def test_cache_without_compiling(self):
+        # The cache is also used for code that isn't recompiled
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = pathlib.Path(tmpdir)
+            node = make_node(tmp / "mod.py", "x = 1\n")
+
+            cache = _bytecode.BytecodeCache(tmp / "cache")
+            compiler = _bytecode.BytecodeCompiler(optimize=0, cache=cache)
+            self.assertFalse(compiler.needs_compile(node))
+            self.assertEqual(
+                compiler.pyc_for_node(node), _bytecode.code_to_bytes(node.code)
+            )
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+            self.assertEqual(
+                compiler.pyc_for_node(node), _bytecode.code_to_bytes(node.code)
+            )
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_without_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            node = make_node(pathlib.Path(tmpdir) / "mod.py", "x = 1\n")
+            compiler = _bytecode.BytecodeCompiler(optimize=0, cache=None)
+            self.assertEqual(
+                compiler.pyc_for_node(node), _bytecode.code_to_bytes(node.code)
+            )
+
+    def test_rewrite_file_uses(self):
+        source = 'DATA = (pathlib.Path(__file__).parent / "data.txt").read_text()\n'
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = pathlib.Path(tmpdir)
+            node = make_node(tmp / "mod.py", source, name="pkg.mod")
+            compiler = _bytecode.BytecodeCompiler(optimize=-1, cache=None)
+            key = compiler.cache_key(node)
+            self.assertIs(compiler.code_for_node(node), node.code)
+
+            node.extension_attributes[ATTR_REWRITE_FILE] = True
+            self.assertNotEqual(compiler.cache_key(node), key)
+
+            code = compiler.code_for_node(node)
+            self.assertIsNot(code, node.code)
+            self.assertNotIn("__file__", code.co_names)
+            self.assertIn("__spec__", code.co_names)
+            self.assertEqual(code.co_filename, node.code.co_filename)
+
+    @unittest.skipIf(sys.flags.optimize, "Test requires -O0")
+    def test_optimize(self):
+        source = '"""docstring"""\nassert False\n'
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = pathlib.Path(tmpdir)
+            node = make_node(tmp / "mod.py", source, name="pkg.sub.mod")
+            self.assertEqual(node.code.co_consts[0], "docstring")
+
+            compiler = _bytecode.BytecodeCompiler(optimize=2, cache=None)
+            self.assertEqual(compiler.optimize_for(node), 2)
+            code = marshal.loads(compiler.pyc_for_node(node)[16:])
+            self.assertNotIn("docstring", code.co_consts)
+            self.assertEqual(code.co_filename, node.code.co_filename)
+            exec(code, {})
+
+            # -1 is the level of the current interpreter
+            compiler = _bytecode.BytecodeCompiler(optimize=-1, cache=None)
+            self.assertEqual(compiler.optimize_for(node), sys.flags.optimize)
+            self.assertIs(compiler.code_for_node(node), node.code)
+
+    def test_optimize_overrides(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = pathlib.Path(tmpdir)
+            node = make_node(tmp / "mod.py", "x = 1\n", name="pkg.sub.mod")
+            other = make_node(tmp / "other.py", "x = 1\n", name="pkgother")
+
+            compiler = _bytecode.BytecodeCompiler(
+                optimize=2, cache=None, overrides={"pkg": 0, "pkg.sub": 1}
+            )
+            self.assertEqual(compiler.optimize_for(node), 1)
+            self.assertEqual(compiler.optimize_for(other), 2)
+
+            compiler = _bytecode.BytecodeCompiler(
+                optimize=2, cache=None, overrides={"pkg": 0}
+            )
+            self.assertEqual(compiler.optimize_for(node), 0)
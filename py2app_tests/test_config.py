@@ -194,6 +194,7 @@ class TestRecipeOptions(TestCase):
               zip_unsafe = ()
               qt_plugins = None
               matplotlib_backends = None
+              encodings = None
             >"""
             ),
         )
@@ -236,6 +237,7 @@ class TestPy2appConfiguration(TestCase):
                 zip_unsafe = ()
                 qt_plugins = None
                 matplotlib_backends = None
+                encodings = None
               >
 
               bundles = [
@@ -340,6 +342,7 @@ class TestParsing(TestCase):
             self.assertEqual(config.recipe.zip_unsafe, [])
             self.assertEqual(config.recipe.qt_plugins, None)
             self.assertEqual(config.recipe.matplotlib_backends, None)
+            self.assertEqual(config.recipe.encodings, None)
 
         with self.subTest("invalid main key"):
             with self.assertRaisesRegex(
@@ -388,6 +391,7 @@ class TestParsing(TestCase):
             ("zip-unsafe", "zip_unsafe"),
             ("qt-plugins", "qt_plugins"),
             ("matplotlib-backends", "matplotlib_backends"),
+            ("encodings", "encodings"),
         ]:
             with self.subTest(f"setting {subkey} (valid)"):
                 config = _config.parse_pyproject(
@@ -794,6 +798,51 @@ class TestParsing(TestCase):
                     pathlib.Path("."),
                 )
 
+        with self.subTest("python.optimize-overrides (valid)"):
+            config = _config.parse_pyproject(
+                {
+                    "tool": {
+                        "py2app": {
+                            "python": {
+                                "optimize": 2,
+                                "optimize-overrides": {"docopt": 0},
+                            },
+                            "bundle": {
+                                "main": {
+                                    "script": "main.py",
+                                }
+                            },
+                        }
+                    }
+                },
+                pathlib.Path("."),
+            )
+            self.assertEqual(config.python_optimize_overrides, {"docopt": 0})
+            self.assertEqual(config.bundles[0].python_optimize_overrides, {"docopt": 0})
+
+        with self.subTest("python.optimize-overrides (invalid)"):
+            with self.assertRaisesRegex(
+                _config.ConfigurationError,
+                "'tool.py2app.python.optimize-overrides' is not a table of integers",
+            ):
+                _config.parse_pyproject(
+                    {
+                        "tool": {
+                            "py2app": {
+                                "python": {
+                                    "optimize-overrides": ["docopt"],
+                                },
+                                "bundle": {
+                                    "main": {
+                                        "script": "main.py",
+                                    }
+                                },
+                            }
+                        }
+                    },
+                    pathlib.Path("."),
+                )
+
         with self.subTest("invalid python subkey"):
             with self.assertRaisesRegex(
                 _config.ConfigurationError,
@@ -822,6 +871,8 @@ class TestParsing(TestCase):
             ("use-pythonpath", "python_use_pythonpath"),
             ("use-sitepackages", "python_use_sitepackages"),
             ("use-faulthandler", "python_use_faulthandler"),
+            ("zip-index", "python_zip_index"),
+            ("prune-imports", "python_prune_imports"),
         ]:
             with self.subTest(f"setting python.{subkey} (valid)"):
                 config = _config.parse_pyproject(
@@ -1091,6 +1142,45 @@ class TestParsing(TestCase):
                     pathlib.Path("."),
                 )
 
+        with self.subTest("import-trace (valid)"):
+            config = _config.parse_pyproject(
+                {
+                    "tool": {
+                        "py2app": {
+                            "bundle": {
+                                "test": {
+                                    "script": "scriptmod.py",
+                                    "import-trace": "trace.txt",
+                                }
+                            },
+                        }
+                    }
+                },
+                pathlib.Path("."),
+            )
+            self.assertEqual(config.bundles[0].import_trace, pathlib.Path("trace.txt"))
+
+        with self.subTest("import-trace (invalid)"):
+            with self.assertRaisesRegex(
+                _config.ConfigurationError,
+                "'tool.py2app.bundle.test.import-trace' is not a string",
+            ):
+                _config.parse_pyproject(
+                    {
+                        "tool": {
+                            "py2app": {
+                                "bundle": {
+                                    "test": {
+                                        "script": "scriptmod.py",
+                                        "import-trace": 42,
+                                    }
+                                },
+                            }
+                        }
+                    },
+                    pathlib.Path("."),
+                )
+
         for subkey, attribute in [
             ("plugin", "plugin"),
             ("chdir", "chdir"),
@@ -1962,6 +2052,8 @@ class TestParsing(TestCase):
             ("use-pythonpath", "python_use_pythonpath"),
             ("use-sitepackages", "python_use_sitepackages"),
             ("use-faulthandler", "python_use_faulthandler"),
+            ("zip-index", "python_zip_index"),
+            ("prune-imports", "python_prune_imports"),
         ]:
             with self.subTest("setting python.{subkey} (valid)"):
                 config = _config.parse_pyproject(
@@ -2109,8 +2201,21 @@ class TestParsing(TestCase):
 
     def test_global_options_in_bundle_options(self):
         # Check that every global option is also present on the bundle options,
-        # excluding 'bundles' and 'recipe'.
+        # excluding 'bundles', 'recipe' and the build state that is set from
+        # the command-line.
         global_options = set(dir(_config.Py2appConfiguration([], 2, 3)))
         local_options = set(dir(_config.BundleOptions(1, 2)))
 
-        self.assertEqual(global_options - local_options, {"bundles", "recipe"})
+        self.assertEqual(
+            global_options - local_options,
+            {
+                "bundles",
+                "recipe",
+                "cache_dir",
+                "incremental",
+                "profile",
+                "jobs",
+                "shared_scan",
+                "record_import_trace",
+            },
+        )
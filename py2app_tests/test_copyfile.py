@@ -0,0 +1,66 @@
+import os
+import pathlib
+import tempfile
+import unittest
+import zipfile
+
+from py2app import _archive, _copyfile
+
+
+class TestCopyFile(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmpdir = pathlib.Path(self._tmpdir.name)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_copy_file(self):
+        data = os.urandom(_copyfile.CHUNK_SIZE * 2 + 17)
+        src = self.tmpdir / "src.bin"
+        src.write_bytes(data)
+
+        dst = self.tmpdir / "dst.bin"
+        self.assertEqual(_copyfile.copy_file(src, dst), len(data))
+        self.assertEqual(dst.read_bytes(), data)
+
+        # Replaces an existing (larger) file
+        dst.write_bytes(b"x" * (len(data) * 2))
+        src.write_bytes(b"short")
+        self.assertEqual(_copyfile.copy_file(src, dst), 5)
+        self.assertEqual(dst.read_bytes(), b"short")
+
+    def test_copy_empty_file(self):
+        src = self.tmpdir / "src.bin"
+        src.write_bytes(b"")
+
+        dst = self.tmpdir / "dst.bin"
+        self.assertEqual(_copyfile.copy_file(src, dst), 0)
+        self.assertEqual(dst.read_bytes(), b"")
+
+    def test_archive_write_file(self):
+        data = os.urandom(_copyfile.CHUNK_SIZE + 3)
+        src = self.tmpdir / "src.bin"
+        src.write_bytes(data)
+
+        archive = self.tmpdir / "out.zip"
+        with _archive.ArchiveWriter(archive) as zf:
+            zf.write_file("pkg/data.bin", src)
+            zf.writestr("pkg/other.txt", b"other")
+
+        self.assertEqual(zf.entry_count, 2)
+        self.assertEqual(zf.byte_count, len(data) + 5)
+
+        with zipfile.ZipFile(archive) as zf:
+            self.assertEqual(zf.namelist(), ["pkg/data.bin", "pkg/other.txt"])
+            self.assertEqual(zf.read("pkg/data.bin"), data)
+            info = zf.getinfo("pkg/data.bin")
+            self.assertEqual(info.date_time, _archive.ZIP_TIMESTAMP)
+            self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+
+    def test_archive_write_missing_file(self):
+        archive = self.tmpdir / "out.zip"
+        zf = _archive.ArchiveWriter(archive)
+        zf.write_file("missing.bin", self.tmpdir / "missing.bin")
+        with self.assertRaises(FileNotFoundError):
+            zf.close()
@@ -0,0 +1,179 @@
+import ast
+import importlib
+import pathlib
+import sys
+import tempfile
+import textwrap
+import unittest
+import zipfile
+
+from py2app import _dunderfile
+from py2app._bytecode import BytecodeCompiler
+from py2app._modulegraph import ModuleGraph
+
+
+def kinds(source):
+    tree = ast.parse(textwrap.dedent(source))
+    return [(use.lineno, use.kind) for use in _dunderfile.file_uses(tree)]
+
+
+class TestFileUses(unittest.TestCase):
+    def test_safe(self):
+        self.assertEqual(
+            kinds(
+                """\
+                import logging
+                logging.getLogger(__name__).debug("loaded %s", __file__)
+                print(f"loading {__file__!r}")
+                class Foo:
+                    def __repr__(self):
+                        return "<Foo in " + str(__file__) + ">"
+                raise ImportError("cannot use {}".format(__file__))
+                """
+            ),
+            [(2, "safe"), (3, "safe"), (6, "safe"), (7, "safe")],
+        )
+
+    def test_unsafe(self):
+        self.assertEqual(
+            kinds(
+                """\
+                import os, pathlib
+                DATA = os.path.join(os.path.dirname(__file__), "data.txt")
+                text = open(__file__).read()
+                def get():
+                    return __file__
+                HERE = pathlib.Path(__file__).parent
+                print(HERE)
+                (pathlib.Path(__file__).parent / name).read_text()
+                """
+            ),
+            [(2, "unsafe"), (3, "unsafe"), (5, "unsafe"), (6, "unsafe"), (8, "unsafe")],
+        )
+
+    def test_rewritable(self):
+        self.assertEqual(
+            kinds(
+                """\
+                from pathlib import Path
+                import pathlib
+                _HERE = Path(__file__).parent
+                def load():
+                    return (_HERE / "data" / "file.txt").read_text()
+                pathlib.Path(__file__).resolve().parent.joinpath("x").read_bytes()
+                """
+            ),
+            [(3, "rewritable"), (6, "rewritable")],
+        )
+
+    def test_public_alias(self):
+        # Public names can be imported by other modules and
+        # used as a filesystem path.
+        source = """\
+            import pathlib
+            HERE = pathlib.Path(__file__).parent
+            def load():
+                return (HERE / "data.txt").read_text()
+            """
+        self.assertEqual(kinds(source), [(2, "unsafe")])
+
+        for all_value, kind in (
+            ('["load"]', "rewritable"),
+            ('("load", "HERE")', "unsafe"),
+            ("[name for name in dir()]", "unsafe"),
+        ):
+            with self.subTest(all_value=all_value):
+                self.assertEqual(
+                    kinds(f"__all__ = {all_value}\n" + textwrap.dedent(source)),
+                    [(3, kind)],
+                )
+
+        self.assertEqual(
+            kinds(
+                '__all__ = ["load"]\n__all__.append("HERE")\n' + textwrap.dedent(source)
+            ),
+            [(4, "unsafe")],
+        )
+
+    def test_path_not_imported(self):
+        # "Path" is not known to be pathlib.Path
+        self.assertEqual(
+            kinds('(Path(__file__).parent / "data.txt").read_text()\n'),
+            [(1, "unsafe")],
+        )
+
+    def test_code(self):
+        tree = ast.parse(
+            textwrap.dedent(
+                """\
+                import os
+                if os.path.exists(os.path.dirname(__file__)):
+                    pass
+                """
+            )
+        )
+        self.assertEqual(
+            _dunderfile.file_uses(tree),
+            [
+                _dunderfile.FileUse(
+                    2, _dunderfile.UNSAFE, "os.path.exists(os.path.dirname(__file__))"
+                )
+            ],
+        )
+
+
+class TestRewrite(unittest.TestCase):
+    def tearDown(self):
+        for name in list(sys.modules):
+            if name.startswith("rewrite_pkg"):
+                del sys.modules[name]
+
+    def test_rewrite_in_zipfile(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            srcdir = pathlib.Path(tmpdir) / "src"
+            (srcdir / "rewrite_pkg").mkdir(parents=True)
+            (srcdir / "rewrite_pkg/__init__.py").write_text("")
+            (srcdir / "rewrite_pkg/data.txt").write_text("hello")
+            (srcdir / "rewrite_pkg/reader.py").write_text(
+                textwrap.dedent(
+                    """\
+                    import pathlib
+                    _HERE = pathlib.Path(__file__).parent
+                    def load():
+                        return (_HERE / "data.txt").read_text()
+                    """
+                )
+            )
+
+            sys.path.insert(0, str(srcdir))
+            try:
+                graph = ModuleGraph()
+                graph.add_module("rewrite_pkg.reader")
+            finally:
+                sys.path.remove(str(srcdir))
+                for name in list(sys.modules):
+                    if name.startswith("rewrite_pkg"):
+                        del sys.modules[name]
+
+            node = graph.find_node("rewrite_pkg.reader")
+            graph.rewrite_file_uses(node)
+
+            archive = pathlib.Path(tmpdir) / "lib.zip"
+            compiler = BytecodeCompiler(optimize=-1, cache=None)
+            with zipfile.ZipFile(archive, "w") as zf:
+                zf.writestr(
+                    "rewrite_pkg/__init__.pyc",
+                    compiler.pyc_for_node(graph.find_node("rewrite_pkg").init_module),
+                )
+                zf.writestr("rewrite_pkg/reader.pyc", compiler.pyc_for_node(node))
+                zf.writestr("rewrite_pkg/data.txt", "hello")
+
+            sys.path.insert(0, str(archive))
+            try:
+                importlib.invalidate_caches()
+                reader = importlib.import_module("rewrite_pkg.reader")
+                self.assertIn("lib.zip", reader.__file__)
+                self.assertEqual(reader.load(), "hello")
+            finally:
+                sys.path.remove(str(archive))
+                sys.path_importer_cache.pop(str(archive), None)
@@ -0,0 +1,140 @@
+import pathlib
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from py2app._config import RecipeOptions
+from py2app._modulegraph import ModuleGraph
+from py2app._recipedefs import stdlib
+
+
+class TestEncodingsRecipe(unittest.TestCase):
+    def test_codec_module(self):
+        self.assertEqual(stdlib.codec_module("UTF-8"), "encodings.utf_8")
+        self.assertEqual(stdlib.codec_module("utf8"), "encodings.utf_8")
+        self.assertEqual(stdlib.codec_module("latin-1"), "encodings.latin_1")
+        self.assertEqual(stdlib.codec_module("646"), "encodings.ascii")
+        self.assertEqual(stdlib.codec_module("cp1252"), "encodings.cp1252")
+        self.assertIsNone(stdlib.codec_module("no-such-codec"))
+        self.assertIsNone(stdlib.codec_module("os.path"))
+
+    def test_recipe(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            script = pathlib.Path(tmpdir) / "main.py"
+            script.write_text(
+                textwrap.dedent(
+                    """\
+                    data = "text".encode("utf-16")
+                    text = data.decode( 'koi8_r' )
+                    open("file.txt", encoding="cp1252")
+                    name = "not-used"
+                    """
+                )
+            )
+
+            graph = ModuleGraph()
+            node = graph.add_script(script)
+            self.assertEqual(stdlib.codec_names(node), {"utf-16", "koi8_r", "cp1252"})
+
+            stdlib.ensure_encodings(graph, RecipeOptions({"encodings": ["minimal"]}))
+
+            included = {
+                n.identifier
+                for n in graph.iter_graph()
+                if n.identifier.startswith("encodings.")
+            }
+            for name in (
+                "encodings.utf_8",
+                "encodings.ascii",
+                "encodings.latin_1",
+                "encodings.aliases",
+                "encodings.utf_16",
+                "encodings.koi8_r",
+                "encodings.cp1252",
+            ):
+                self.assertIn(name, included)
+
+            self.assertIn("encodings.cp437", included)
+            self.assertNotIn("encodings.cp850", included)
+            self.assertNotIn("encodings.big5", included)
+
+    def test_recipe_default(self):
+        graph = ModuleGraph()
+        stdlib.ensure_encodings(graph, RecipeOptions({}))
+        self.assertIsNotNone(graph.find_node("encodings.cp437"))
+        self.assertIsNotNone(graph.find_node("encodings.big5"))
+
+    def test_codec_names_expressions(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            script = pathlib.Path(tmpdir) / "main.py"
+            script.write_text(
+                textwrap.dedent(
+                    """\
+                    def read(data, encoding="koi8_r", *, fallback_encoding="cp850"):
+                        return data.decode(encoding or "cp437")
+
+                    def write(text, cp):
+                        return text.encode("utf-16" if cp else "big5")
+
+                    print("x", "cp1252")
+                    """
+                )
+            )
+
+            graph = ModuleGraph()
+            node = graph.add_script(script)
+            self.assertEqual(
+                stdlib.codec_names(node),
+                {"koi8_r", "cp850", "cp437", "utf-16", "big5"},
+            )
+
+    def test_minimal_zipfile(self):
+        # python-libraries.zip is read using zipfile, which must work
+        # with only the codecs included for the "minimal" preset.
+        graph = ModuleGraph()
+        graph.add_module("zipfile")
+        stdlib.ensure_encodings(graph, RecipeOptions({"encodings": ["minimal"]}))
+        included = {
+            n.identifier.rpartition(".")[-1]
+            for n in graph.iter_graph()
+            if n.identifier.startswith("encodings.")
+        }
+
+        script = textwrap.dedent(
+            """\
+            import importlib.abc, sys, zipfile
+
+            allowed = set(sys.argv[2].split(","))
+
+            class Finder(importlib.abc.MetaPathFinder):
+                def find_spec(self, name, path, target=None):
+                    prefix, _, codec = name.partition(".")
+                    if prefix == "encodings" and codec not in allowed:
+                        raise ImportError(name)
+
+            sys.meta_path.insert(0, Finder())
+
+            with zipfile.ZipFile(sys.argv[1], "w") as zf:
+                zf.writestr("package/data.txt", "data")
+
+            with zipfile.ZipFile(sys.argv[1]) as zf:
+                print(zipfile.Path(zf, "package/data.txt").read_text())
+            """
+        )
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = pathlib.Path(tmpdir) / "archive.zip"
+            for codecs, ok in ((included, True), (included - {"cp437"}, False)):
+                with self.subTest(ok=ok):
+                    result = subprocess.run(
+                        [sys.executable, "-I", "-c", script, archive, ",".join(codecs)],
+                        capture_output=True,
+                        text=True,
+                    )
+                    if ok:
+                        self.assertEqual(result.returncode, 0, result.stderr)
+                        self.assertEqual(result.stdout, "data\n")
+                    else:
+                        self.assertIn("LookupError", result.stderr)
@@ -0,0 +1,66 @@
+import importlib.resources
+import pathlib
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+BOOTSTRAP = importlib.resources.files("py2app.bootstrap").joinpath(
+    "_setup_importlib.py"
+)
+
+CHECK_SCRIPT = textwrap.dedent(
+    """\
+    for finder in sys.meta_path:
+        if type(finder).__name__ != "Py2AppExtensionLoader":
+            continue
+        if finder._libdir == f"{sys.py2app_bundle_resources}/lib-dynload":
+            for name in ("pkg.fast", "pkg.other", "json"):
+                spec = finder.find_spec(name, None)
+                print(name, spec.origin.rpartition("/")[-1] if spec else None)
+    """
+)
+
+
+class TestExtensionLoader(unittest.TestCase):
+    def run_script(self, resources, extensions):
+        script = "\n".join(
+            [
+                "import sys",
+                f"sys.py2app_bundle_resources = {str(resources)!r}",
+                f"sys.path.append({str(resources / 'lib-dynload')!r})",
+                f"PY2APP_EXTENSIONS = {extensions!r}",
+                BOOTSTRAP.read_text(),
+                CHECK_SCRIPT,
+            ]
+        )
+        return subprocess.check_output(
+            [sys.executable, "-c", script], text=True
+        ).splitlines()
+
+    def test_extension_names(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            resources = pathlib.Path(tmpdir)
+            (resources / "lib-dynload").mkdir()
+            (resources / "lib-dynload" / "pkg.other.so").write_bytes(b"")
+
+            # The names table is used instead of the filesystem
+            self.assertEqual(
+                self.run_script(resources, frozenset({"pkg.fast"})),
+                [
+                    "pkg.fast pkg.fast.so",
+                    "pkg.other None",
+                    "json None",
+                ],
+            )
+
+            # Without names the filesystem is checked
+            self.assertEqual(
+                self.run_script(resources, None),
+                [
+                    "pkg.fast None",
+                    "pkg.other pkg.other.so",
+                    "json None",
+                ],
+            )
@@ -0,0 +1,177 @@
+import os
+import pathlib
+import sys
+import tempfile
+import textwrap
+import types
+import unittest
+from unittest import mock
+
+from packaging.specifiers import SpecifierSet
+
+from py2app import _graphcache
+from py2app._graphcache import GraphCache
+from py2app._modulegraph import ModuleGraph
+
+
+class TestGraphCache(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmpdir = pathlib.Path(self._tmpdir.name)
+        self.srcdir = self.tmpdir / "src"
+        self.srcdir.mkdir()
+        sys.path.insert(0, str(self.srcdir))
+
+    def tearDown(self):
+        sys.path.remove(str(self.srcdir))
+        for name in list(sys.modules):
+            if name.startswith("cached_"):
+                del sys.modules[name]
+        self._tmpdir.cleanup()
+
+    def write(self, name, source):
+        path = self.srcdir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(textwrap.dedent(source))
+
+        # Ensure that the change is visible even on filesystems
+        # with a coarse timestamp resolution.
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        return path
+
+    def scan(self, cache, script):
+        graph = ModuleGraph()
+        key = cache.key("test", script)
+        if not cache.load(key, graph):
+            graph.add_script(script)
+            cache.store(key, graph)
+        elif cache.rescanned:
+            cache.store(key, graph)
+        return graph
+
+    def assertSameGraph(self, graph, expected):
+        self.assertEqual(
+            {node.identifier for node in graph.iter_graph()},
+            {node.identifier for node in expected.iter_graph()},
+        )
+        self.assertEqual(set(graph._edges), set(expected._edges))
+
+    def test_cache(self):
+        script = self.write("main.py", "import cached_a\n")
+        self.write("cached_a.py", "import cached_b\n")
+        self.write("cached_b.py", "")
+        self.write("cached_c.py", "import cached_b\n")
+
+        cache = GraphCache(self.tmpdir / "cache")
+        graph = self.scan(cache, script)
+        self.assertFalse(cache.hit)
+        self.assertTrue((self.tmpdir / "cache/module-graph").is_dir())
+
+        cached = self.scan(GraphCache(self.tmpdir / "cache"), script)
+        self.assertSameGraph(cached, graph)
+        self.assertIsInstance(cached.find_node("cached_a").code, types.CodeType)
+
+        # Changing a module rescans only that module
+        self.write("cached_a.py", "import cached_c\n")
+        cache = GraphCache(self.tmpdir / "cache")
+        cached = self.scan(cache, script)
+        self.assertTrue(cache.hit)
+        self.assertEqual(cache.rescanned, 1)
+
+        fresh = ModuleGraph()
+        fresh.add_script(script)
+        self.assertSameGraph(cached, fresh)
+        self.assertIsNotNone(cached.find_node("cached_c"))
+        self.assertIn("cached_c", cached.find_node("cached_a").code.co_names)
+
+        # Changes to the script are detected as well
+        self.write("main.py", "import cached_b\n")
+        cache = GraphCache(self.tmpdir / "cache")
+        cached = self.scan(cache, script)
+        self.assertEqual(cache.rescanned, 1)
+        self.assertIsNone(cached.find_node("cached_a"))
+        self.assertIsNotNone(cached.find_node("cached_b"))
+        self.assertIn(str(script), cached._roots)
+
+        # Touching a file without changing it is not a change
+        self.write("main.py", "import cached_b\n")
+        cache = GraphCache(self.tmpdir / "cache")
+        self.scan(cache, script)
+        self.assertTrue(cache.hit)
+        self.assertEqual(cache.rescanned, 0)
+
+    def test_new_module(self):
+        script = self.write("main.py", "import cached_missing\n")
+
+        self.scan(GraphCache(self.tmpdir / "cache"), script)
+
+        # A new file on sys.path invalidates the graph
+        self.write("cached_missing.py", "")
+        cache = GraphCache(self.tmpdir / "cache")
+        graph = self.scan(cache, script)
+        self.assertFalse(cache.hit)
+        self.assertEqual(
+            type(graph.find_node("cached_missing")).__name__, "SourceModule"
+        )
+
+    def test_key(self):
+        cache = GraphCache(self.tmpdir / "cache")
+        self.assertEqual(cache.key("a", ["b"]), cache.key("a", ["b"]))
+        self.assertNotEqual(cache.key("a", ["b"]), cache.key("a", ["c"]))
+
+        key = cache.key("a")
+        sys.path.append("/no/such/dir")
+        try:
+            self.assertNotEqual(cache.key("a"), key)
+        finally:
+            sys.path.remove("/no/such/dir")
+
+    def test_untrusted(self):
+        script = self.write("main.py", "import cached_a\n")
+        self.write("cached_a.py", "")
+
+        self.scan(GraphCache(self.tmpdir / "cache"), script)
+        (entry,) = (self.tmpdir / "cache/module-graph").iterdir()
+
+        # Entries writable by other users are ignored
+        entry.chmod(0o666)
+        cache = GraphCache(self.tmpdir / "cache")
+        self.assertFalse(cache.load(cache.key("test", script), ModuleGraph()))
+        self.assertTrue(cache.untrusted)
+
+        entry.chmod(0o600)
+        cache = GraphCache(self.tmpdir / "cache")
+        self.assertTrue(cache.load(cache.key("test", script), ModuleGraph()))
+        self.assertFalse(cache.untrusted)
+
+        # As are entries owned by another user
+        if os.getuid() == 0:
+            os.chown(entry, 1, -1)
+            cache = GraphCache(self.tmpdir / "cache")
+            self.assertFalse(cache.load(cache.key("test", script), ModuleGraph()))
+            self.assertTrue(cache.untrusted)
+
+    def test_unsupported_modulegraph2(self):
+        script = self.write("main.py", "import cached_a\n")
+        self.write("cached_a.py", "")
+
+        with mock.patch.object(
+            _graphcache, "MODULEGRAPH2_VERSIONS", SpecifierSet("<0")
+        ):
+            cache = GraphCache(self.tmpdir / "cache")
+            self.scan(cache, script)
+            self.assertTrue(cache.unsupported)
+            self.assertFalse((self.tmpdir / "cache/module-graph").exists())
+
+        cache = GraphCache(self.tmpdir / "cache")
+        self.scan(cache, script)
+        self.assertFalse(cache.unsupported)
+
+        with mock.patch.object(
+            _graphcache, "MODULEGRAPH2_VERSIONS", SpecifierSet("<0")
+        ):
+            cache = GraphCache(self.tmpdir / "cache")
+            graph = self.scan(cache, script)
+            self.assertFalse(cache.hit)
+            self.assertIsNotNone(graph.find_node("cached_a"))
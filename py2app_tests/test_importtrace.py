@@ -0,0 +1,128 @@
+import importlib.resources
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from modulegraph2 import MissingModule
+
+from py2app import _builder, _config, _importtrace
+from py2app._bundlepaths import bundle_paths
+from py2app._progress import Progress
+
+BOOTSTRAP = importlib.resources.files("py2app.bootstrap").joinpath("_import_trace.py")
+
+
+class TestImportTrace(unittest.TestCase):
+    def test_read_import_trace(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = pathlib.Path(tmpdir) / "trace.txt"
+            path.write_text("# comment\nos\n\n  json  \nos\njson.decoder\n")
+            self.assertEqual(
+                _importtrace.read_import_trace(path), ["os", "json", "json.decoder"]
+            )
+
+    def test_order_by_trace(self):
+        nodes = [MissingModule(name) for name in ("a", "b", "c", "d", "e")]
+        ordered = _importtrace.order_by_trace(nodes, ["d", "x", "b"])
+        self.assertEqual([n.identifier for n in ordered], ["d", "b", "a", "c", "e"])
+
+        ordered = _importtrace.order_by_trace(nodes, [])
+        self.assertEqual(ordered, nodes)
+
+    def test_recording(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            trace = pathlib.Path(tmpdir) / "trace.txt"
+            script = BOOTSTRAP.read_text() + "\nimport json\nimport colorsys\n"
+
+            subprocess.check_call(
+                [sys.executable, "-c", script],
+                env=dict(os.environ, PY2APP_IMPORT_TRACE=str(trace)),
+            )
+
+            names = _importtrace.read_import_trace(trace)
+            self.assertIn("sys", names)
+            self.assertIn("json", names)
+            self.assertLess(names.index("json"), names.index("colorsys"))
+
+            # Nothing is recorded without the environment variable
+            trace.unlink()
+            env = dict(os.environ)
+            env.pop("PY2APP_IMPORT_TRACE", None)
+            subprocess.check_call([sys.executable, "-c", script], env=env)
+            self.assertFalse(trace.exists())
+
+    def test_bootstrap(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = pathlib.Path(tmpdir)
+            paths = bundle_paths(tmp / "Test.app")
+            for path in paths.all_directories():
+                path.mkdir(parents=True, exist_ok=True)
+
+            progress = Progress(level=0)
+            try:
+                for build_type, record, included in (
+                    ("standalone", False, False),
+                    ("standalone", True, True),
+                    ("alias", False, True),
+                ):
+                    with self.subTest(build_type=build_type, record=record):
+                        config = _config.parse_pyproject(
+                            {
+                                "tool": {
+                                    "py2app": {
+                                        "build-type": build_type,
+                                        "bundle": {"test": {"script": "main.py"}},
+                                    }
+                                }
+                            },
+                            tmp,
+                        )
+                        _builder.add_bootstrap(
+                            paths,
+                            config.bundles[0],
+                            None,
+                            progress,
+                            [],
+                            record_import_trace=record,
+                        )
+                        preboot = (paths.resources / "__preboot__.py").read_text()
+                        self.assertEqual("_setup_import_trace()" in preboot, included)
+                        if included:
+                            # The tracer is installed after the other finders
+                            self.assertLess(
+                                preboot.index("PY2APP_EXTENSIONS"),
+                                preboot.index("_setup_import_trace()"),
+                            )
+            finally:
+                progress.stop()
+
+    def test_recording_after_other_finders(self):
+        # The tracer records modules imported before it was installed,
+        # and modules found by finders installed before it.
+        with tempfile.TemporaryDirectory() as tmpdir:
+            trace = pathlib.Path(tmpdir) / "trace.txt"
+            module = pathlib.Path(tmpdir) / "trace_fake.py"
+            module.write_text("")
+            script = (
+                "import colorsys\n"
+                "import importlib.util, sys\n"
+                "class Finder:\n"
+                "    @staticmethod\n"
+                "    def find_spec(name, path=None, target=None):\n"
+                "        if name == 'trace_fake':\n"
+                f"            return importlib.util.spec_from_file_location(name, {str(module)!r})\n"
+                "sys.meta_path.insert(0, Finder)\n"
+                + BOOTSTRAP.read_text()
+                + "\nimport trace_fake\n"
+            )
+            subprocess.check_call(
+                [sys.executable, "-c", script],
+                env=dict(os.environ, PY2APP_IMPORT_TRACE=str(trace)),
+            )
+
+            names = _importtrace.read_import_trace(trace)
+            self.assertIn("colorsys", names)
+            self.assertIn("trace_fake", names)
@@ -0,0 +1,258 @@
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from py2app import _incremental
+
+
+class TestSyncBundle(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmp = pathlib.Path(self._tmpdir.name)
+        self.staging = self.tmp / "build" / "main.app"
+        self.output = self.tmp / "dist" / "main.app"
+        self.manifest = self.tmp / "build" / "main.app.manifest.json"
+        self.progress = mock.Mock()
+        self.progress.iter_task.side_effect = lambda items, label, current: items
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def stage(self, files):
+        for relpath, data in files.items():
+            path = self.staging / relpath
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if isinstance(data, pathlib.PurePath):
+                path.symlink_to(data)
+            else:
+                path.write_bytes(data)
+
+    def sync(self):
+        return _incremental.sync_bundle(
+            self.staging, self.output, self.manifest, self.progress
+        )
+
+    def test_initial_sync(self):
+        self.stage({"Contents/Info.plist": b"plist", "Contents/MacOS/main": b"exe"})
+
+        result = self.sync()
+        self.assertEqual(result.written, 2)
+        self.assertEqual(result.unchanged, 0)
+        self.assertEqual((self.output / "Contents/Info.plist").read_bytes(), b"plist")
+        self.assertEqual((self.output / "Contents/MacOS/main").read_bytes(), b"exe")
+        self.assertTrue(self.manifest.exists())
+
+    def test_incremental_sync(self):
+        self.stage(
+            {
+                "Contents/Info.plist": b"plist",
+                "Contents/MacOS/main": b"exe",
+                "Contents/Resources/old.txt": b"old",
+                "Contents/Frameworks/Current": pathlib.PurePath("A"),
+            }
+        )
+        self.sync()
+        unchanged = (self.output / "Contents/MacOS/main").stat()
+
+        shutil.rmtree(self.staging)
+
+        self.stage(
+            {
+                "Contents/Info.plist": b"new plist",
+                "Contents/MacOS/main": b"exe",
+                "Contents/Resources/new.txt": b"new",
+                "Contents/Frameworks/Current": pathlib.PurePath("A"),
+            }
+        )
+        result = self.sync()
+
+        self.assertEqual(result.written, 2)
+        self.assertEqual(result.unchanged, 2)
+        self.assertEqual(result.deleted, 1)
+
+        self.assertEqual(
+            (self.output / "Contents/Info.plist").read_bytes(), b"new plist"
+        )
+        self.assertEqual(
+            (self.output / "Contents/Resources/new.txt").read_bytes(), b"new"
+        )
+        self.assertFalse((self.output / "Contents/Resources/old.txt").exists())
+        self.assertEqual(os.readlink(self.output / "Contents/Frameworks/Current"), "A")
+
+        st = (self.output / "Contents/MacOS/main").stat()
+        self.assertEqual(st.st_ino, unchanged.st_ino)
+        self.assertEqual(st.st_mtime_ns, unchanged.st_mtime_ns)
+
+    def test_modified_output(self):
+        self.stage({"Contents/Info.plist": b"plist"})
+        self.sync()
+
+        # Changing the output outside of py2app is detected
+        (self.output / "Contents/Info.plist").write_bytes(b"changed!")
+
+        self.stage({"Contents/Info.plist": b"plist"})
+        result = self.sync()
+        self.assertEqual(result.written, 1)
+        self.assertEqual((self.output / "Contents/Info.plist").read_bytes(), b"plist")
+
+    def test_file_replaced_by_directory(self):
+        self.stage({"Contents/Resources/data": b"file"})
+        self.sync()
+
+        shutil.rmtree(self.staging)
+        self.stage({"Contents/Resources/data/file.txt": b"file"})
+        self.sync()
+        self.assertEqual(
+            (self.output / "Contents/Resources/data/file.txt").read_bytes(), b"file"
+        )
+
+    def test_unchanged_staging_not_hashed(self):
+        self.stage({"Contents/Info.plist": b"plist", "Contents/MacOS/main": b"exe"})
+        self.sync()
+
+        # The staging tree is kept, files in it that haven't changed
+        # are not read again.
+        with mock.patch.object(
+            _incremental, "_file_hash", wraps=_incremental._file_hash
+        ) as file_hash:
+            result = self.sync()
+
+        self.assertTrue(self.staging.is_dir())
+        file_hash.assert_not_called()
+        self.assertEqual(result.hashed, 0)
+        self.assertEqual(result.unchanged, 2)
+        self.assertEqual(result.written, 0)
+
+
+class TestStagingTree(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmp = pathlib.Path(self._tmpdir.name)
+        self.source = self.tmp / "src"
+        self.source.mkdir()
+        self.output = self.tmp / "dist" / "main.app"
+        self.progress = mock.Mock()
+        self.progress.iter_task.side_effect = lambda items, label, current: items
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def build(self, names, modify=None):
+        """
+        Build a bundle containing copies of the source files
+        in *names*, and return the staging tree. *modify* is
+        called with the staging tree before updating the output.
+        """
+        root = self.tmp / "build" / "main.app"
+        tree = _incremental.StagingTree(root, root.with_name("main.app.manifest.json"))
+        tree.prepare()
+        (root / "Contents/Resources").mkdir(parents=True)
+        for name in names:
+            tree.copy_file(self.source / name, root / "Contents/Resources" / name)
+
+        if modify is not None:
+            modify(tree)
+
+        _incremental.sync_bundle(
+            root, self.output, tree.manifest_path, self.progress, tree.copies
+        )
+        tree.finish()
+        return tree
+
+    def test_reuse(self):
+        (self.source / "a.txt").write_bytes(b"a")
+        (self.source / "b.txt").write_bytes(b"b")
+        (self.source / "b.txt").chmod(0o600)
+
+        tree = self.build(["a.txt", "b.txt"])
+        self.assertEqual((tree.copied, tree.reused), (2, 0))
+        staged = tree.root / "Contents/Resources/b.txt"
+        st = staged.stat()
+
+        # Later build steps changing the mode don't affect reuse
+        staged.chmod(0o444)
+
+        with mock.patch.object(
+            _incremental, "_file_hash", wraps=_incremental._file_hash
+        ) as file_hash:
+            tree = self.build(["a.txt", "b.txt"])
+
+        file_hash.assert_not_called()
+        self.assertEqual((tree.copied, tree.reused), (0, 2))
+        self.assertEqual(staged.stat().st_ino, st.st_ino)
+        self.assertEqual(staged.stat().st_mode, st.st_mode)
+        self.assertFalse(tree.root.with_name("main.app.previous").exists())
+        self.assertEqual((self.output / "Contents/Resources/b.txt").read_bytes(), b"b")
+
+    def test_changed_source(self):
+        (self.source / "a.txt").write_bytes(b"a")
+        self.build(["a.txt"])
+
+        (self.source / "a.txt").write_bytes(b"changed")
+        tree = self.build(["a.txt"])
+        self.assertEqual((tree.copied, tree.reused), (1, 0))
+        self.assertEqual(
+            (self.output / "Contents/Resources/a.txt").read_bytes(), b"changed"
+        )
+
+    def test_modified_copy(self):
+        # A copy that is changed by a later build step, such
+        # as rewriting load commands, is not reused.
+        (self.source / "a.txt").write_bytes(b"a")
+
+        def modify(tree):
+            (tree.root / "Contents/Resources/a.txt").write_bytes(b"b")
+
+        self.build(["a.txt"], modify)
+        tree = self.build(["a.txt"])
+        self.assertEqual((tree.copied, tree.reused), (1, 0))
+        self.assertEqual((self.output / "Contents/Resources/a.txt").read_bytes(), b"a")
+
+    def test_removed_file(self):
+        (self.source / "a.txt").write_bytes(b"a")
+        (self.source / "b.txt").write_bytes(b"b")
+        self.build(["a.txt", "b.txt"])
+
+        tree = self.build(["a.txt"])
+        self.assertEqual((tree.copied, tree.reused), (0, 1))
+        self.assertFalse((tree.root / "Contents/Resources/b.txt").exists())
+        self.assertFalse((self.output / "Contents/Resources/b.txt").exists())
+        self.assertFalse(tree.root.with_name("main.app.previous").exists())
+
+    def test_processed_copy(self):
+        # A copy that is processed by a later build step is
+        # reused when the inputs for processing are the same.
+        (self.source / "a.txt").write_bytes(b"a")
+        staged = self.tmp / "build/main.app/Contents/Resources/a.txt"
+        sources = []
+
+        def process(value):
+            def modify(tree):
+                sources.append(tree.reused_source(staged))
+                tree.processed(staged, {"value": value})
+                if staged.read_bytes() == b"a":
+                    staged.write_bytes(value.encode())
+
+            return modify
+
+        tree = self.build(["a.txt"], process("b"))
+        self.assertEqual((tree.copied, tree.reused), (1, 0))
+        self.assertEqual((self.output / "Contents/Resources/a.txt").read_bytes(), b"b")
+
+        tree = self.build(["a.txt"], process("b"))
+        self.assertEqual((tree.copied, tree.reused), (0, 1))
+        self.assertEqual(staged.read_bytes(), b"b")
+
+        # Different inputs result in a new copy of the source
+        tree = self.build(["a.txt"], process("c"))
+        self.assertEqual((tree.copied, tree.reused), (1, 0))
+        self.assertEqual((self.output / "Contents/Resources/a.txt").read_bytes(), b"c")
+
+        self.assertEqual(sources, [None, self.source / "a.txt", self.source / "a.txt"])
+
+        # Files outside of the staging tree are ignored
+        tree.processed(self.source / "a.txt", {})
+        self.assertEqual(tree.reused_source(self.source / "a.txt"), None)
@@ -0,0 +1,657 @@
+import os
+import pathlib
+import struct
+import tempfile
+import unittest
+
+from macholib import mach_o
+from macholib.MachO import _RELOCATABLE, MachO
+
+from py2app import (
+    _config,
+    _incremental,
+    _macho_audit,
+    _machofiles,
+    _progress,
+    _standalone,
+    util,
+)
+from py2app._bundlepaths import bundle_paths
+from py2app._machofiles import MachOFileTable, MachOModel, scan_macho
+
+# Header of a 64-bit Mach-O file (MH_MAGIC_64, little endian)
+MACHO_HEADER = b"\xcf\xfa\xed\xfe" + bytes(28)
+
+CPU_TYPE_X86_64 = 0x01000007
+CPU_TYPE_ARM64 = 0x0100000C
+CPU_TYPE_I386 = 7
+CPU_TYPE_POWERPC = 18
+
+# arm64e with the pointer authentication ABI capability bit
+CPU_SUBTYPE_ARM64E = 2 - (1 << 31)
+
+
+def _lc_str(endian, cmd, fields, value):
+    # Load command with a trailing string, padded to 8 bytes
+    data = value.encode() + b"\0"
+    size = (8 + len(fields) + len(data) + 7) & ~7
+    return struct.pack(f"{endian}II", cmd, size) + (fields + data).ljust(
+        size - 8, b"\0"
+    )
+
+
+def make_macho(
+    cputype=CPU_TYPE_ARM64,
+    install_name=None,
+    dylibs=(),
+    rpaths=(),
+    deployment_target=0xB0000,
+    *,
+    cpusubtype=0,
+    version_min=False,
+    is64=True,
+    endian="<",
+    size=1024,
+):
+    """
+    Return the contents of a minimal Mach-O file with the given
+    load commands. *dylibs* contains names of libraries for
+    LC_LOAD_DYLIB, or (load command, name) tuples. The deployment
+    target is stored in LC_BUILD_VERSION, or LC_VERSION_MIN_MACOSX
+    when *version_min* is true.
+    """
+    # The load commands must fit before the first segment
+    if is64:
+        segment = struct.pack(
+            f"{endian}II16sQQQQiiII",
+            mach_o.LC_SEGMENT_64,
+            72,
+            b"__TEXT",
+            0,
+            512,
+            512,
+            size - 512,
+            5,
+            5,
+            0,
+            0,
+        )
+    else:
+        segment = struct.pack(
+            f"{endian}II16sIIIIiiII",
+            mach_o.LC_SEGMENT,
+            56,
+            b"__TEXT",
+            0,
+            512,
+            512,
+            size - 512,
+            5,
+            5,
+            0,
+            0,
+        )
+    commands = [segment]
+
+    dylib_fields = struct.pack(f"{endian}IIII", 24, 2, 0x10000, 0x10000)
+    if install_name is not None:
+        commands.append(_lc_str(endian, mach_o.LC_ID_DYLIB, dylib_fields, install_name))
+    # name, nmodules, linked_modules
+    prebound_fields = struct.pack(f"{endian}III", 20, 0, 20)
+    for name in dylibs:
+        cmd, name = name if isinstance(name, tuple) else (mach_o.LC_LOAD_DYLIB, name)
+        commands.append(
+            _lc_str(
+                endian,
+                cmd,
+                prebound_fields if cmd == mach_o.LC_PREBOUND_DYLIB else dylib_fields,
+                name,
+            )
+        )
+    for path in rpaths:
+        commands.append(
+            _lc_str(endian, mach_o.LC_RPATH, struct.pack(f"{endian}I", 12), path)
+        )
+    if deployment_target is not None:
+        if version_min:
+            commands.append(
+                struct.pack(
+                    f"{endian}IIII",
+                    mach_o.LC_VERSION_MIN_MACOSX,
+                    16,
+                    deployment_target,
+                    deployment_target,
+                )
+            )
+        else:
+            commands.append(
+                struct.pack(
+                    f"{endian}IIIIII",
+                    mach_o.LC_BUILD_VERSION,
+                    24,
+                    1,
+                    deployment_target,
+                    deployment_target,
+                    0,
+                )
+            )
+
+    body = b"".join(commands)
+    header = struct.pack(
+        f"{endian}IiiIIII",
+        mach_o.MH_MAGIC_64 if is64 else mach_o.MH_MAGIC,
+        cputype,
+        cpusubtype,
+        mach_o.MH_DYLIB if install_name is not None else mach_o.MH_EXECUTE,
+        len(commands),
+        len(body),
+        0,
+    )
+    if is64:
+        header += bytes(4)
+    return (header + body).ljust(size, b"\0")
+
+
+def make_fat(*slices, is64=False):
+    """
+    Return the contents of a universal binary containing
+    the Mach-O files *slices*.
+    """
+    align = 12
+    if is64:
+        magic, arch_format = mach_o.FAT_MAGIC_64, ">iiQQII"
+    else:
+        magic, arch_format = mach_o.FAT_MAGIC, ">iiIII"
+
+    header = struct.pack(">II", magic, len(slices))
+    data = b""
+    offset = 1 << align
+    for contents in slices:
+        cputype, cpusubtype = struct.unpack_from("<ii", contents, 4)
+        fields = [cputype, cpusubtype, offset, len(contents), align]
+        if is64:
+            fields.append(0)
+        header += struct.pack(arch_format, *fields)
+        padded = contents.ljust(
+            (len(contents) + (1 << align) - 1) & ~((1 << align) - 1), b"\0"
+        )
+        data += padded
+        offset += len(padded)
+
+    return header.ljust(1 << align, b"\0") + data
+
+
+class TestScanMacho(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self._tmpdir.name)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def check_scan(self, contents):
+        path = self.root / "binary"
+        path.write_bytes(contents)
+        model = scan_macho(path)
+        self.assertEqual(model, MachOModel.from_macho(MachO(str(path))))
+        return model
+
+    def test_thin(self):
+        model = self.check_scan(
+            make_macho(
+                install_name="@rpath/libfoo.dylib",
+                dylibs=[
+                    "/usr/lib/libSystem.B.dylib",
+                    (mach_o.LC_LOAD_WEAK_DYLIB, "@rpath/libweak.dylib"),
+                    (mach_o.LC_REEXPORT_DYLIB, "@rpath/libbar.dylib"),
+                ],
+                rpaths=["@loader_path/../lib", "/opt/lib"],
+                deployment_target=0xB0300,
+            )
+        )
+        self.assertEqual(model.headers[0].rpaths, ("@loader_path/../lib", "/opt/lib"))
+
+    def test_dylib_commands(self):
+        # The same commands as those rewritten by macholib
+        self.assertEqual(_machofiles._DYLIB_COMMANDS, _RELOCATABLE)
+
+        model = self.check_scan(
+            make_macho(
+                install_name="@rpath/libfoo.dylib",
+                dylibs=[
+                    (mach_o.LC_LOAD_UPWARD_DYLIB, "@rpath/libupward.dylib"),
+                    (mach_o.LC_PREBOUND_DYLIB, "@rpath/libprebound.dylib"),
+                    (mach_o.LC_LAZY_LOAD_DYLIB, "@rpath/liblazy.dylib"),
+                ],
+            )
+        )
+        self.assertEqual(model.headers[0].install_name, "@rpath/libfoo.dylib")
+        self.assertEqual(
+            model.headers[0].dylibs,
+            (
+                (mach_o.LC_LOAD_UPWARD_DYLIB, "@rpath/libupward.dylib"),
+                (mach_o.LC_PREBOUND_DYLIB, "@rpath/libprebound.dylib"),
+            ),
+        )
+
+    def test_32bit(self):
+        model = self.check_scan(
+            make_macho(
+                cputype=CPU_TYPE_POWERPC,
+                dylibs=["/usr/lib/libSystem.B.dylib"],
+                deployment_target=0xA0400,
+                version_min=True,
+                is64=False,
+                endian=">",
+            )
+        )
+        self.assertEqual(model.headers[0].arch, "powerpc")
+        self.assertEqual(model.headers[0].deployment_target, 0xA0400)
+
+        self.check_scan(make_macho(cputype=CPU_TYPE_I386, is64=False))
+
+    def test_fat(self):
+        for is64 in (False, True):
+            with self.subTest(is64=is64):
+                model = self.check_scan(
+                    make_fat(
+                        make_macho(
+                            cputype=CPU_TYPE_X86_64,
+                            dylibs=["@rpath/libx86.dylib"],
+                            deployment_target=0xA0900,
+                            version_min=True,
+                        ),
+                        make_macho(dylibs=["@rpath/libarm.dylib"]),
+                        is64=is64,
+                    )
+                )
+                self.assertEqual(
+                    [(hdr.arch, hdr.deployment_target) for hdr in model.headers],
+                    [("x86_64", 0xA0900), ("arm64", 0xB0000)],
+                )
+
+    def test_invalid(self):
+        path = self.root / "binary"
+        path.write_bytes(make_macho(dylibs=["@rpath/libfoo.dylib"])[:100])
+        with self.assertRaises(ValueError):
+            scan_macho(path)
+
+        path.write_bytes(b"\x00" * 64)
+        with self.assertRaises(ValueError):
+            scan_macho(path)
+
+
+class TestMachOFileTable(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self._tmpdir.name)
+
+        (self.root / "lib").mkdir()
+        (self.root / "lib/libfoo.dylib").write_bytes(MACHO_HEADER)
+        (self.root / "lib/data.txt").write_text("hello world")
+        (self.root / "lib/empty").write_bytes(b"")
+        (self.root / "main").write_bytes(MACHO_HEADER)
+        (self.root / "link.dylib").symlink_to("lib/libfoo.dylib")
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_is_macho(self):
+        table = MachOFileTable()
+        self.assertTrue(table.is_macho(self.root / "main"))
+        self.assertFalse(table.is_macho(self.root / "lib/data.txt"))
+        self.assertFalse(table.is_macho(self.root / "lib/empty"))
+        self.assertFalse(table.is_macho(self.root / "link.dylib"))
+        self.assertFalse(table.is_macho(self.root / "lib"))
+        self.assertFalse(table.is_macho(self.root / "missing"))
+        self.assertEqual((table.hits, table.misses), (0, 3))
+
+        self.assertTrue(table.is_macho(str(self.root / "main")))
+        self.assertEqual((table.hits, table.misses), (1, 3))
+
+    def test_changed_file(self):
+        table = MachOFileTable()
+        path = self.root / "lib/data.txt"
+        self.assertFalse(table.is_macho(path))
+
+        path.write_bytes(MACHO_HEADER)
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertTrue(table.is_macho(path))
+        self.assertEqual((table.hits, table.misses), (0, 2))
+
+    def test_iter_files(self):
+        table = MachOFileTable()
+        expected = {self.root / "main", self.root / "lib/libfoo.dylib"}
+        self.assertEqual(set(table.iter_files(self.root)), expected)
+        self.assertEqual(table.misses, 4)
+
+        # The other users of the table don't open files again
+        self.assertEqual(
+            set(_standalone.iter_platform_files(self.root, table)), expected
+        )
+        self.assertEqual(
+            set(_macho_audit.macho_files(self.root, table)),
+            {p.resolve() for p in expected},
+        )
+        self.assertEqual(
+            set(util._macho_find(self.root, table)), {str(p) for p in expected}
+        )
+        self.assertEqual(table.misses, 4)
+
+        # Subtrees can be scanned separately
+        self.assertEqual(
+            list(table.iter_files(self.root / "lib")), [self.root / "lib/libfoo.dylib"]
+        )
+
+
+class TestMachOModel(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self._tmpdir.name)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_model(self):
+        path = self.root / "libfoo.dylib"
+        path.write_bytes(
+            make_macho(
+                install_name="@rpath/libfoo.dylib",
+                dylibs=["/usr/lib/libSystem.B.dylib", "/opt/lib/libbar.dylib"],
+                rpaths=["@loader_path/../lib"],
+                deployment_target=0xC0100,
+            )
+        )
+
+        table = MachOFileTable()
+        model = table.model(path)
+        self.assertEqual(len(model.headers), 1)
+        header = model.headers[0]
+        self.assertEqual(header.arch, "arm64")
+        self.assertEqual(header.deployment_target, 0xC0100)
+        self.assertEqual(header.install_name, "@rpath/libfoo.dylib")
+        self.assertEqual(header.rpaths, ("@loader_path/../lib",))
+        self.assertEqual(
+            header.dylibs,
+            (
+                (mach_o.LC_LOAD_DYLIB, "/usr/lib/libSystem.B.dylib"),
+                (mach_o.LC_LOAD_DYLIB, "/opt/lib/libbar.dylib"),
+            ),
+        )
+
+        self.assertIs(table.model(path), model)
+        self.assertTrue(table.is_macho(path))
+        self.assertEqual((table.scanned, table.parsed), (1, 0))
+
+    def test_rewrite(self):
+        path = self.root / "main"
+        path.write_bytes(make_macho(dylibs=["/opt/lib/libbar.dylib"]))
+
+        table = MachOFileTable()
+        macho = table.parse(path)
+        self.assertTrue(
+            macho.rewriteLoadCommands(
+                lambda name: "@rpath/libbar.dylib" if name.startswith("/opt") else name
+            )
+        )
+        _standalone.rewrite_headers(path, macho, table)
+
+        # The model is updated without reading the file again
+        self.assertEqual(
+            table.model(path).headers[0].dylibs,
+            ((mach_o.LC_LOAD_DYLIB, "@rpath/libbar.dylib"),),
+        )
+        self.assertEqual((table.scanned, table.parsed), (0, 1))
+
+    def test_changed_file(self):
+        path = self.root / "main"
+        path.write_bytes(make_macho())
+
+        table = MachOFileTable()
+        self.assertEqual(table.model(path).headers[0].arch, "arm64")
+
+        # Files changed outside of the table are scanned again
+        path.write_bytes(make_macho(cputype=CPU_TYPE_X86_64, deployment_target=None))
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        header = table.model(path).headers[0]
+        self.assertEqual(header.arch, "x86_64")
+        self.assertIsNone(header.deployment_target)
+        self.assertEqual(table.scanned, 2)
+
+    def test_audit(self):
+        bundle = self.root / "Test.app"
+        (bundle / "Contents/MacOS").mkdir(parents=True)
+        (bundle / "Contents/Frameworks").mkdir(parents=True)
+        (bundle / "Contents/MacOS/main").write_bytes(
+            make_macho(
+                dylibs=["@rpath/libfoo.dylib", "@rpath/libmissing.dylib"],
+                deployment_target=0xB0000,
+            )
+        )
+        (bundle / "Contents/Frameworks/libfoo.dylib").write_bytes(
+            make_macho(
+                install_name="@rpath/libfoo.dylib",
+                dylibs=["/opt/lib/libbar.dylib"],
+                rpaths=["/opt/lib"],
+                deployment_target=0xC0000,
+            )
+        )
+
+        table = MachOFileTable()
+        for path in table.iter_files(bundle):
+            table.parse(path)
+        self.assertEqual(table.parsed, 2)
+
+        architecture, deployment_target, warnings = _macho_audit.audit_macho_issues(
+            bundle, table
+        )
+        self.assertEqual((table.scanned, table.parsed), (0, 2))
+        self.assertEqual(architecture, "arm64")
+        self.assertEqual(deployment_target, "12")
+
+        libfoo = str((bundle / "Contents/Frameworks/libfoo.dylib").resolve())
+        main = str((bundle / "Contents/MacOS/main").resolve())
+        self.assertEqual(
+            warnings,
+            sorted(
+                [
+                    f"{libfoo!r} has RPATH entry with absolute path: /opt/lib",
+                    f"{libfoo!r} links to library '/opt/lib/libbar.dylib' "
+                    "outside of system locations",
+                    f"{main!r} links to library '@rpath/libmissing.dylib' that "
+                    f"doesn't exist on rpath: {bundle / 'Contents/Frameworks'}",
+                ]
+            ),
+        )
+
+
+class RecordingProgress(_progress.Progress):
+    def __init__(self):
+        super().__init__(level=0, live=False)
+        self.messages = []
+
+    def trace(self, message):
+        self.messages.append(("trace", message))
+
+    def warning(self, message):
+        self.messages.append(("warning", message))
+
+    def error(self, message):
+        self.messages.append(("error", message))
+        super().error("")
+
+
+class TestMachOStandalone(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmpdir = pathlib.Path(self._tmpdir.name)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def build(self, name, jobs, staging=None, arch="arm64"):
+        """
+        Create a bundle with Mach-O files referring to a library
+        outside of the bundle and run *macho_standalone* on it.
+        """
+        root = self.tmpdir / name
+        libdep = root / "ext/libdep.dylib"
+        if not libdep.exists():
+            libdep.parent.mkdir(parents=True)
+            libdep.write_bytes(make_macho(install_name=str(libdep)))
+
+        paths = bundle_paths(root / "Test.app")
+        for path in paths.all_directories():
+            path.mkdir(parents=True, exist_ok=True)
+
+        (paths.main / "main").write_bytes(
+            make_macho(dylibs=[str(libdep)], rpaths=["/opt/lib"])
+        )
+        for idx in range(_standalone.MIN_PARALLEL_REWRITES):
+            (paths.extlib / f"ext{idx}.so").write_bytes(
+                make_macho(
+                    dylibs=["/usr/lib/libSystem.B.dylib", str(libdep)],
+                    rpaths=["@loader_path/../../Frameworks"],
+                )
+            )
+        (paths.extlib / "system.so").write_bytes(
+            make_macho(dylibs=["/usr/lib/libSystem.B.dylib"])
+        )
+        (paths.extlib / "broken.so").write_bytes(
+            make_macho(dylibs=[str(root / "ext/libmissing.dylib")])
+        )
+
+        config = _config.parse_pyproject(
+            {
+                "tool": {
+                    "py2app": {"bundle": {"main": {"script": "main.py", "arch": arch}}}
+                }
+            },
+            self.tmpdir,
+        )
+        progress = RecordingProgress()
+        table = MachOFileTable()
+        try:
+            _standalone.macho_standalone(
+                paths, None, config.bundles[0], {}, progress, table, jobs, staging
+            )
+        finally:
+            progress.stop()
+
+        return paths, table, progress
+
+    def check_result(self, name, jobs):
+        paths, table, progress = self.build(name, jobs)
+        root = str(self.tmpdir / name)
+
+        self.assertTrue(progress.have_error)
+        # Ignore the timing of tasks
+        messages = [
+            (level, msg.replace(root, "ROOT"))
+            for level, msg in progress.messages
+            if level != "trace" or ": Rewrite " in msg
+        ]
+        self.assertEqual(
+            [msg for msg in messages if msg[0] != "trace"],
+            [
+                (
+                    "error",
+                    "Required MachO library file ROOT/ext/libmissing.dylib does not exist",
+                ),
+                (
+                    "warning",
+                    "'ROOT/Test.app/Contents/MacOS/main': replacing non-portable "
+                    "LC_RPATH entry '/opt/lib'",
+                ),
+            ],
+        )
+        self.assertIn(
+            (
+                "trace",
+                "ROOT/Test.app/Contents/MacOS/main: Rewrite ROOT/ext/libdep.dylib "
+                "to @rpath/libdep.dylib",
+            ),
+            messages,
+        )
+
+        # The load commands are scanned once, and the rewritten files
+        # are not read again
+        self.assertEqual(table.scanned, _standalone.MIN_PARALLEL_REWRITES + 4)
+        self.assertEqual(table.parsed, 0)
+
+        header = table.model(paths.main / "main").headers[0]
+        self.assertEqual(
+            header.dylibs, ((mach_o.LC_LOAD_DYLIB, "@rpath/libdep.dylib"),)
+        )
+        self.assertEqual(header.rpaths, ("@executable_path/../Frameworks",))
+
+        header = table.model(paths.framework / "libdep.dylib").headers[0]
+        self.assertEqual(header.install_name, "@rpath/libdep.dylib")
+
+        header = table.model(paths.extlib / "ext0.so").headers[0]
+        self.assertEqual(
+            header.dylibs,
+            (
+                (mach_o.LC_LOAD_DYLIB, "/usr/lib/libSystem.B.dylib"),
+                (mach_o.LC_LOAD_DYLIB, "@rpath/libdep.dylib"),
+            ),
+        )
+        self.assertEqual(table.scanned, _standalone.MIN_PARALLEL_REWRITES + 4)
+
+        # The models are the same as those of the files on disk
+        for path in table.iter_files(paths.root):
+            self.assertEqual(table.model(path), MachOFileTable().model(path))
+
+        return messages
+
+    def test_serial(self):
+        self.check_result("serial", 1)
+
+    def test_parallel(self):
+        # Messages are reported in the same order as
+        # for a serial build.
+        self.assertEqual(
+            self.check_result("parallel", 2), self.check_result("serial", 1)
+        )
+
+    def build_staged(self, arch="arm64"):
+        """
+        Build in a staging tree that is kept between builds, and
+        return the staging tree and the model of the copy of the
+        library in the bundle.
+        """
+        root = self.tmpdir / "staged/Test.app"
+        staging = _incremental.StagingTree(
+            root, root.with_name("Test.app.manifest.json")
+        )
+        staging.prepare()
+        paths, table, progress = self.build("staged", 1, staging, arch)
+        _incremental.sync_bundle(
+            root,
+            self.tmpdir / "dist/Test.app",
+            staging.manifest_path,
+            progress,
+            staging.copies,
+        )
+        staging.finish()
+
+        libdep = paths.framework / "libdep.dylib"
+        self.assertEqual(table.model(libdep), MachOFileTable().model(libdep))
+        return staging, table.model(libdep)
+
+    def test_staging(self):
+        staging, model = self.build_staged()
+        self.assertEqual((staging.copied, staging.reused), (1, 0))
+        self.assertEqual(model.headers[0].install_name, "@rpath/libdep.dylib")
+
+        # The rewritten copy is reused
+        staging, reused_model = self.build_staged()
+        self.assertEqual((staging.copied, staging.reused), (0, 1))
+        self.assertEqual(reused_model, model)
+
+        # A different architecture results in a new copy
+        staging, reused_model = self.build_staged("universal2")
+        self.assertEqual((staging.copied, staging.reused), (1, 0))
+        self.assertEqual(reused_model, model)
@@ -0,0 +1,94 @@
+import json
+import pathlib
+import tempfile
+import threading
+import unittest
+
+from py2app import _progress
+
+
+class TestProgressProfile(unittest.TestCase):
+    def setUp(self):
+        self.progress = _progress.Progress(level=0)
+
+    def tearDown(self):
+        self.progress.stop()
+
+    def test_task_spans(self):
+        progress = self.progress
+
+        task_id = progress.add_task("Unbounded", count=None)
+        progress.step_task(task_id)
+        with progress.span("inner", "recipe") as inner:
+            self.assertIsNone(inner.end)
+        self.assertIsNotNone(inner.end)
+        progress.task_done(task_id)
+
+        task_id = progress.add_task("Bounded", count=2)
+        progress.step_task(task_id)
+        self.assertIsNone(progress.spans[-1].end)
+        progress.step_task(task_id)
+        self.assertIsNotNone(progress.spans[-1].end)
+
+        for _ in progress.iter_task([1, 2], "Iterate", str):
+            pass
+
+        progress.add_task("Still running", count=None)
+
+        spans = progress.spans
+        self.assertEqual(
+            [(s.name, s.category) for s in spans],
+            [
+                ("Unbounded", "task"),
+                ("inner", "recipe"),
+                ("Bounded", "task"),
+                ("Iterate", "task"),
+                ("Still running", "task"),
+            ],
+        )
+        self.assertTrue(all(s.end is not None for s in spans[:-1]))
+        self.assertIsNone(spans[-1].end)
+
+        outer, inner = spans[:2]
+        self.assertLessEqual(outer.start, inner.start)
+        self.assertLessEqual(inner.end, outer.end)
+        self.assertGreaterEqual(outer.wall_time, inner.wall_time)
+        self.assertGreaterEqual(outer.cpu_time, 0)
+
+    def test_write_profile(self):
+        progress = self.progress
+
+        def worker():
+            with progress.span("thread"):
+                pass
+
+        task_id = progress.add_task("Task", count=None)
+        with progress.span("main"):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+        progress.task_done(task_id)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = pathlib.Path(tmpdir) / "sub/profile.json"
+            progress.write_profile(path)
+            with open(path) as stream:
+                data = json.load(stream)
+
+        self.assertEqual(data["displayTimeUnit"], "ms")
+        events = {event["name"]: event for event in data["traceEvents"]}
+        self.assertEqual(set(events), {"Task", "main", "thread"})
+
+        for event in events.values():
+            self.assertEqual(event["ph"], "X")
+            self.assertGreaterEqual(event["ts"], 0)
+            self.assertGreaterEqual(event["dur"], 0)
+            self.assertIn("cpu_ms", event["args"])
+
+        self.assertEqual(events["main"]["cat"], "span")
+        self.assertEqual(events["Task"]["tid"], events["main"]["tid"])
+        self.assertNotEqual(events["main"]["tid"], events["thread"]["tid"])
+        self.assertLessEqual(
+            events["main"]["ts"] + events["main"]["dur"],
+            events["Task"]["ts"] + events["Task"]["dur"],
+        )
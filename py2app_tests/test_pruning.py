@@ -0,0 +1,201 @@
+import ast
+import pathlib
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from py2app import _pruning
+from py2app._modulegraph import ModuleGraph
+
+TARGET = _pruning.Target(machine="arm64")
+
+
+def guard(source):
+    return _pruning.evaluate_guard(ast.parse(source, mode="eval").body, TARGET)
+
+
+class TestPruning(unittest.TestCase):
+    def test_evaluate_guard(self):
+        for source, value in [
+            ("TYPE_CHECKING", False),
+            ("typing.TYPE_CHECKING", False),
+            ("not TYPE_CHECKING", True),
+            ("sys.platform == 'win32'", False),
+            ("sys.platform != 'win32'", True),
+            ("'darwin' == sys.platform", True),
+            ("sys.platform.startswith('linux')", False),
+            ("sys.platform.startswith(('win', 'darwin'))", True),
+            ("sys.platform in ('win32', 'cygwin')", False),
+            ("sys.platform not in ['win32', 'cygwin']", True),
+            ("os.name == 'nt'", False),
+            ("platform.system() == 'Windows'", False),
+            ("platform.machine() == 'x86_64'", False),
+            ("platform.machine() == 'arm64'", True),
+            ("sys.platform == 'win32' and foo", False),
+            ("sys.platform == 'win32' or foo", None),
+            ("os.name == 'posix' or foo", True),
+            ("sys.platform in 'win32'", None),
+            ("sys.version_info >= (3, 8)", None),
+            ("foo", None),
+            ("os.name.startswith(prefix)", None),
+        ]:
+            with self.subTest(source):
+                self.assertIs(guard(source), value)
+
+    def test_universal_machine(self):
+        expr = ast.parse("platform.machine() == 'x86_64'", mode="eval").body
+        self.assertIsNone(_pruning.evaluate_guard(expr, _pruning.Target()))
+
+    def test_dead_imports(self):
+        tree = ast.parse(
+            textwrap.dedent(
+                """\
+                import sys
+                from typing import TYPE_CHECKING
+
+                if TYPE_CHECKING:
+                    import decimal
+                    from collections import abc
+
+                if sys.platform == "win32":
+                    import winreg
+                    import json
+                elif sys.platform == "darwin":
+                    import plistlib
+                else:
+                    import unknown
+
+                if os.name != "nt":
+                    pass
+                else:
+                    from . import _windows
+                    from .. import sibling
+
+                def function():
+                    if TYPE_CHECKING:
+                        import fractions
+
+                if sys.platform == "win32":
+                    if dynamic:
+                        import nested
+
+                import json
+                """
+            )
+        )
+        self.assertEqual(
+            _pruning.dead_imports(tree, "pkg.sub", TARGET),
+            {
+                "decimal",
+                "collections",
+                "collections.abc",
+                "winreg",
+                "unknown",
+                "pkg.sub",
+                "pkg.sub._windows",
+                "pkg",
+                "pkg.sibling",
+                "fractions",
+                "nested",
+            },
+        )
+
+        # Relative imports outside of a package are ignored
+        tree = ast.parse("if TYPE_CHECKING:\n    from ... import mod\n")
+        self.assertEqual(_pruning.dead_imports(tree, "pkg", TARGET), set())
+
+    def test_may_have_guards(self):
+        self.assertTrue(_pruning.may_have_guards(b"if sys.platform == 'win32': pass"))
+        self.assertTrue(_pruning.may_have_guards(b"if TYPE_CHECKING: pass"))
+        self.assertFalse(_pruning.may_have_guards(b"import platform"))
+
+
+class TestGraphPruning(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmpdir = pathlib.Path(self._tmpdir.name)
+        sys.path.insert(0, self._tmpdir.name)
+
+    def tearDown(self):
+        sys.path.remove(self._tmpdir.name)
+        self._tmpdir.cleanup()
+
+    def write(self, name, source):
+        path = self.tmpdir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(textwrap.dedent(source))
+        return path
+
+    def test_prune(self):
+        script = self.write(
+            "main.py",
+            """\
+            import sys
+            import pruned_pkg
+            import pruned_shared
+            if sys.platform == "win32":
+                import pruned_win
+                import pruned_shared
+            """,
+        )
+        self.write(
+            "pruned_pkg/__init__.py",
+            """\
+            import os
+            if os.name == "nt":
+                from . import nt_only
+            from . import common
+            """,
+        )
+        self.write("pruned_pkg/nt_only.py", "import pruned_deep\n")
+        self.write("pruned_pkg/common.py", "")
+        self.write("pruned_win.py", "import pruned_deep\n")
+        self.write("pruned_deep.py", "x = 1\n")
+        self.write("pruned_shared.py", "")
+
+        graph = ModuleGraph()
+        graph.add_script(script)
+        self.assertIsNotNone(graph.find_node("pruned_win"))
+        self.assertIsNotNone(graph.find_node("pruned_pkg.nt_only"))
+
+        result = graph.prune_dead_imports(TARGET)
+        # The count includes dead imports in the stdlib
+        self.assertGreaterEqual(result.edges, 2)
+        self.assertGreaterEqual(result.nodes, 3)
+        self.assertGreaterEqual(
+            result.bytes, 2 * len("import pruned_deep\n") + len("x = 1\n")
+        )
+
+        for name in ("pruned_win", "pruned_pkg.nt_only", "pruned_deep"):
+            self.assertIsNone(graph.find_node(name))
+
+        for name in ("pruned_pkg", "pruned_pkg.common", "pruned_shared", "os"):
+            self.assertIsNotNone(graph.find_node(name))
+
+        reachable = {node.identifier for node in graph.iter_graph()}
+        self.assertIn("pruned_shared", reachable)
+        self.assertIn("pruned_pkg.common", reachable)
+
+        # Pruning again is a no-op
+        result = graph.prune_dead_imports(TARGET)
+        self.assertEqual((result.edges, result.nodes, result.bytes), (0, 0, 0))
+
+    def test_recipe_edges_are_kept(self):
+        script = self.write(
+            "main.py",
+            """\
+            from typing import TYPE_CHECKING
+            if TYPE_CHECKING:
+                import pruned_typing
+            """,
+        )
+        self.write("pruned_typing.py", "")
+
+        graph = ModuleGraph()
+        node = graph.add_script(script)
+        graph.import_module(node, "pruned_typing")
+
+        graph.prune_dead_imports(TARGET)
+        self.assertIsNotNone(graph.find_node("pruned_typing"))
+        graph.edge_data(node, "pruned_typing")
@@ -0,0 +1,125 @@
+import pathlib
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from py2app import _progress, _recipes
+from py2app._config import RecipeOptions
+from py2app._modulegraph import ModuleGraph
+
+
+class TestRecipeScheduler(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmpdir = pathlib.Path(self._tmpdir.name)
+        sys.path.insert(0, self._tmpdir.name)
+        for name in ("sched_a", "sched_b", "sched_c"):
+            (self.tmpdir / f"{name}.py").write_text("")
+
+        self.progress = _progress.Progress(level=0)
+
+    def tearDown(self):
+        self.progress.stop()
+        sys.path.remove(self._tmpdir.name)
+        self._tmpdir.cleanup()
+
+    def test_scheduler(self):
+        calls = []
+
+        def make_recipe(name, imports=None, **kwds):
+            def callback(graph, options):
+                calls.append(name)
+                if imports is not None:
+                    source, target = imports
+                    graph.import_module(graph.find_node(source), target)
+
+            return _recipes.RecipeInfo(name=name, callback=callback, **kwds)
+
+        registry = [
+            make_recipe("adds b", ("sched_a", "sched_b"), modules=["sched_a"]),
+            make_recipe("for b", ("sched_b", "sched_c"), modules=["sched_b"]),
+            make_recipe("unrelated", modules=["sched_a"]),
+            make_recipe("no guards"),
+            make_recipe("not used", modules=["sched_missing"]),
+        ]
+
+        script = self.tmpdir / "main.py"
+        script.write_text("import sched_a\n")
+        graph = ModuleGraph()
+        graph.add_script(script)
+
+        with mock.patch.object(_recipes, "RECIPE_REGISTRY", registry):
+            stats = _recipes.process_recipes(graph, RecipeOptions({}), self.progress)
+
+        self.assertEqual(
+            calls, ["adds b", "unrelated", "no guards", "for b", "no guards"]
+        )
+        self.assertEqual(
+            {name: value.runs for name, value in stats.items()},
+            {"adds b": 1, "for b": 1, "unrelated": 1, "no guards": 2},
+        )
+        self.assertTrue(all(value.seconds >= 0 for value in stats.values()))
+        self.assertIsNotNone(graph.find_node("sched_c"))
+
+        self.assertEqual(
+            [span.name for span in self.progress.spans if span.category == "recipe"],
+            calls,
+        )
+
+    def test_is_triggered_by(self):
+        graph = ModuleGraph()
+        node = graph.add_module("email.message")
+
+        def info(**kwds):
+            return _recipes.RecipeInfo(name="test", callback=None, **kwds)
+
+        self.assertTrue(_recipes._is_triggered_by(info(), []))
+        self.assertTrue(_recipes._is_triggered_by(info(modules=["email"]), [node]))
+        self.assertTrue(
+            _recipes._is_triggered_by(info(modules=["email.message"]), [node])
+        )
+        self.assertFalse(_recipes._is_triggered_by(info(modules=["emai"]), [node]))
+        self.assertFalse(
+            _recipes._is_triggered_by(info(distribution="pyobjc-core"), [node])
+        )
+
+
+class TestDistributionIndex(unittest.TestCase):
+    def test_find_distribution(self):
+        graph = ModuleGraph()
+        self.assertIsNone(graph.find_distribution("packaging"))
+
+        graph.add_module("packaging.version")
+        distribution = graph.find_distribution("packaging")
+        self.assertIsNotNone(distribution)
+        self.assertEqual(distribution.name, "packaging")
+        self.assertIs(graph.find_distribution("Packaging"), distribution)
+
+        for node in list(graph.nodes()):
+            if node.identifier.startswith("packaging"):
+                graph.remove_node(node)
+        self.assertIsNone(graph.find_distribution("packaging"))
+
+    def test_iter_recipes(self):
+        graph = ModuleGraph()
+        graph.add_module("packaging.version")
+        version = graph.find_distribution("packaging").version
+
+        def info(name, **kwds):
+            return _recipes.RecipeInfo(name=name, callback=None, **kwds)
+
+        registry = [
+            info("match", distribution="packaging", version_spec=f"=={version}"),
+            info("mismatch", distribution="packaging", version_spec=f"!={version}"),
+            info("missing", distribution="no-such-distribution"),
+            info("any version", distribution="packaging", modules=["packaging"]),
+        ]
+        self.assertIsNotNone(registry[0].specifier)
+        self.assertIsNone(registry[-1].specifier)
+
+        with mock.patch.object(_recipes, "RECIPE_REGISTRY", registry):
+            self.assertEqual(
+                [recipe.name for recipe in _recipes.iter_recipes(graph)],
+                ["match", "any version"],
+            )
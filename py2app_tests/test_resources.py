@@ -0,0 +1,80 @@
+import pathlib
+import tempfile
+import unittest
+
+from modulegraph2 import NamespacePackage
+
+from py2app import _resources
+
+
+def make_tree(root, files):
+    for relpath in files:
+        path = root / relpath
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(relpath)
+
+
+def make_package(name, search_path):
+    return NamespacePackage(
+        name=name,
+        loader=None,
+        distribution=None,
+        filename=None,
+        extension_attributes={},
+        search_path=search_path,
+        has_data_files=True,
+    )
+
+
+class TestResources(unittest.TestCase):
+    def test_iter_resources(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = pathlib.Path(tmpdir) / "pkg"
+            make_tree(
+                root,
+                [
+                    "__init__.py",
+                    "module.py",
+                    "stub.pyi",
+                    "ext.so",
+                    "data.txt",
+                    "__pycache__/module.cpython-311.pyc",
+                    "templates/base.html",
+                    "templates/nested/item.html",
+                    "subpackage/__init__.py",
+                    "subpackage/data.txt",
+                ],
+            )
+
+            node = make_package("pkg", [root])
+            resources = dict(_resources.iter_resources(node))
+            self.assertEqual(
+                set(resources),
+                {"data.txt", "templates/base.html", "templates/nested/item.html"},
+            )
+            self.assertEqual(resources["data.txt"], root / "data.txt")
+
+    def test_iter_resources_namespace(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = pathlib.Path(tmpdir)
+            make_tree(tmp, ["a/ns/one.txt", "b/ns/two.txt"])
+
+            node = make_package("ns", [tmp / "a/ns", tmp / "b/ns", tmp / "c/ns"])
+            self.assertEqual(
+                [name for name, _ in _resources.iter_resources(node)],
+                ["one.txt", "two.txt"],
+            )
+
+    def test_contains_dylib(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = pathlib.Path(tmpdir)
+            make_tree(
+                tmp, ["pkg/__init__.py", "pkg/.dylibs/libfoo.dylib", "other/a.py"]
+            )
+
+            self.assertTrue(
+                _resources.contains_dylib(make_package("pkg", [tmp / "pkg"]))
+            )
+            self.assertFalse(
+                _resources.contains_dylib(make_package("other", [tmp / "other"]))
+            )
@@ -0,0 +1,171 @@
+import pathlib
+import sys
+import tempfile
+import textwrap
+import unittest
+from unittest import mock
+
+from py2app import _builder, _config, _progress, _recipes
+from py2app._graphcache import dump_graph, load_graph
+from py2app._modulegraph import ModuleGraph
+
+
+class TestSharedScan(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmpdir = pathlib.Path(self._tmpdir.name)
+        sys.path.insert(0, self._tmpdir.name)
+
+        self.progress = _progress.Progress(level=0)
+
+    def tearDown(self):
+        self.progress.stop()
+        sys.path.remove(self._tmpdir.name)
+        self._tmpdir.cleanup()
+
+    def write(self, name, source):
+        path = self.tmpdir / name
+        path.write_text(textwrap.dedent(source))
+        return path
+
+    def config(self, bundles):
+        return _config.parse_pyproject(
+            {"tool": {"py2app": {"bundle": bundles}}}, self.tmpdir
+        )
+
+    def test_subgraph(self):
+        script = self.write("main.py", "import shared_a\n")
+        self.write("shared_a.py", "import shared_b\n")
+        self.write("shared_b.py", "")
+        self.write("shared_c.py", "import shared_b\n")
+
+        graph = ModuleGraph()
+        graph.add_script(script)
+        graph.add_module("shared_c")
+
+        sub = graph.subgraph(["shared_c"])
+        self.assertEqual(
+            {node.identifier for node in sub.iter_graph()},
+            {node.identifier for node in graph.iter_graph(node="shared_c")},
+        )
+        self.assertIsNone(sub.find_node("shared_a"))
+        self.assertEqual(sub.find_node("shared_b"), graph.find_node("shared_b"))
+
+        # The subgraph can be updated without affecting the original
+        sub.add_module("shared_a")
+        self.assertNotIn("shared_a", {node.identifier for node in graph.roots()})
+
+        sub.mark_zipunsafe(sub.find_node("shared_b"), "test")
+        self.assertFalse(sub.is_zipsafe(sub.find_node("shared_b")))
+        self.assertTrue(graph.is_zipsafe(graph.find_node("shared_b")))
+
+    def test_dump_graph(self):
+        script = self.write("main.py", "import shared_a\n")
+        self.write("shared_a.py", "x = 1\n")
+
+        graph = ModuleGraph()
+        graph.add_script(script)
+
+        copy = load_graph(dump_graph(graph))
+        self.assertEqual(set(copy._nodes), set(graph._nodes))
+        self.assertEqual(copy._edges, graph._edges)
+        self.assertEqual(
+            copy.find_node("shared_a").code.co_names,
+            graph.find_node("shared_a").code.co_names,
+        )
+
+    def test_shared_module_graphs(self):
+        self.write("main.py", "import shared_a\n")
+        self.write("helper.py", "import shared_c\n")
+        self.write("other.py", "import shared_a\n")
+        self.write("shared_a.py", "import shared_b\n")
+        self.write("shared_b.py", "")
+        self.write("shared_c.py", "import shared_b\n")
+
+        config = self.config(
+            {
+                "main": {"script": "main.py"},
+                "helper": {"script": "helper.py", "plugin": True},
+                "other": {"script": "other.py", "exclude": ["shared_b"]},
+            }
+        )
+        graphs = _builder.get_shared_module_graphs(
+            config, config.bundles, self.progress
+        )
+
+        # "other" cannot share the scan because of its excludes
+        self.assertEqual(set(graphs), {"main", "helper"})
+
+        for bundle in config.bundles[:2]:
+            expected = _builder.get_module_graph(bundle, self.progress)
+            expected.add_module("zipfile")
+            _builder.process_recipes(expected, config.recipe, self.progress)
+
+            self.assertEqual(
+                {node.identifier for node in graphs[bundle.name].iter_graph()},
+                {node.identifier for node in expected.iter_graph()},
+            )
+
+        self.assertIsNone(graphs["main"].find_node("shared_c"))
+        self.assertIsNone(graphs["helper"].find_node("shared_a"))
+
+    def test_recipes_per_bundle(self):
+        # Changes made by recipes only affect the bundle that
+        # triggered the recipe.
+        self.write("main.py", "import shared_a\n")
+        self.write("helper.py", "import shared_c\n")
+        self.write("shared_a.py", "import shared_b\n")
+        self.write("shared_b.py", "")
+        self.write("shared_c.py", "import shared_b\n")
+        self.write("shared_extra.py", "")
+
+        def callback(graph, options):
+            graph.mark_zipunsafe(graph.find_node("shared_b"), "test")
+            graph.add_module("shared_extra")
+
+        registry = [
+            _recipes.RecipeInfo(
+                name="helper only", callback=callback, modules=["shared_c"]
+            )
+        ]
+
+        config = self.config(
+            {
+                "main": {"script": "main.py"},
+                "helper": {"script": "helper.py", "plugin": True},
+            }
+        )
+        with mock.patch.object(_recipes, "RECIPE_REGISTRY", registry):
+            graphs = _builder.get_shared_module_graphs(
+                config, config.bundles, self.progress
+            )
+
+        main, helper = graphs["main"], graphs["helper"]
+        self.assertFalse(helper.is_zipsafe(helper.find_node("shared_b")))
+        self.assertIsNotNone(helper.find_node("shared_extra"))
+
+        self.assertTrue(main.is_zipsafe(main.find_node("shared_b")))
+        self.assertIsNone(main.find_node("shared_extra"))
+        self.assertIsNot(main.find_node("shared_b"), helper.find_node("shared_b"))
+
+    def test_duplicate_outputs(self):
+        config = self.config(
+            {
+                "main": {"script": "main.py"},
+                "helper": {"script": "helper.py", "plugin": True},
+            }
+        )
+        self.assertTrue(_builder.check_bundle_outputs(config.bundles, self.progress))
+        self.assertFalse(self.progress.have_error)
+
+        config = self.config(
+            {
+                "main": {"script": "main.py"},
+                "other": {"script": "other.py", "name": "main"},
+            }
+        )
+        with mock.patch.object(_builder, "build_bundle") as build_bundle:
+            _builder.build_bundles(config, self.progress)
+
+        build_bundle.assert_not_called()
+        self.assertTrue(self.progress.have_error)
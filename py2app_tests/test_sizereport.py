@@ -0,0 +1,176 @@
+import json
+import pathlib
+import tempfile
+import unittest
+import zipfile
+
+from py2app import _config, _sizereport
+from py2app._bundlepaths import bundle_paths
+from py2app._modulegraph import ModuleGraph
+
+
+class TestSizeReport(unittest.TestCase):
+    def make_bundle(self, root):
+        paths = bundle_paths(root / "test.app")
+        for path in paths.all_directories():
+            path.mkdir(parents=True, exist_ok=True)
+
+        with zipfile.ZipFile(paths.pylib_zipped, "w") as zf:
+            zf.writestr("packaging/__init__.pyc", b"a" * 100)
+            zf.writestr("packaging/version.pyc", b"a" * 200)
+            zf.writestr("packaging-99.0.dist-info/METADATA", b"a" * 10)
+            zf.writestr("mypkg/__init__.pyc", b"a" * 30)
+            zf.writestr("mypkg/data/file.txt", b"a" * 40)
+            zf.writestr("bundle-scripts/main", b"a" * 50)
+
+        (paths.pylib / "unsafe").mkdir()
+        (paths.pylib / "unsafe/__init__.pyc").write_bytes(b"a" * 60)
+        (paths.extlib / "mypkg._speedups.so").write_bytes(b"a" * 70)
+        (paths.framework / "libfoo.dylib").write_bytes(b"a" * 80)
+        (paths.framework / "Foo.framework/Versions/A").mkdir(parents=True)
+        (paths.framework / "Foo.framework/Versions/A/Foo").write_bytes(b"a" * 90)
+        (paths.main / "main").write_bytes(b"a" * 110)
+        (paths.root / "Info.plist").write_bytes(b"a" * 5)
+        return paths
+
+    def test_size_report(self):
+        graph = ModuleGraph()
+        graph.add_module("packaging.version")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = self.make_bundle(pathlib.Path(tmpdir))
+            report = _sizereport.size_report(paths, graph)
+
+            entries = {(e.kind, e.name): e for e in report.entries}
+            self.assertEqual(sum(e.stored_size for e in report.entries), report.total)
+
+            dist = entries[("distribution", "packaging")]
+            self.assertEqual(dist.files, 3)
+            self.assertEqual(dist.size, 310)
+            self.assertEqual(dist.zip_size, 310)
+            self.assertEqual(dist.fs_size, 0)
+
+            pkg = entries[("package", "mypkg")]
+            self.assertEqual(pkg.files, 3)
+            self.assertEqual(pkg.size, 140)
+            self.assertEqual(pkg.zip_size, 70)
+            self.assertEqual(pkg.fs_size, 70)
+
+            self.assertEqual(entries[("package", "unsafe")].fs_size, 60)
+            self.assertEqual(entries[("bundle", "scripts")].size, 50)
+            self.assertEqual(entries[("native", "libfoo.dylib")].size, 80)
+            self.assertEqual(entries[("native", "Foo.framework")].size, 90)
+            self.assertEqual(entries[("bundle", "MacOS")].size, 110)
+            self.assertEqual(entries[("bundle", "Info.plist")].size, 5)
+            self.assertIn(("bundle", "archive overhead"), entries)
+
+            self.assertEqual(
+                report.entries,
+                sorted(report.entries, key=lambda e: -e.stored_size),
+            )
+
+            report.write(pathlib.Path(tmpdir) / "report.json")
+            with open(pathlib.Path(tmpdir) / "report.json") as stream:
+                data = json.load(stream)
+            self.assertEqual(data["total"], report.total)
+            self.assertEqual(len(data["entries"]), len(report.entries))
+            self.assertIn(
+                {
+                    "kind": "distribution",
+                    "name": "packaging",
+                    "files": 3,
+                    "size": 310,
+                    "stored_size": 310,
+                    "zip_size": 310,
+                    "fs_size": 0,
+                },
+                data["entries"],
+            )
+
+    def test_check_size_budget(self):
+        report = _sizereport.SizeReport(
+            entries=[
+                _sizereport.SizeEntry("distribution", "Foo_Bar", 1, 500, 500, 500, 0),
+                _sizereport.SizeEntry("package", "baz", 1, 400, 400, 0, 400),
+            ],
+            total=900,
+        )
+        self.assertEqual(
+            _sizereport.check_size_budget(
+                report, {"total": 1000, "foo-bar": 500, "baz": 10, "other": 0}
+            ),
+            [],
+        )
+
+        self.assertEqual(
+            _sizereport.check_size_budget(report, {"total": 800, "foo.bar": 100}),
+            [
+                "Distribution 'foo.bar' uses 500 B, the budget is 100 B",
+                "The bundle uses 900 B, the budget is 800 B",
+            ],
+        )
+
+    def test_format_size(self):
+        self.assertEqual(_sizereport.format_size(0), "0 B")
+        self.assertEqual(_sizereport.format_size(999), "999 B")
+        self.assertEqual(_sizereport.format_size(1500), "1.5 kB")
+        self.assertEqual(_sizereport.format_size(2_500_000), "2.5 MB")
+        self.assertEqual(_sizereport.format_size(3_000_000_000), "3.0 GB")
+
+
+class TestSizeBudgetConfig(unittest.TestCase):
+    def parse(self, global_budget=None, bundle_budget=None):
+        bundle = {"script": "main.py"}
+        if bundle_budget is not None:
+            bundle["size-budget"] = bundle_budget
+        config = {"bundle": {"main": bundle}}
+        if global_budget is not None:
+            config["size-budget"] = global_budget
+        return _config.parse_pyproject({"tool": {"py2app": config}}, pathlib.Path("."))
+
+    def test_default(self):
+        config = self.parse()
+        self.assertEqual(config.size_budget, {})
+        self.assertEqual(config.bundles[0].size_budget, {})
+
+    def test_sizes(self):
+        config = self.parse(
+            {
+                "total": "80 MB",
+                "numpy": 1000,
+                "a": "1.5kB",
+                "b": "2 MiB",
+                "c": "3GiB",
+                "d": "12",
+            }
+        )
+        self.assertEqual(
+            config.bundles[0].size_budget,
+            {
+                "total": 80_000_000,
+                "numpy": 1000,
+                "a": 1500,
+                "b": 2 * 1024 * 1024,
+                "c": 3 * 1024**3,
+                "d": 12,
+            },
+        )
+
+        config = self.parse({"total": "80 MB"}, {"numpy": "1 MB"})
+        self.assertEqual(config.size_budget, {"total": 80_000_000})
+        self.assertEqual(config.bundles[0].size_budget, {"numpy": 1_000_000})
+
+    def test_invalid(self):
+        for value in ("lots", "1 XB", -1, True, 1.5, [1]):
+            with self.subTest(value=value):
+                with self.assertRaisesRegex(
+                    _config.ConfigurationError,
+                    "'tool.py2app.size-budget.total' is not a valid size",
+                ):
+                    self.parse({"total": value})
+
+        with self.assertRaisesRegex(
+            _config.ConfigurationError,
+            "'tool.py2app.bundle.main.size-budget' is not a table",
+        ):
+            self.parse(bundle_budget=42)
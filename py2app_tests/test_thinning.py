@@ -0,0 +1,192 @@
+import os
+import pathlib
+import stat
+import tempfile
+import unittest
+
+from macholib import mach_o
+
+from py2app import _config, _standalone
+from py2app._bundlepaths import bundle_paths
+from py2app._machofiles import MachOFileTable, scan_macho
+from py2app._thinning import thin_file
+
+from .test_machofiles import (
+    CPU_SUBTYPE_ARM64E,
+    CPU_TYPE_I386,
+    CPU_TYPE_X86_64,
+    RecordingProgress,
+    make_fat,
+    make_macho,
+)
+
+
+class TestThinFile(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self._tmpdir.name)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_thin_file(self):
+        x86_64 = make_macho(cputype=CPU_TYPE_X86_64, dylibs=["@rpath/libx86.dylib"])
+        arm64 = make_macho(dylibs=["@rpath/libarm.dylib"], size=2048)
+
+        for is64 in (False, True):
+            with self.subTest(is64=is64):
+                path = self.root / "ext.so"
+                path.write_bytes(make_fat(x86_64, arm64, is64=is64))
+                path.chmod(0o555)
+                size = path.stat().st_size
+
+                self.assertEqual(thin_file(path, "arm64"), size - len(arm64))
+                self.assertEqual(path.read_bytes(), arm64)
+                self.assertEqual(stat.S_IMODE(path.stat().st_mode), 0o555)
+                self.assertEqual(
+                    [hdr.arch for hdr in scan_macho(path).headers], ["arm64"]
+                )
+                self.assertEqual(os.listdir(self.root), ["ext.so"])
+
+                path.unlink()
+
+    def test_prefer_generic_subtype(self):
+        arm64e = make_macho(
+            cpusubtype=CPU_SUBTYPE_ARM64E, dylibs=["@rpath/libarm64e.dylib"]
+        )
+        arm64 = make_macho(dylibs=["@rpath/libarm64.dylib"])
+
+        path = self.root / "ext.so"
+        for slices in ((arm64e, arm64), (arm64, arm64e)):
+            with self.subTest(arm64_first=slices[0] is arm64):
+                path.write_bytes(make_fat(*slices))
+                self.assertIsNotNone(thin_file(path, "arm64"))
+                self.assertEqual(path.read_bytes(), arm64)
+
+    def test_not_thinned(self):
+        path = self.root / "ext.so"
+
+        # Not a universal binary
+        contents = make_macho()
+        path.write_bytes(contents)
+        self.assertEqual(thin_file(path, "arm64"), 0)
+        self.assertEqual(path.read_bytes(), contents)
+
+        # No slice for the requested architecture
+        contents = make_fat(
+            make_macho(cputype=CPU_TYPE_X86_64),
+            make_macho(cputype=CPU_TYPE_I386, is64=False),
+        )
+        path.write_bytes(contents)
+        self.assertIsNone(thin_file(path, "arm64"))
+        self.assertEqual(path.read_bytes(), contents)
+
+
+class TestThinBundle(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmpdir = pathlib.Path(self._tmpdir.name)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def build(self, arch):
+        libdep = self.tmpdir / "ext/libdep.dylib"
+        libdep.parent.mkdir(parents=True)
+        libdep.write_bytes(
+            make_fat(
+                make_macho(cputype=CPU_TYPE_X86_64, install_name=str(libdep)),
+                make_macho(install_name=str(libdep)),
+            )
+        )
+
+        paths = bundle_paths(self.tmpdir / "Test.app")
+        for path in paths.all_directories():
+            path.mkdir(parents=True, exist_ok=True)
+
+        (paths.extlib / "fat.so").write_bytes(
+            make_fat(
+                make_macho(cputype=CPU_TYPE_X86_64, dylibs=[str(libdep)]),
+                make_macho(dylibs=[str(libdep)]),
+            )
+        )
+        (paths.extlib / "arm64e.so").write_bytes(
+            make_fat(
+                make_macho(
+                    cpusubtype=CPU_SUBTYPE_ARM64E, dylibs=["@rpath/libarm64e.dylib"]
+                ),
+                make_macho(dylibs=["@rpath/libarm64.dylib"]),
+            )
+        )
+        (paths.extlib / "thin.so").write_bytes(make_macho())
+        (paths.extlib / "intel.so").write_bytes(
+            make_fat(
+                make_macho(cputype=CPU_TYPE_X86_64),
+                make_macho(cputype=CPU_TYPE_I386, is64=False),
+            )
+        )
+
+        config = _config.parse_pyproject(
+            {
+                "tool": {
+                    "py2app": {"bundle": {"main": {"script": "main.py", "arch": arch}}}
+                }
+            },
+            self.tmpdir,
+        )
+        progress = RecordingProgress()
+        table = MachOFileTable()
+        try:
+            _standalone.macho_standalone(
+                paths, None, config.bundles[0], {}, progress, table
+            )
+        finally:
+            progress.stop()
+
+        return paths, table, progress
+
+    def test_thin_bundle(self):
+        paths, table, progress = self.build("arm64")
+
+        # The fat header and both slices are padded to 4096 bytes,
+        # the arm64 slice is 1024 bytes.
+        saved = 3 * 4096 - 1024
+        for path in (paths.extlib / "fat.so", paths.framework / "libdep.dylib"):
+            model = table.model(path)
+            self.assertEqual([hdr.arch for hdr in model.headers], ["arm64"])
+            self.assertEqual(model, scan_macho(path))
+            self.assertIn(
+                (
+                    "trace",
+                    f"{path}: removed {saved} bytes for other architectures",
+                ),
+                progress.messages,
+            )
+
+        # The model is that of the slice that was kept
+        model = table.model(paths.extlib / "arm64e.so")
+        self.assertEqual(model, scan_macho(paths.extlib / "arm64e.so"))
+        self.assertEqual(
+            [hdr.dylibs for hdr in model.headers],
+            [((mach_o.LC_LOAD_DYLIB, "@rpath/libarm64.dylib"),)],
+        )
+
+        # The load commands of the thinned files are rewritten as well
+        self.assertEqual(
+            table.model(paths.extlib / "fat.so").headers[0].dylibs[0][1],
+            "@rpath/libdep.dylib",
+        )
+
+        self.assertIn(
+            (
+                "warning",
+                f"{str(paths.extlib / 'intel.so')!r} does not contain code for arm64",
+            ),
+            progress.messages,
+        )
+        self.assertEqual(len(table.model(paths.extlib / "intel.so").headers), 2)
+
+    def test_universal2(self):
+        paths, table, progress = self.build("universal2")
+        self.assertEqual(len(table.model(paths.extlib / "fat.so").headers), 2)
+        self.assertEqual(len(scan_macho(paths.framework / "libdep.dylib").headers), 2)
@@ -0,0 +1,117 @@
+import importlib.resources
+import marshal
+import pathlib
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from py2app import _archive
+from py2app._bytecode import code_to_bytes
+
+BOOTSTRAP = importlib.resources.files("py2app.bootstrap").joinpath(
+    "_setup_importlib.py"
+)
+
+CHECK_SCRIPT = textwrap.dedent(
+    """\
+    import importlib.resources
+    import pkg.mod
+    import top
+
+    print(type(pkg.mod.__loader__).__name__)
+    print(pkg.mod.VALUE, top.VALUE)
+    print(importlib.resources.files("pkg").joinpath("data.txt").read_text())
+    print(pkg.__loader__.get_data(pkg.__path__[0] + "/data.txt").decode())
+    print(pkg.__path__[0].endswith("python-libraries.zip/pkg"))
+    """
+)
+
+
+def make_archive(path):
+    with _archive.ArchiveWriter(path) as zf:
+        zf.mkdir("pkg")
+        zf.writestr("pkg/__init__.pyc", code_to_bytes(compile("", "i", "exec")))
+        zf.writestr("pkg/mod.pyc", code_to_bytes(compile("VALUE = 42", "mod", "exec")))
+        zf.writestr("pkg/data.txt", b"resource data")
+        zf.writestr("top.pyc", code_to_bytes(compile("VALUE = 'top'", "t", "exec")))
+
+
+class TestArchiveIndex(unittest.TestCase):
+    def run_script(self, archive, check=CHECK_SCRIPT):
+        script = "\n".join(
+            [
+                "import sys",
+                f"sys.path.insert(0, {str(archive)!r})",
+                "PY2APP_EXTENSIONS = None",
+                BOOTSTRAP.read_text(),
+                check,
+            ]
+        )
+        return subprocess.check_output(
+            [sys.executable, "-c", script], text=True
+        ).splitlines()
+
+    def test_index_contents(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = pathlib.Path(tmpdir) / "python-libraries.zip"
+            index = pathlib.Path(tmpdir) / "python-libraries.idx"
+            make_archive(archive)
+
+            self.assertEqual(_archive.write_archive_index(archive, index), 3)
+
+            version, size, modules, files = marshal.loads(index.read_bytes())
+            self.assertEqual(version, _archive.INDEX_VERSION)
+            self.assertEqual(size, archive.stat().st_size)
+            self.assertEqual(set(modules), {"pkg", "pkg.mod", "top"})
+            self.assertTrue(modules["pkg"][2])
+            self.assertFalse(modules["pkg.mod"][2])
+            self.assertEqual(set(files), {"pkg/data.txt"})
+
+            offset, length = files["pkg/data.txt"]
+            with open(archive, "rb") as stream:
+                stream.seek(offset)
+                self.assertEqual(stream.read(length), b"resource data")
+
+    def test_indexed_import(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = pathlib.Path(tmpdir) / "python-libraries.zip"
+            make_archive(archive)
+            _archive.write_archive_index(
+                archive, pathlib.Path(tmpdir) / "python-libraries.idx"
+            )
+
+            self.assertEqual(
+                self.run_script(archive),
+                [
+                    "Py2AppIndexedLoader",
+                    "42 top",
+                    "resource data",
+                    "resource data",
+                    "True",
+                ],
+            )
+
+    def test_stale_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = pathlib.Path(tmpdir) / "python-libraries.zip"
+            make_archive(archive)
+            _archive.write_archive_index(
+                archive, pathlib.Path(tmpdir) / "python-libraries.idx"
+            )
+
+            # Changing the archive invalidates the index, imports
+            # fall back to zipimport.
+            with _archive.ArchiveWriter(archive) as zf:
+                zf.writestr("top.pyc", code_to_bytes(compile("", "t", "exec")))
+                zf.writestr("pkg/__init__.pyc", code_to_bytes(compile("", "", "exec")))
+                zf.writestr("pkg/mod.pyc", code_to_bytes(compile("", "", "exec")))
+
+            self.assertEqual(
+                self.run_script(
+                    archive,
+                    "import pkg.mod\nprint(type(pkg.mod.__loader__).__name__)",
+                ),
+                ["zipimporter"],
+            )
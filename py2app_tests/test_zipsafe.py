@@ -0,0 +1,157 @@
+import pathlib
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from py2app._modulegraph import ATTR_ZIPSAFE, ModuleGraph
+
+
+class TestZipSafe(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.srcdir = pathlib.Path(self._tmpdir.name)
+        sys.path.insert(0, str(self.srcdir))
+
+        self.write(
+            "main.py", "import zs_safe, zs_unsafe, zs_module, zs_marked, zs_data\n"
+        )
+        self.write("zs_safe/__init__.py", "from . import sub\n")
+        self.write("zs_safe/sub.py", "print('loading', __file__)\n")
+        self.write("zs_unsafe/__init__.py", "from . import sub, other\n")
+        self.write("zs_unsafe/sub.py", "HERE = str(__file__).rpartition('/')[0]\n")
+        self.write("zs_unsafe/other.py", "")
+        self.write("zs_module.py", "print(open(__file__).read())\n")
+        self.write("zs_marked/__init__.py", "from .nested import mod\n")
+        self.write("zs_marked/nested/__init__.py", "")
+        self.write("zs_marked/nested/mod.py", "")
+        self.write("zs_data/__init__.py", "from . import reader\n")
+        self.write(
+            "zs_data/reader.py",
+            """\
+            def load():
+                return (pathlib.Path(__file__).parent / "data.txt").read_text()
+            """,
+        )
+
+        self.graph = ModuleGraph()
+        self.graph.add_script(self.srcdir / "main.py")
+
+    def tearDown(self):
+        sys.path.remove(str(self.srcdir))
+        for name in list(sys.modules):
+            if name.startswith("zs_"):
+                del sys.modules[name]
+        self._tmpdir.cleanup()
+
+    def write(self, name, source):
+        path = self.srcdir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(textwrap.dedent(source))
+
+    def zipsafe(self, name):
+        return self.graph.is_zipsafe(self.graph.find_node(name))
+
+    def test_is_zipsafe(self):
+        self.assertTrue(self.zipsafe("zs_safe"))
+        self.assertTrue(self.zipsafe("zs_safe.sub"))
+        self.assertTrue(self.zipsafe("zs_marked.nested.mod"))
+
+        # A module using __file__ makes the entire package unsafe
+        self.assertFalse(self.zipsafe("zs_unsafe"))
+        self.assertFalse(self.zipsafe("zs_unsafe.sub"))
+        self.assertFalse(self.zipsafe("zs_unsafe.other"))
+
+        self.assertFalse(self.zipsafe("zs_module"))
+
+        self.assertEqual(
+            self.graph.zipunsafe_report(),
+            {
+                "zs_data": {
+                    "zs_data.reader": "uses __file__: line 2: "
+                    "return (pathlib.Path(__file__).parent / 'data.txt').read_text()"
+                },
+                "zs_module": {
+                    "zs_module": "uses __file__: line 1: print(open(__file__).read())"
+                },
+                "zs_unsafe": {
+                    "zs_unsafe.sub": "uses __file__: line 1: "
+                    "HERE = str(__file__).rpartition('/')[0]"
+                },
+            },
+        )
+
+    def test_mark_zipunsafe(self):
+        self.assertTrue(self.zipsafe("zs_marked"))
+
+        self.graph.mark_zipunsafe(
+            self.graph.find_node("zs_marked.nested.mod"), "test recipe"
+        )
+        self.assertFalse(self.zipsafe("zs_marked"))
+        self.assertFalse(self.zipsafe("zs_marked.nested"))
+        self.assertTrue(self.zipsafe("zs_safe"))
+
+        self.graph.mark_zipunsafe(self.graph.find_node("zs_safe.sub"))
+        self.assertFalse(self.zipsafe("zs_safe"))
+
+        report = self.graph.zipunsafe_report()
+        self.assertEqual(report["zs_marked"], {"zs_marked.nested.mod": "test recipe"})
+        self.assertEqual(report["zs_safe"], {"zs_safe.sub": "marked as zip-unsafe"})
+
+    def test_reason_is_kept(self):
+        self.graph.mark_zipunsafe(self.graph.find_node("zs_safe.sub"), "test recipe")
+
+        # Adding nodes invalidates the cached status
+        self.graph.add_module("zs_marked.nested")
+        self.assertEqual(
+            self.graph.zipunsafe_report()["zs_safe"], {"zs_safe.sub": "test recipe"}
+        )
+
+    def test_rewrite_file_uses(self):
+        self.assertFalse(self.zipsafe("zs_data"))
+
+        node = self.graph.find_node("zs_data.reader")
+        self.graph.rewrite_file_uses(node)
+
+        self.assertTrue(self.zipsafe("zs_data"))
+        self.assertTrue(self.zipsafe("zs_data.reader"))
+        self.assertNotIn("zs_data", self.graph.zipunsafe_report())
+        self.assertIn(
+            "importlib.resources",
+            {n.identifier for _, n in self.graph.outgoing(node)},
+        )
+
+    def test_explicitly_zipsafe(self):
+        # Recipes can mark an entire package as zipsafe
+        node = self.graph.find_node("zs_unsafe")
+        node.extension_attributes[ATTR_ZIPSAFE] = True
+
+        self.assertTrue(self.zipsafe("zs_unsafe"))
+        self.assertTrue(self.zipsafe("zs_unsafe.other"))
+        self.assertFalse(self.zipsafe("zs_unsafe.sub"))
+        self.assertNotIn("zs_unsafe", self.graph.zipunsafe_report())
+
+    def test_unreachable(self):
+        self.assertFalse(self.zipsafe("zs_unsafe.other"))
+
+        # Removing the edge invalidates the cached status
+        self.graph.remove_all_edges("zs_unsafe", "zs_unsafe.sub")
+        self.assertTrue(self.zipsafe("zs_unsafe.other"))
+        self.assertNotIn("zs_unsafe", self.graph.zipunsafe_report())
+
+    def test_collect_nodes(self):
+        zip_nodes, unzip_nodes = self.graph.collect_nodes()
+        self.assertEqual(
+            {node.identifier for node in unzip_nodes},
+            {
+                "zs_module",
+                "zs_unsafe",
+                "zs_unsafe.sub",
+                "zs_unsafe.other",
+                "zs_data",
+                "zs_data.reader",
+            },
+        )
+        zipped = {node.identifier for node in zip_nodes}
+        self.assertIn("zs_safe.sub", zipped)
+        self.assertIn("zs_marked.nested.mod", zipped)
@@ -51,6 +51,52 @@ def parse_arguments(
         const=_config.BuildType.ALIAS,
         help="build an alias bundle.",
     )
+    parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        default=None,
+        metavar="DIR",
+        type=pathlib.Path,
+        help="directory for caching compiled bytecode between builds.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only update files in the output that have changed.",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        dest="jobs",
+        default=1,
+        metavar="N",
+        type=int,
+        help=(
+            "build up to N bundles in parallel and rewrite Mach-O files"
+            " using up to N processes (default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--shared-scan",
+        action="store_true",
+        help="scan the dependencies of all bundles at once.",
+    )
+    parser.add_argument(
+        "--record-import-trace",
+        action="store_true",
+        help=(
+            "include support for recording an import trace"
+            " using PY2APP_IMPORT_TRACE in the bundle."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profile",
+        default=None,
+        metavar="FILE",
+        type=pathlib.Path,
+        help="write a timing profile of the build to FILE, in Chrome trace format.",
+    )
     parser.add_argument(
         "--verbose",
         "-v",
@@ -96,6 +142,26 @@ def parse_arguments(
     if args.debug_macho_usage:
         config.debug_macho_usage = True
 
+    if args.cache_dir is not None:
+        config.cache_dir = args.cache_dir
+
+    if args.incremental:
+        config.incremental = True
+
+    if args.profile is not None:
+        config.profile = args.profile
+
+    if args.jobs < 1:
+        print("The number of jobs must be at least 1", file=sys.stderr)
+        sys.exit(1)
+    config.jobs = args.jobs
+
+    if args.shared_scan:
+        config.shared_scan = True
+
+    if args.record_import_trace:
+        config.record_import_trace = True
+
     return args.verbose, config
 
 
@@ -107,19 +173,15 @@ def main() -> int:
     verbose, config = parse_arguments(sys.argv[1:])
 
     progress = _progress.Progress(level=2 if verbose else 1)
-    task_id = progress.add_task("Processing bundles", len(config.bundles))
-
-    for bundle in config.bundles:
-        # XXX: Sort bundles to ensure nested bundles get build
-        #      after their enclosing bundle.
-        # XXX: This needs additional configuration!
-        progress.update(
-            task_id,
-            current=f"{bundle.build_type.value} {'plugin' if bundle.plugin else 'application'} {bundle.name!r}",
-        )
-        _builder.build_bundle(config, bundle, progress)
-        progress.step_task(task_id)
-    progress.update(task_id, current="")
+
+    # XXX: Nested bundles are built after their enclosing bundle,
+    #      but there is no configuration yet for building a bundle
+    #      inside another one.
+    _builder.build_bundles(config, progress)
+
+    if config.profile is not None:
+        progress.write_profile(config.profile)
+        progress.info(f"Profile: [bold]{config.profile}[/bold]", highlight=False)
 
     if progress.have_error:
         progress.print("")
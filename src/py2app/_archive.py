@@ -0,0 +1,240 @@
+"""
+Writer for the Python library archive of a bundle.
+
+Entries are serialized (marshalling code objects, reading data
+files) and appended to the zipfile by a single writer thread, in
+the order in which they were submitted. This overlaps writing the
+archive with walking the module graph.
+
+XXX: Serializing in a pool of threads doesn't help, marshal holds
+the GIL and serializing dominates the time spent in the writer.
+"""
+
+__all__ = ("ArchiveWriter", "ZIP_TIMESTAMP", "write_archive_index")
+
+import marshal
+import os
+import pathlib
+import queue
+import struct
+import threading
+import time
+import typing
+import zipfile
+
+from ._copyfile import copy_stream
+
+# Timestamp used for all archive members. The zipfile module defaults
+# to the current time, which makes archives irreproducible.
+ZIP_TIMESTAMP = (1980, 1, 1, 0, 0, 0)
+
+# Version of the archive index format, must match the
+# version in bootstrap/_setup_importlib.py
+INDEX_VERSION = 1
+
+# Layout of the fixed part of a local file header
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_HEADER_MAGIC = b"PK\003\004"
+
+_Data = typing.Union[bytes, bytearray]
+_Payload = typing.Union[_Data, typing.Callable[[], _Data]]
+
+# Queue items: (archive name, source), the source is the data
+# or a function returning the data, the path of a file to copy
+# into the archive or None for directory entries.
+_Item = typing.Optional[typing.Tuple[str, typing.Union[_Payload, pathlib.Path, None]]]
+
+
+class ArchiveWriter:
+    """
+    Write a zipfile using a producer/consumer pipeline.
+
+    The API mirrors the subset of *zipfile.ZipFile* used by
+    py2app: *writestr* and *mkdir*. The data for *writestr* can
+    be a callable, which will be called in the writer thread. Use
+    *write_file* to add the contents of a file.
+
+    Entries are stored uncompressed with a fixed timestamp.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self._zf = zipfile.ZipFile(path, "w")
+        self._queue: "queue.Queue[_Item]" = queue.Queue()
+        self._error: typing.Optional[BaseException] = None
+        self._closed = False
+
+        self.entry_count = 0
+        self.byte_count = 0
+        self._started = time.perf_counter()
+        self._finished: typing.Optional[float] = None
+
+        self._writer = threading.Thread(
+            target=self._write_entries, name="py2app-archive-writer", daemon=True
+        )
+        self._writer.start()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.close()
+
+    def writestr(self, name: str, data: _Payload) -> None:
+        """
+        Add an entry for *name* to the archive. The *data* is
+        either the contents of the entry, or a function
+        returning the contents.
+        """
+        self._check_open()
+        self._queue.put((name, data))
+
+    def write_file(self, name: str, path: pathlib.Path) -> None:
+        """
+        Add an entry for *name* with the contents of the file
+        at *path*.
+
+        The file is streamed into the archive, without reading
+        it in memory as a whole.
+        """
+        self._check_open()
+        self._queue.put((name, path))
+
+    def mkdir(self, name: str) -> None:
+        """
+        Add a directory entry for *name* to the archive.
+        """
+        self._check_open()
+        self._queue.put((name, None))
+
+    def close(self) -> None:
+        """
+        Wait until all entries are written and close the archive.
+
+        Reraises the first exception raised while serializing
+        or writing an entry.
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        self._queue.put(None)
+        self._writer.join()
+        self._zf.close()
+        self._finished = time.perf_counter()
+
+        if self._error is not None:
+            raise self._error
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Wall time in seconds since the writer was created, up
+        to closing it.
+        """
+        end = self._finished if self._finished is not None else time.perf_counter()
+        return end - self._started
+
+    def throughput(self) -> str:
+        """
+        Return a human readable description of the write
+        throughput so far.
+        """
+        elapsed = self.elapsed or 1e-9
+        return (
+            f"{self.entry_count / elapsed:.0f} entries/s, "
+            f"{self.byte_count / elapsed / 1_000_000:.1f} MB/s"
+        )
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise ValueError("Writing to closed ArchiveWriter")
+
+    def _write_entries(self) -> None:
+        """
+        Main function for the writer thread.
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            if self._error is not None:
+                # Keep draining the queue to avoid blocking
+                # the producer, but don't write anything.
+                continue
+
+            name, source = item
+            try:
+                if source is None:
+                    zinfo = zipfile.ZipInfo(f"{name.rstrip('/')}/", ZIP_TIMESTAMP)
+                    zinfo.external_attr = (0o40755 << 16) | 0x10
+                    zinfo.compress_size = zinfo.file_size = zinfo.CRC = 0
+                    self._zf.mkdir(zinfo)
+
+                elif isinstance(source, pathlib.Path):
+                    zinfo = zipfile.ZipInfo(name, ZIP_TIMESTAMP)
+                    zinfo.external_attr = 0o644 << 16
+                    with open(source, "rb") as stream:
+                        # Setting the size up front lets zipfile decide
+                        # if the ZIP64 extensions are needed.
+                        zinfo.file_size = os.fstat(stream.fileno()).st_size
+                        with self._zf.open(zinfo, "w") as dest:
+                            self.byte_count += copy_stream(stream, dest)
+
+                else:
+                    data = source() if callable(source) else source
+                    zinfo = zipfile.ZipInfo(name, ZIP_TIMESTAMP)
+                    zinfo.external_attr = 0o644 << 16
+                    self._zf.writestr(zinfo, data)
+                    self.byte_count += len(data)
+
+                self.entry_count += 1
+
+            except Exception as exc:
+                self._error = exc
+
+
+def write_archive_index(archive: pathlib.Path, index: pathlib.Path) -> int:
+    """
+    Write an index for the uncompressed *archive* to *index*,
+    and return the number of modules in the index.
+
+    The index is a marshalled tuple:
+    (version, archive size, modules, files). *modules* maps
+    module names to (offset, length, is package) for ".pyc"
+    entries and *files* maps archive paths to (offset, length)
+    for other entries, where *offset* is the position of the
+    entry data in the archive.
+    """
+    modules: typing.Dict[str, typing.Tuple[int, int, bool]] = {}
+    files: typing.Dict[str, typing.Tuple[int, int]] = {}
+
+    with zipfile.ZipFile(archive) as zf, open(archive, "rb") as stream:
+        for zinfo in zf.infolist():
+            if zinfo.is_dir():
+                continue
+            if zinfo.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{zinfo.filename!r} in {archive} is compressed")
+
+            # The data offset depends on the size of the local header,
+            # which can differ from the central directory entry.
+            stream.seek(zinfo.header_offset)
+            header = _LOCAL_HEADER.unpack(stream.read(_LOCAL_HEADER.size))
+            if header[0] != _LOCAL_HEADER_MAGIC:
+                raise ValueError(f"Bad local header for {zinfo.filename!r}")
+            offset = zinfo.header_offset + _LOCAL_HEADER.size + header[-2] + header[-1]
+
+            if zinfo.filename.endswith("/__init__.pyc"):
+                name = zinfo.filename[: -len("/__init__.pyc")].replace("/", ".")
+                modules[name] = (offset, zinfo.file_size, True)
+            elif zinfo.filename.endswith(".pyc"):
+                name = zinfo.filename[: -len(".pyc")].replace("/", ".")
+                modules.setdefault(name, (offset, zinfo.file_size, False))
+            else:
+                files[zinfo.filename] = (offset, zinfo.file_size)
+
+    data = marshal.dumps((INDEX_VERSION, archive.stat().st_size, modules, files))
+    tmp = index.with_name(index.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, index)
+    return len(modules)
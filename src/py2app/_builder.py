@@ -1,18 +1,17 @@
 import collections
+import concurrent.futures
+import functools
 import importlib.resources
 import itertools
-import marshal
+import multiprocessing
 import pathlib
 import plistlib
 import shutil
 import subprocess
 import sys
 import textwrap
-import types
 import typing
-import zipfile
 from functools import singledispatch
-from importlib.util import MAGIC_NUMBER
 from itertools import chain
 from typing import Any, Dict, Union
 
@@ -31,36 +30,25 @@ from modulegraph2 import (
 )
 
 from . import _recipedefs  # noqa: F401
+from ._archive import ArchiveWriter, write_archive_index
 from ._bundlepaths import BundlePaths, bundle_paths
-from ._config import BuildType, BundleOptions, Py2appConfiguration
+from ._bytecode import BytecodeCache, BytecodeCompiler
+from ._config import BuildArch, BuildType, BundleOptions, Py2appConfiguration
+from ._graphcache import GraphCache, dump_graph, load_graph
+from ._importtrace import order_by_trace, read_import_trace
+from ._incremental import StagingTree, stage_file, sync_bundle
 from ._macho_audit import audit_macho_issues
+from ._machofiles import MachOFileTable
 from ._modulegraph import ModuleGraph
-from ._progress import Progress
+from ._progress import Progress, Span
+from ._pruning import Target
 from ._recipes import process_recipes
+from ._resources import iter_resources
+from ._sizereport import check_size_budget, print_size_report, size_report
 from ._standalone import macho_standalone, rewrite_libpython, set_deployment_target
 from ._stubs import LauncherType, copy_launcher, get_plist
 from .util import codesign_adhoc, find_converter, reset_blocking_status  # XXX: Replace
 
-
-def _pack_uint32(x: int) -> bytes:
-    """Convert a 32-bit integer to little-endian."""
-    return (int(x) & 0xFFFFFFFF).to_bytes(4, "little")
-
-
-def code_to_bytes(code: types.CodeType) -> bytearray:
-    """
-    Serialize a code object into ".pyc" format
-    """
-
-    data = bytearray(MAGIC_NUMBER)
-    data.extend(_pack_uint32(0))
-    data.extend(_pack_uint32(0))
-    data.extend(_pack_uint32(0))
-    data.extend(marshal.dumps(code))
-
-    return data
-
-
 #
 # Storing nodes into a bundle
 #
@@ -71,60 +59,6 @@ def relpath_for_script(node: Script) -> str:
     return f"bundle-scripts/{node.filename.stem}"
 
 
-# XXX: What to do about ".dylib" (and the ".dylibs" folder in a lot of wheels...)
-# XXX: Recipes should be able to affect this:
-#      - Exclude/include specific resources (e.g. email/architecture.rst)
-#      - Mark packages as not having resources
-# XXX: Should do something with filesystem rights bits as well?
-# XXX: Handle subfolders (both iterating and returning)
-EXCL_EXTENSIONS = {
-    ".py",
-    ".pyi",
-    ".so",
-}
-EXCL_NAMES = {".svn", "__pycache__"}
-
-
-def iter_resources(
-    node: Union[Package, NamespacePackage]
-) -> typing.Iterator[typing.Tuple[str, bytes]]:
-    """
-    Yield all resources in a package, including those in subdirectories.
-    """
-    try:
-        for resource in importlib.resources.files(node.identifier).iterdir():
-            if resource.name in EXCL_NAMES:
-                continue
-
-            if any(resource.name.endswith(ext) for ext in EXCL_EXTENSIONS):
-                continue
-
-            if resource.is_file():
-                yield resource.name, resource.read_bytes()
-
-            else:
-                # A resource directory could also be a subpackage. Only
-                # include subresources when the resource itself doesn't contain
-                # python files.
-                for subresource in resource.iterdir():
-                    if any(subresource.name.endswith(ext) for ext in EXCL_EXTENSIONS):
-                        break
-                else:
-                    todo = [(resource.name, r) for r in resource.iterdir()]
-                    while todo:
-                        relpath, current = todo.pop()
-                        if current.is_file():
-                            yield f"{relpath}/{current.name}", current.read_bytes()
-                        else:
-                            todo.extend(
-                                (f"{relpath}/{current.name}", r)
-                                for r in current.iterdir()
-                            )
-
-    except AttributeError:
-        pass
-
-
 # 1. Zipfile variant
 
 
@@ -132,7 +66,8 @@ def iter_resources(
 def zip_node(
     node: object,
     graph: ModuleGraph,
-    zf: zipfile.ZipFile,
+    zf: ArchiveWriter,
+    compiler: BytecodeCompiler,
     more_extensions: Dict[str, ExtensionModule],
 ) -> None:
     """
@@ -149,7 +84,8 @@ def zip_node(
 def zip_py_node(
     node: Union[SourceModule, BytecodeModule],
     graph: ModuleGraph,
-    zf: zipfile.ZipFile,
+    zf: ArchiveWriter,
+    compiler: BytecodeCompiler,
     more_extensions: Dict[str, ExtensionModule],
 ) -> None:
     """
@@ -162,28 +98,32 @@ def zip_py_node(
         path = node.identifier.replace(".", "/") + "/__init__.pyc"
     else:
         path = node.identifier.replace(".", "/") + ".pyc"
-    zf.writestr(path, code_to_bytes(node.code))
+    zf.writestr(path, functools.partial(compiler.pyc_for_node, node))
 
 
 @zip_node.register
 def zip_script_node(
     node: Script,
     graph: ModuleGraph,
-    zf: zipfile.ZipFile,
+    zf: ArchiveWriter,
+    compiler: BytecodeCompiler,
     more_extensions: Dict[str, ExtensionModule],
 ) -> None:
     """
     Include the compiled version of a script into the zipfile.
     """
     assert node.code is not None
-    zf.writestr(relpath_for_script(node), code_to_bytes(node.code))
+    zf.writestr(
+        relpath_for_script(node), functools.partial(compiler.pyc_for_node, node)
+    )
 
 
 @zip_node.register
 def zip_ext_node(
     node: ExtensionModule,
     graph: ModuleGraph,
-    zf: zipfile.ZipFile,
+    zf: ArchiveWriter,
+    compiler: BytecodeCompiler,
     more_extensions: Dict[str, ExtensionModule],
 ) -> None:
     """
@@ -202,21 +142,22 @@ def zip_ext_node(
 def zip_package_node(
     node: Package,
     graph: ModuleGraph,
-    zf: zipfile.ZipFile,
+    zf: ArchiveWriter,
+    compiler: BytecodeCompiler,
     more_extensions: Dict[str, ExtensionModule],
 ) -> None:
     path = node.identifier.replace(".", "/")
     zf.mkdir(path)
 
     if isinstance(node, Package):
-        zip_node(node.init_module, graph, zf, more_extensions)
+        zip_node(node.init_module, graph, zf, compiler, more_extensions)
 
     # Copy resource data for the package.
     if graph.ignore_resources(node):
         return
 
-    for relname, data in iter_resources(node):
-        zf.writestr(f"{path}/{relname}", data)
+    for relname, resource in iter_resources(node):
+        zf.write_file(f"{path}/{relname}", resource)
 
 
 EXCL_DIST_INFO = {"RECORD", "INSTALLER", "WHEEL"}
@@ -236,7 +177,8 @@ def get_dist_info(value: str) -> typing.Optional[str]:
 def zip_distribution(
     node: PyPIDistribution,
     graph: ModuleGraph,
-    zf: zipfile.ZipFile,
+    zf: ArchiveWriter,
+    compiler: BytecodeCompiler,
     more_extensions: Dict[str, ExtensionModule],
 ) -> None:
     # XXX: This needs work, in particular this  shouldn't read
@@ -245,23 +187,31 @@ def zip_distribution(
         relpath = get_dist_info(fn)
         if relpath is None:
             continue
-        data = pathlib.Path(fn).read_bytes()
-
-        zf.writestr(relpath, data)
+        zf.write_file(relpath, pathlib.Path(fn))
 
 
 # 2. Filesystem variant (primarily used for nodes that are not zipsafe)
 
 
 @singledispatch
-def fs_node(node: object, graph: ModuleGraph, root: pathlib.Path) -> None:
+def fs_node(
+    node: object,
+    graph: ModuleGraph,
+    root: pathlib.Path,
+    compiler: BytecodeCompiler,
+    staging: typing.Optional[StagingTree] = None,
+) -> None:
     raise NotImplementedError(f"fs_node not implemented for type {type(node).__name__}")
 
 
 @fs_node.register(SourceModule)
 @fs_node.register(BytecodeModule)
 def fs_py_node(
-    node: Union[SourceModule, BytecodeModule], graph: ModuleGraph, root: pathlib.Path
+    node: Union[SourceModule, BytecodeModule],
+    graph: ModuleGraph,
+    root: pathlib.Path,
+    compiler: BytecodeCompiler,
+    staging: typing.Optional[StagingTree] = None,
 ) -> None:
     assert node.filename is not None
     assert node.code is not None
@@ -272,58 +222,117 @@ def fs_py_node(
 
     p = root / path
     p.parent.mkdir(parents=True, exist_ok=True)
-    p.write_bytes(code_to_bytes(node.code))
+    p.write_bytes(compiler.pyc_for_node(node))
 
 
 @fs_node.register
-def fs_script_node(node: Script, graph: ModuleGraph, root: pathlib.Path) -> None:
+def fs_script_node(
+    node: Script,
+    graph: ModuleGraph,
+    root: pathlib.Path,
+    compiler: BytecodeCompiler,
+    staging: typing.Optional[StagingTree] = None,
+) -> None:
     assert node.code is not None
     path = root / relpath_for_script(node)
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_bytes(code_to_bytes(node.code))
+    path.write_bytes(compiler.pyc_for_node(node))
 
 
 @fs_node.register
-def fs_ext_node(node: ExtensionModule, graph: ModuleGraph, root: pathlib.Path) -> None:
-    # XXX: Copying should be separate function.
+def fs_ext_node(
+    node: ExtensionModule,
+    graph: ModuleGraph,
+    root: pathlib.Path,
+    compiler: BytecodeCompiler,
+    staging: typing.Optional[StagingTree] = None,
+) -> None:
     # XXX: Handle extensions in packages, subdiretory might not be here yet
     assert node.filename is not None
     ext_path = root / (node.identifier.replace(".", "/") + ".so")
 
     ext_path.parent.mkdir(parents=True, exist_ok=True)
 
-    ext_path.write_bytes(node.filename.read_bytes())
+    stage_file(node.filename, ext_path, staging)
 
 
 @fs_node.register(Package)
 @fs_node.register(NamespacePackage)
 def fs_package_node(
-    node: Union[Package, NamespacePackage], graph: ModuleGraph, root: pathlib.Path
+    node: Union[Package, NamespacePackage],
+    graph: ModuleGraph,
+    root: pathlib.Path,
+    compiler: BytecodeCompiler,
+    staging: typing.Optional[StagingTree] = None,
 ) -> None:
     path = node.identifier.replace(".", "/")
 
     (root / path).mkdir(parents=True, exist_ok=True)
 
     if isinstance(node, Package):
-        fs_node(node.init_module, graph, root)
+        fs_node(node.init_module, graph, root, compiler, staging)
 
     # Copy resource data for the package
     if graph.ignore_resources(node):
         return
 
-    for relname, data in iter_resources(node):
+    for relname, resource in iter_resources(node):
         target = root / path / relname
         target.parent.mkdir(exist_ok=True, parents=True)
-        target.write_bytes(data)
+        stage_file(resource, target, staging)
 
 
-def create_bundle_structure(bundle: BundleOptions, progress: Progress) -> BundlePaths:
+def bundle_output_path(bundle: BundleOptions) -> pathlib.Path:
+    """
+    Return the path of the output for *bundle*
+    """
+    return pathlib.Path("dist2") / f"{bundle.name}{bundle.extension}"
+
+
+def bundle_size_report_path(bundle: BundleOptions) -> pathlib.Path:
+    """
+    Return the path of the size report for *bundle*
+    """
+    return bundle_output_path(bundle).parent / f"{bundle.name}-size-report.json"
+
+
+def bundle_staging_path(bundle: BundleOptions) -> pathlib.Path:
+    """
+    Return the path where *bundle* is build when using
+    incremental output.
+    """
+    return pathlib.Path("build2") / f"{bundle.name}{bundle.extension}"
+
+
+def bundle_staging_tree(bundle: BundleOptions) -> StagingTree:
+    """
+    Return the staging tree for *bundle* when using
+    incremental output.
+    """
+    root = bundle_staging_path(bundle)
+    return StagingTree(root, root.with_name(f"{root.name}.manifest.json"))
+
+
+def create_bundle_structure(
+    bundle: BundleOptions,
+    progress: Progress,
+    *,
+    staging: typing.Optional[StagingTree] = None,
+) -> BundlePaths:
     """
     Create the directory structure for a bundle and return the
     path to the root of the tree.
+
+    With incremental output the structure is created in *staging*,
+    see *update_bundle_output*. The staging tree of the previous
+    build is kept aside to reuse files that haven't changed.
     """
 
-    root = pathlib.Path("dist2") / f"{bundle.name}{bundle.extension}"
+    if staging is not None:
+        root = staging.root
+        staging.prepare()
+    else:
+        root = bundle_output_path(bundle)
     paths = bundle_paths(root)
 
     if root.is_dir():
@@ -460,7 +469,20 @@ def add_bootstrap(
     bundle: BundleOptions,
     graph: ModuleGraph | None,
     progress: Progress,
+    extension_names: typing.Optional[typing.Collection[str]] = None,
+    *,
+    record_import_trace: bool = False,
 ) -> None:
+    """
+    Write the bootstrap scripts for *bundle*.
+
+    *extension_names* are the names of the extension modules
+    in the "lib-dynload" folder of the bundle, when known this
+    avoids filesystem access in the importer for that folder.
+
+    Support for recording an import trace is included when
+    *record_import_trace* is true, and for alias builds.
+    """
     # XXX:
     # - This doesn't work (yet) inside an app bundle because py2app won't
     #   include .py files in the bundle. Either add a recipe that "fixes"
@@ -495,6 +517,12 @@ def add_bootstrap(
             )
             stream.write("\n")
 
+        if extension_names is None:
+            stream.write("PY2APP_EXTENSIONS = None\n")
+        else:
+            stream.write(
+                f"PY2APP_EXTENSIONS = frozenset({sorted(extension_names)!r})\n"
+            )
         stream.write(
             importlib.resources.files("py2app.bootstrap")
             .joinpath("_setup_importlib.py")
@@ -515,6 +543,21 @@ def add_bootstrap(
                 stream.write(bootstrap)
                 stream.write("\n")
 
+        if record_import_trace or bundle.build_type == BuildType.ALIAS:
+            # Support for recording an import trace. This is the
+            # last fragment to ensure that the tracer is in front of
+            # the finders installed by the other fragments, modules
+            # imported before this are recorded from sys.modules.
+            #
+            # The tracer writes to a path from the environment, and
+            # is therefore not included in regular builds.
+            stream.write(
+                importlib.resources.files("py2app.bootstrap")
+                .joinpath("_import_trace.py")
+                .read_text(encoding="utf-8")
+            )
+            stream.write("\n")
+
     # XXX:
     # - All hardcoded fragments should either access only builtin modules,
     #   or addition should be moved to an earlier phase using *graph.add_bootstrap*.
@@ -577,6 +620,7 @@ def add_resources(
     bundle: BundleOptions,
     graph: ModuleGraph | None,
     progress: Progress,
+    staging: typing.Optional[StagingTree] = None,
 ) -> None:
     # XXX: Cleanly handle mach-o resources, in particular the '.dylib'
     #      folders added by `delocate` tool (move those libraries to
@@ -600,6 +644,11 @@ def add_resources(
     if not all_resources:
         return
 
+    copy2 = functools.partial(shutil.copy2, follow_symlinks=False)
+
+    def copy_resource(src: str, dst: str) -> None:
+        stage_file(pathlib.Path(src), pathlib.Path(dst), staging, copy2)
+
     for rsrc in progress.iter_task(all_resources, "Copy resources", lambda n: str(n)):
         for src in rsrc.sources:
             if not src.exists():
@@ -609,10 +658,8 @@ def add_resources(
             if converter is not None:
                 converter(src, paths.resources / rsrc.destination / src.name)
             elif src.is_file():
-                shutil.copy2(
-                    src,
-                    paths.resources / rsrc.destination / src.name,
-                    follow_symlinks=False,
+                copy_resource(
+                    str(src), str(paths.resources / rsrc.destination / src.name)
                 )
             else:
 
@@ -621,6 +668,7 @@ def add_resources(
                     paths.resources / rsrc.destination / src.name,
                     ignore=ignore_filter,
                     symlinks=True,
+                    copy_function=copy_resource,
                 )
 
 
@@ -657,7 +705,12 @@ def get_info_plist(bundle: BundleOptions) -> Dict[str, Any]:
 
 
 def collect_python(
-    bundle: BundleOptions, paths: BundlePaths, graph: ModuleGraph, progress: Progress
+    bundle: BundleOptions,
+    paths: BundlePaths,
+    graph: ModuleGraph,
+    compiler: BytecodeCompiler,
+    progress: Progress,
+    staging: typing.Optional[StagingTree] = None,
 ) -> Dict[pathlib.Path, pathlib.Path]:
     # XXX: This isn't really 'Scanning' any more
     #
@@ -669,6 +722,10 @@ def collect_python(
     #      the source of a python module (e.g. site.py)
 
     zip_nodes, unzip_nodes = graph.collect_nodes()
+    for package, reasons in graph.zipunsafe_report().items():
+        progress.trace(f"Package {package!r} is not zipsafe:")
+        for identifier, reason in reasons.items():
+            progress.trace(f"  {identifier}: {reason}")
 
     # XXX: Creating the directory structure should be elsewhere?
     #      "Elsewhere" should also be responsible for clearing any
@@ -684,25 +741,50 @@ def collect_python(
         if node.distribution is not None
     }
 
-    zf = zipfile.ZipFile(paths.pylib_zipped, "w")
+    if bundle.import_trace is not None:
+        trace = read_import_trace(bundle.import_trace)
+        zip_nodes = order_by_trace(zip_nodes, trace)
+        progress.trace(
+            f"Ordering {paths.pylib_zipped.name} using {len(trace)} "
+            f"modules from {bundle.import_trace}"
+        )
 
-    if included_distributions:
-        for dist in progress.iter_task(
-            list(included_distributions.values()), "Collect dist-info", lambda n: n.name
-        ):
-            zip_node(dist, graph, zf, more_extensions)
+    # Code objects are serialized and written by a separate
+    # thread, in the order entries are added below.
+    #
+    # Modules are written before the dist-info to keep
+    # the modules used during startup together.
+    with ArchiveWriter(paths.pylib_zipped) as zf:
+        if zip_nodes:
+            for node in progress.iter_task(
+                zip_nodes,
+                "Collect site-packages.zip",
+                lambda n: f"{n.identifier} ({zf.throughput()})",
+            ):
+                zip_node(node, graph, zf, compiler, more_extensions)
 
-    if zip_nodes:
-        for node in progress.iter_task(
-            zip_nodes, "Collect site-packages.zip", lambda n: n.identifier
-        ):
-            zip_node(node, graph, zf, more_extensions)
+        if included_distributions:
+            for dist in progress.iter_task(
+                list(included_distributions.values()),
+                "Collect dist-info",
+                lambda n: n.name,
+            ):
+                zip_node(dist, graph, zf, compiler, more_extensions)
+
+    progress.trace(
+        f"Wrote {zf.entry_count} entries ({zf.byte_count} bytes) to "
+        f"{paths.pylib_zipped.name} in {zf.elapsed:.2f}s ({zf.throughput()})"
+    )
+
+    if bundle.python_zip_index:
+        count = write_archive_index(paths.pylib_zipped, paths.pylib_index)
+        progress.trace(f"Wrote index for {count} modules to {paths.pylib_index.name}")
 
     if unzip_nodes:
         for node in progress.iter_task(
             unzip_nodes, "Collect site-packages directory", lambda n: n.identifier
         ):
-            fs_node(node, graph, paths.pylib)
+            fs_node(node, graph, paths.pylib, compiler, staging)
 
     ext_map = {}
     if more_extensions:
@@ -712,11 +794,40 @@ def collect_python(
             lambda n: n[1].identifier,
         ):
             assert node.filename is not None
-            (paths.extlib / ext_name).write_bytes(node.filename.read_bytes())
+            stage_file(node.filename, paths.extlib / ext_name, staging)
             ext_map[paths.extlib / ext_name] = node.filename
     return ext_map
 
 
+def update_bundle_output(
+    staging: StagingTree, bundle: BundleOptions, progress: Progress
+) -> None:
+    """
+    Update the bundle output to match the bundle in the
+    staging location, only touching files that have changed.
+
+    The staging tree is kept for the next build.
+    """
+    output = bundle_output_path(bundle)
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    result = sync_bundle(
+        staging.root, output, staging.manifest_path, progress, staging.copies
+    )
+    staging.finish()
+
+    progress.trace(
+        f"Staging: {staging.reused} files reused from the previous build, "
+        f"{staging.copied} copied, {result.hashed} files hashed"
+    )
+    progress.info(
+        f"Updated {output}: {result.written} files written "
+        f"({result.bytes_written} bytes), {result.deleted} removed, "
+        f"{result.unchanged} unchanged",
+        highlight=False,
+    )
+
+
 def make_readonly(
     root: pathlib.Path, bundle: BundleOptions, progress: Progress
 ) -> None:
@@ -727,15 +838,69 @@ def make_readonly(
     ...
 
 
-def get_module_graph(bundle: BundleOptions, progress: Progress) -> ModuleGraph:
+# Modules used by the indexed importer in the bootstrap code
+ZIP_INDEX_MODULES = ("mmap", "importlib.readers")
+
+
+def bundle_scripts(bundle: BundleOptions) -> typing.List[pathlib.Path]:
+    """
+    Return the scripts for *bundle*, starting with the main script
+    """
+    return [bundle.script, *bundle.extra_scripts]
+
+
+def bundle_modules(bundle: BundleOptions) -> typing.List[str]:
+    """
+    Return the modules that are included in *bundle* unconditionally
+    """
+    result = list(bundle.py_include)
+    if bundle.python_zip_index:
+        result.extend(ZIP_INDEX_MODULES)
+    return result
+
+
+def _full_package_hook(
+    bundle: BundleOptions,
+) -> typing.Callable[[ModuleGraph, BaseNode], None]:
+    """
+    Return a post-processing hook that ensures that packages listed
+    in the "full-package" option of *bundle* are included in their
+    entirety.
+    """
+
+    def hook(graph: ModuleGraph, node: BaseNode) -> None:
+        if isinstance(node, (Package, NamespacePackage)):
+            # The "encodings" package is handled by a recipe
+            if node.identifier in bundle.py_full_package:
+                graph.import_package(node, node.identifier)
+
+    return hook
+
+
+def get_module_graph(
+    bundle: BundleOptions,
+    progress: Progress,
+    cache: typing.Optional[GraphCache] = None,
+    *,
+    shared_with: typing.Sequence[BundleOptions] = (),
+) -> ModuleGraph:
+    """
+    Return the module graph for *bundle*, using *cache* to
+    reuse the graph from an earlier build when possible.
+
+    The graph also contains the scripts and included modules of
+    the bundles in *shared_with*, which must have the same "exclude"
+    and "full-package" options as *bundle*.
+    """
     scan_count = 0
+    full_package = _full_package_hook(bundle)
 
     def node_done(graph: ModuleGraph, node: BaseNode) -> None:
         """
         Callback for when *node* is fully imported in *graph*.
 
-        This callback currently only ensures that the ``encodings``
-        package is included in its entirety.
+        This callback currently only ensures that packages listed
+        in the "full-package" option are included in their entirety.
         """
         nonlocal scan_count
 
@@ -743,29 +908,150 @@ def get_module_graph(bundle: BundleOptions, progress: Progress) -> ModuleGraph:
         progress.step_task(task_id)
         scan_count += 1
 
-        if isinstance(node, (Package, NamespacePackage)):
-            if (
-                node.identifier in bundle.py_full_package
-                or node.identifier == "encodings"
-            ):
-                graph.import_package(node, node.identifier)
+        full_package(graph, node)
+
+    scripts = [
+        script
+        for item in itertools.chain((bundle,), shared_with)
+        for script in bundle_scripts(item)
+    ]
+    modules = [
+        name
+        for item in itertools.chain((bundle,), shared_with)
+        for name in bundle_modules(item)
+    ]
 
     graph = ModuleGraph()
     graph.add_post_processing_hook(node_done)
     task_id = progress.add_task("Scanning Python dependencies", count=None)
     graph.add_excludes(bundle.py_exclude)
 
-    for script in itertools.chain((bundle.script,), bundle.extra_scripts):
+    if cache is not None:
+        key = cache.key(
+            scripts,
+            modules,
+            bundle.py_exclude,
+            bundle.py_full_package,
+        )
+        if cache.load(key, graph):
+            progress.task_done(task_id)
+            progress.info(
+                f"Module graph cache: reused graph, {cache.rescanned} "
+                "changed modules rescanned",
+                highlight=False,
+            )
+            if cache.rescanned:
+                cache.store(key, graph)
+            return graph
+
+        if cache.unsupported:
+            progress.info(
+                "Module graph cache: not used with this version of modulegraph2",
+                highlight=False,
+            )
+        elif cache.untrusted:
+            progress.warning(
+                "Module graph cache: ignoring a cached graph that is not owned "
+                "by the current user or is writable by other users"
+            )
+
+    for script in scripts:
         graph.add_script(script)
 
-    for module_name in bundle.py_include:
+    for module_name in modules:
         graph.add_module(module_name)
 
     progress.task_done(task_id)
+
+    if cache is not None:
+        cache.store(key, graph)
     return graph
 
 
-def codesign(root: pathlib.Path, progress: Progress) -> None:
+def get_shared_module_graphs(
+    config: Py2appConfiguration,
+    bundles: typing.Sequence[BundleOptions],
+    progress: Progress,
+) -> typing.Dict[str, ModuleGraph]:
+    """
+    Scan the dependencies of bundles that can share a scan at once,
+    and return a mapping from bundle name to the module graph for
+    that bundle. The graphs are processed by the recipes.
+
+    Bundles can share a scan when they have the same "exclude" and
+    "full-package" options. The graph for a bundle is a copy of the
+    part of the shared graph that is reachable from the scripts and
+    included modules of the bundle. Recipes are run for every bundle
+    separately, changes made by recipes only affect that bundle.
+    """
+    groups: typing.Dict[
+        typing.Tuple[typing.Tuple[str, ...], typing.Tuple[str, ...]],
+        typing.List[BundleOptions],
+    ] = collections.defaultdict(list)
+    for bundle in bundles:
+        if bundle.build_type == BuildType.ALIAS:
+            continue
+        groups[(tuple(bundle.py_exclude), tuple(bundle.py_full_package))].append(bundle)
+
+    result = {}
+    for group in groups.values():
+        if len(group) == 1:
+            continue
+
+        with progress.span(
+            f"Shared scan for {', '.join(b.name for b in group)}", "phase"
+        ):
+            graph = get_module_graph(
+                group[0],
+                progress,
+                GraphCache(config.cache_dir) if config.cache_dir is not None else None,
+                shared_with=group[1:],
+            )
+            graph.add_module("zipfile")
+
+            for bundle in group:
+                subgraph = graph.subgraph(
+                    {str(script) for script in bundle_scripts(bundle)}
+                    | set(bundle_modules(bundle))
+                    | {"zipfile"}
+                )
+                subgraph.add_post_processing_hook(_full_package_hook(bundle))
+                process_recipes(subgraph, config.recipe, progress)
+                result[bundle.name] = subgraph
+
+    return result
+
+
+def prune_graph(graph: ModuleGraph, bundle: BundleOptions, progress: Progress) -> None:
+    """
+    Remove imports from *graph* that cannot be executed in the
+    bundle, and the modules that are only reachable through them.
+    """
+    target = Target(
+        machine=(
+            None
+            if bundle.macho_arch == BuildArch.UNIVERSAL2
+            else bundle.macho_arch.value
+        )
+    )
+    task_id = progress.add_task("Prune dead imports", count=1)
+    result = graph.prune_dead_imports(target)
+    progress.step_task(task_id)
+    progress.task_done(task_id)
+
+    if result.nodes:
+        progress.info(
+            f"Pruned {result.edges} dead imports: removed {result.nodes} "
+            f"unreachable nodes ({result.bytes} bytes)",
+            highlight=False,
+        )
+
+
+def codesign(
+    root: pathlib.Path,
+    progress: Progress,
+    files: typing.Optional[MachOFileTable] = None,
+) -> None:
     # XXX:
     # - add support for explicit code signing, including notarization
     # - ad-hoc signing is only needed when arm64 is used (incl. universal2)
@@ -773,7 +1059,7 @@ def codesign(root: pathlib.Path, progress: Progress) -> None:
     # - move codesign_adhoc logic to this file (and clean it up, it is a bit
     #   too magic at the moment)
     # task_id = progress.add_task("Perform ad-hoc code signature", count=1)
-    codesign_adhoc(root, progress)
+    codesign_adhoc(root, progress, files)
     # progress.step_task(task_id)
 
 
@@ -853,50 +1139,94 @@ def classify_missing(
 
 
 def build_bundle(
-    config: Py2appConfiguration, bundle: BundleOptions, progress: Progress
+    config: Py2appConfiguration,
+    bundle: BundleOptions,
+    progress: Progress,
+    graph: typing.Optional[ModuleGraph] = None,
 ) -> None:
     """
     Build the output for *bundle*. Returns *True* if successful and *False* otherwise.
+
+    *graph* is the module graph for the bundle after processing recipes,
+    the graph is created when it is not passed in.
     """
     if bundle.build_type != BuildType.ALIAS:
-        graph = get_module_graph(bundle, progress)
-        graph.add_module("zipfile")
+        if graph is None:
+            graph = get_module_graph(
+                bundle,
+                progress,
+                GraphCache(config.cache_dir) if config.cache_dir is not None else None,
+            )
+            graph.add_module("zipfile")
+
+            process_recipes(graph, config.recipe, progress)
 
-        process_recipes(graph, config.recipe, progress)
+        if bundle.python_prune_imports:
+            prune_graph(graph, bundle, progress)
     else:
         graph = None
 
-    paths = create_bundle_structure(bundle, progress)
+    staging = bundle_staging_tree(bundle) if config.incremental else None
+    paths = create_bundle_structure(bundle, progress, staging=staging)
     plist = get_info_plist(bundle)
     add_iconfile(paths, plist, bundle, progress)
     add_loader(paths, bundle, progress)
-    add_resources(paths, bundle, graph, progress)
+    add_resources(paths, bundle, graph, progress, staging)
 
+    extension_names: typing.Optional[typing.List[str]] = None
     if bundle.build_type != BuildType.ALIAS:
         assert graph is not None
-        ext_map = collect_python(bundle, paths, graph, progress)
-
-    add_bootstrap(
-        paths, bundle, graph, progress
-    )  # XXX: Needs more info which is collected in collect_python
+        compiler = BytecodeCompiler(
+            optimize=bundle.python_optimize,
+            overrides=bundle.python_optimize_overrides,
+            cache=(
+                BytecodeCache(config.cache_dir)
+                if config.cache_dir is not None
+                else None
+            ),
+        )
+        with progress.span("Collect Python code", "phase"):
+            ext_map = collect_python(bundle, paths, graph, compiler, progress, staging)
+        extension_names = [path.name.removesuffix(".so") for path in ext_map]
+
+    with progress.span("Add bootstrap", "phase"):
+        add_bootstrap(
+            paths,
+            bundle,
+            graph,
+            progress,
+            extension_names,
+            record_import_trace=config.record_import_trace,
+        )
 
     add_plist(paths, plist, progress)
 
+    # Mach-O files found in the bundle and their load commands,
+    # shared between the phases below.
+    macho_files = MachOFileTable()
+
     if bundle.build_type == BuildType.STANDALONE:
         assert graph is not None
-        macho_standalone(paths, graph, bundle, ext_map, progress)
+        macho_standalone(
+            paths, graph, bundle, ext_map, progress, macho_files, config.jobs, staging
+        )
     elif bundle.build_type == BuildType.ALIAS:
-        rewrite_libpython(paths, bundle, progress)
+        rewrite_libpython(paths, bundle, progress, macho_files)
     else:
         progress.error("Build type {bundle.build_type} is not supported")
         return
 
     if bundle.build_type == BuildType.ALIAS:
         # The rest of this function is not relevant for alias builds
-        codesign(paths.root.parent, progress)
+        codesign(paths.root.parent, progress, macho_files)
+        if staging is not None:
+            update_bundle_output(staging, bundle, progress)
         return
 
-    architecture, deployment_target, warnings = audit_macho_issues(paths.root.parent)
+    with progress.span("Audit MachO files", "phase"):
+        architecture, deployment_target, warnings = audit_macho_issues(
+            paths.root.parent, macho_files
+        )
 
     # XXX: Validate the 'architecture':
     # - Error out when 'architecture' is None (no architecture supports all Mach-O files)
@@ -915,16 +1245,27 @@ def build_bundle(
     # XXX: Check and document the error message for launching the bundle on
     # a version of the OS that is too old.
     if deployment_target is not None:
-        set_deployment_target(paths, bundle, progress, deployment_target)
+        set_deployment_target(paths, bundle, progress, deployment_target, macho_files)
 
     # XXX: Add support for using 'real' signatures
     #     (e.g. notarization), but only for standalone
     #     bundles.
-    codesign(paths.root.parent, progress)
+    codesign(paths.root.parent, progress, macho_files)
+    progress.trace(
+        f"Mach-O file checks: {macho_files.misses} files opened, "
+        f"{macho_files.hits} reused, {macho_files.scanned} scanned, "
+        f"{macho_files.parsed} parsed"
+    )
 
     make_readonly(paths.root.parent, bundle, progress)
 
     assert graph is not None
+    with progress.span("Size report", "phase"):
+        sizes = size_report(paths, graph)
+        sizes.write(bundle_size_report_path(bundle))
+
+    if staging is not None:
+        update_bundle_output(staging, bundle, progress)
 
     progress.info("")
     progress.info(
@@ -935,10 +1276,27 @@ def build_bundle(
     progress.info(
         f"Deployment target: [bold]macOS {deployment_target}[/bold]", highlight=False
     )
+    if compiler.cache is not None:
+        evicted = compiler.cache.trim()
+        progress.info(
+            f"Bytecode cache: [bold]{compiler.cache.hits}[/bold] hits, "
+            f"[bold]{compiler.cache.misses}[/bold] misses"
+            + (f", {evicted} entries evicted" if evicted else ""),
+            highlight=False,
+        )
+    progress.info("")
+    print_size_report(sizes, progress)
+    progress.info(
+        f"Size report: [bold]{bundle_size_report_path(bundle)}[/bold]",
+        highlight=False,
+    )
     progress.info("")
     for w in warnings:
         progress.warning(w)
 
+    for message in check_size_budget(sizes, bundle.size_budget):
+        progress.error(f"Size budget exceeded: {message}")
+
     (
         missing_unconditional,
         missing_conditional,
@@ -987,3 +1345,110 @@ def build_bundle(
                 f"* {name} (imported from {', '.join(missing_fromlist_conditional[name])})"
             )
         progress.warning("")
+
+
+def check_bundle_outputs(
+    bundles: typing.Sequence[BundleOptions], progress: Progress
+) -> bool:
+    """
+    Report bundles with the same output path, those would overwrite
+    each other. Returns True when all output paths are unique.
+    """
+    seen: typing.Dict[pathlib.Path, BundleOptions] = {}
+    ok = True
+    for bundle in bundles:
+        output = bundle_output_path(bundle)
+        if output in seen:
+            progress.error(
+                f"Bundles {seen[output].name!r} and {bundle.name!r} have "
+                f"the same output {str(output)!r}"
+            )
+            ok = False
+        else:
+            seen[output] = bundle
+    return ok
+
+
+def _build_bundle_in_worker(
+    config: Py2appConfiguration,
+    bundle: BundleOptions,
+    graph_data: typing.Optional[bytes],
+    level: int,
+) -> typing.Tuple[bool, typing.List[Span]]:
+    """
+    Build *bundle* in a worker process, returns if there
+    were errors and the timing spans for the build.
+    """
+    progress = Progress(level, live=False)
+    try:
+        with progress.span(bundle.name, "bundle"):
+            build_bundle(
+                config,
+                bundle,
+                progress,
+                load_graph(graph_data) if graph_data is not None else None,
+            )
+    finally:
+        progress.stop()
+    return progress.have_error, progress.spans
+
+
+def build_bundles(config: Py2appConfiguration, progress: Progress) -> None:
+    """
+    Build all bundles in *config*.
+
+    With the "shared_scan" option bundles share the scan of their
+    dependencies, and with more than one job bundles are built
+    in worker processes.
+    """
+    if not check_bundle_outputs(config.bundles, progress):
+        return
+
+    task_id = progress.add_task("Processing bundles", len(config.bundles))
+
+    graphs = (
+        get_shared_module_graphs(config, config.bundles, progress)
+        if config.shared_scan
+        else {}
+    )
+
+    if config.jobs > 1 and len(config.bundles) > 1:
+        with concurrent.futures.ProcessPoolExecutor(
+            min(config.jobs, len(config.bundles)),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            progress.update(
+                task_id, current=", ".join(bundle.name for bundle in config.bundles)
+            )
+            futures = [
+                executor.submit(
+                    _build_bundle_in_worker,
+                    config,
+                    bundle,
+                    (
+                        dump_graph(graphs[bundle.name])
+                        if bundle.name in graphs
+                        else None
+                    ),
+                    progress.level,
+                )
+                for bundle in config.bundles
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                have_error, spans = future.result()
+                progress.add_spans(spans)
+                if have_error:
+                    progress.have_error = True
+                progress.step_task(task_id)
+
+    else:
+        for bundle in config.bundles:
+            progress.update(
+                task_id,
+                current=f"{bundle.build_type.value} {'plugin' if bundle.plugin else 'application'} {bundle.name!r}",
+            )
+            with progress.span(bundle.name, "bundle"):
+                build_bundle(config, bundle, progress, graphs.get(bundle.name))
+            progress.step_task(task_id)
+
+    progress.update(task_id, current="")
@@ -20,6 +20,7 @@ class BundlePaths:
     - ``main``: Folder containing the main bundle binary;
     - ``pylib``: Location of Python libraries used that aren't zip safe;
     - ``pylib_zipped``: Location of the zip file containing the Python libraries used;
+    - ``pylib_index``: Location of the optional index for ``pylib_zipped``;
     - ``extlib``: Location of C extensions with special handling;
     - ``framework``: Location for included native libraries and frameworks.
     """
@@ -29,6 +30,7 @@ class BundlePaths:
     main: pathlib.Path
     pylib: pathlib.Path
     pylib_zipped: pathlib.Path
+    pylib_index: pathlib.Path
     extlib: pathlib.Path
     framework: pathlib.Path
 
@@ -56,6 +58,7 @@ def bundle_paths(root: pathlib.Path) -> BundlePaths:
         resources=root / "Contents/Resources",
         main=root / "Contents/MacOS",
         pylib_zipped=root / "Contents/Resources/python-libraries.zip",
+        pylib_index=root / "Contents/Resources/python-libraries.idx",
         pylib=root / "Contents/Resources/python-libraries",
         extlib=root / "Contents/Resources/lib-dynload",
         framework=root / "Contents/Frameworks",
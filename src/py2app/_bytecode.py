@@ -0,0 +1,306 @@
+"""
+Serializing Python code for inclusion in a bundle.
+
+The main entry point is *BytecodeCompiler*, which returns the ".pyc"
+representation for nodes in the module graph. The compiler can use
+an on-disk *BytecodeCache* that is shared between builds to avoid
+compiling and serializing modules that haven't changed.
+"""
+
+__all__ = ("BytecodeCache", "BytecodeCompiler", "code_to_bytes")
+
+import ast
+import hashlib
+import importlib.util
+import marshal
+import os
+import pathlib
+import sys
+import tempfile
+import threading
+import types
+import typing
+from importlib.util import MAGIC_NUMBER
+
+from modulegraph2 import Module, Script, SourceModule
+
+from ._dunderfile import rewrite_file_uses
+from ._modulegraph import ATTR_REWRITE_FILE
+
+# Default maximum size for the bytecode cache
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+
+def _pack_uint32(x: int) -> bytes:
+    """Convert a 32-bit integer to little-endian."""
+    return (int(x) & 0xFFFFFFFF).to_bytes(4, "little")
+
+
+def code_to_bytes(code: types.CodeType) -> bytearray:
+    """
+    Serialize a code object into ".pyc" format
+    """
+
+    data = bytearray(MAGIC_NUMBER)
+    data.extend(_pack_uint32(0))
+    data.extend(_pack_uint32(0))
+    data.extend(_pack_uint32(0))
+    data.extend(marshal.dumps(code))
+
+    return data
+
+
+class BytecodeCache:
+    """
+    Cache of ".pyc" data, indexed by a key string.
+
+    Entries are stored in the "bytecode" subdirectory of
+    *cache_dir*, using a two-level directory structure. The modification time of entries is
+    updated on use and is used to evict the least recently used
+    entries when the cache grows beyond *max_size* bytes.
+
+    The cache can safely be shared between concurrent builds,
+    entries are written atomically.
+    """
+
+    def __init__(self, cache_dir: pathlib.Path, max_size: int = DEFAULT_MAX_SIZE):
+        self._cache_dir = cache_dir / "bytecode"
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path_for_key(self, key: str) -> pathlib.Path:
+        return self._cache_dir / key[:2] / f"{key[2:]}.pyc"
+
+    def lookup(self, key: str) -> typing.Optional[bytes]:
+        """
+        Return the cached data for *key*, or None when
+        the key is not in the cache.
+        """
+        path = self._path_for_key(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+
+        try:
+            os.utime(path)
+        except OSError:
+            # Entry was evicted by a concurrent build
+            pass
+        return data
+
+    def store(self, key: str, data: typing.Union[bytes, bytearray]) -> None:
+        """
+        Store *data* in the cache for *key*
+        """
+        path = self._path_for_key(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as stream:
+                stream.write(data)
+            os.replace(tmpname, path)
+
+        except OSError:
+            # Failing to update the cache is not fatal.
+            pass
+
+    def trim(self) -> int:
+        """
+        Evict the least recently used entries until the cache
+        is no larger than the maximum size. Returns the number
+        of evicted entries.
+        """
+        entries = []
+        total = 0
+        for dirpath, _dirs, files in os.walk(self._cache_dir):
+            for fn in files:
+                try:
+                    st = os.stat(os.path.join(dirpath, fn))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, os.path.join(dirpath, fn)))
+                total += st.st_size
+
+        evicted = 0
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self._max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        return evicted
+
+
+class BytecodeCompiler:
+    """
+    Compute the ".pyc" data for modulegraph2 nodes, using
+    *cache* when it is available.
+
+    Code is compiled at optimization level *optimize*, with
+    *overrides* mapping package or module names to a different
+    level for that package and its submodules. A level of -1
+    means the level of the current interpreter.
+
+    This class is used from multiple threads.
+    """
+
+    def __init__(
+        self,
+        *,
+        optimize: int,
+        cache: typing.Optional[BytecodeCache],
+        overrides: typing.Optional[typing.Dict[str, int]] = None,
+    ):
+        self._optimize = optimize
+        self._overrides = dict(overrides) if overrides else {}
+        self.cache = cache
+
+    def optimize_for(self, node: typing.Union[Module, Script]) -> int:
+        """
+        Return the optimization level for *node*, which is
+        never -1.
+        """
+        level = self._optimize
+        if self._overrides and isinstance(node, Module):
+            # The most specific entry in the overrides table wins.
+            name = node.identifier
+            while name:
+                if name in self._overrides:
+                    level = self._overrides[name]
+                    break
+                name = name.rpartition(".")[0]
+
+        return sys.flags.optimize if level == -1 else level
+
+    def needs_compile(self, node: typing.Union[Module, Script]) -> bool:
+        """
+        Return True if the code for *node* must be compiled
+        from source instead of using the code object from
+        modulegraph2.
+        """
+        if not isinstance(node, (SourceModule, Script)) or node.filename is None:
+            return False
+
+        return self.optimize_for(node) != sys.flags.optimize or bool(
+            node.extension_attributes.get(ATTR_REWRITE_FILE, False)
+        )
+
+    def code_for_node(
+        self,
+        node: typing.Union[Module, Script],
+        source: typing.Optional[bytes] = None,
+    ) -> types.CodeType:
+        """
+        Return the code object for *node*, compiled at the
+        optimization level for the node.
+
+        Modulegraph2 compiles code at the optimization level of
+        the current interpreter, the code is recompiled from source
+        when a different level is needed or when uses of ``__file__``
+        must be rewritten. Nodes without source code (for example
+        *BytecodeModule*) are used as is.
+
+        *source* is the contents of the source file for *node*
+        when the caller has already read it.
+        """
+        assert node.code is not None
+
+        if not self.needs_compile(node):
+            return node.code
+
+        assert node.filename is not None
+        optimize = self.optimize_for(node)
+        rewrite = node.extension_attributes.get(ATTR_REWRITE_FILE, False)
+
+        if source is None:
+            try:
+                source = node.filename.read_bytes()
+            except OSError:
+                return node.code
+
+        text: typing.Union[str, ast.Module] = importlib.util.decode_source(source)
+        if rewrite:
+            text = rewrite_file_uses(ast.parse(text, node.code.co_filename))
+
+        return compile(
+            text, node.code.co_filename, "exec", dont_inherit=True, optimize=optimize
+        )
+
+    def cache_key(
+        self,
+        node: typing.Union[Module, Script],
+        source: typing.Optional[bytes] = None,
+    ) -> typing.Optional[str]:
+        """
+        Return the cache key for *node*, or None if the node
+        cannot be cached.
+
+        The key is based on the contents of the source file, the
+        bytecode version and the optimization level. *source* is
+        the contents of the source file when the caller has already
+        read it.
+        """
+        if not isinstance(node, (SourceModule, Script)) or node.filename is None:
+            return None
+
+        if source is None:
+            try:
+                source = node.filename.read_bytes()
+            except OSError:
+                return None
+
+        # The filename is part of the key because the code
+        # object contains the filename (for tracebacks).
+        h = hashlib.sha256()
+        h.update(MAGIC_NUMBER)
+        h.update(f"\0{self.optimize_for(node)}\0{node.identifier}\0".encode())
+        if node.extension_attributes.get(ATTR_REWRITE_FILE, False):
+            h.update(b"rewrite-file\0")
+        h.update(os.fsencode(node.filename))
+        h.update(b"\0")
+        h.update(hashlib.sha256(source).digest())
+        return h.hexdigest()
+
+    def pyc_for_node(
+        self, node: typing.Union[Module, Script]
+    ) -> typing.Union[bytes, bytearray]:
+        """
+        Return the ".pyc" data for *node*
+        """
+        assert node.code is not None
+
+        if (
+            self.cache is None
+            or not isinstance(node, (SourceModule, Script))
+            or node.filename is None
+        ):
+            return code_to_bytes(self.code_for_node(node))
+
+        # The source is read once, for both the cache
+        # key and compiling the code on a miss.
+        try:
+            source = node.filename.read_bytes()
+        except OSError:
+            return code_to_bytes(node.code)
+
+        key = self.cache_key(node, source)
+        assert key is not None
+        data = self.cache.lookup(key)
+        if data is not None:
+            return data
+
+        result = code_to_bytes(self.code_for_node(node, source))
+        self.cache.store(key, result)
+        return result
@@ -9,6 +9,7 @@ XXX: Try to avoid using typing.Any
 
 import enum
 import pathlib
+import platform
 import plistlib
 import re
 import sys
@@ -17,7 +18,24 @@ import typing
 
 T = typing.TypeVar("T")
 
-_, _DEFAULT_TARGET, _DEFAULT_ARCH = sysconfig.get_platform().split("-")
+
+def _default_target_and_arch() -> typing.Tuple[str, str]:
+    """
+    Return the default deployment target and architecture,
+    based on the current interpreter.
+    """
+    plat = sysconfig.get_platform()
+    if plat.startswith("macosx-"):
+        _, target, arch = plat.split("-")
+        return target, arch
+
+    # Bundles can only be build on macOS, but the configuration
+    # is also used on other platforms (for example by benchmarks).
+    machine = platform.machine()
+    return "11.0", "arm64" if machine in {"arm64", "aarch64"} else "x86_64"
+
+
+_DEFAULT_TARGET, _DEFAULT_ARCH = _default_target_and_arch()
 
 
 class ConfigurationError(Exception):
@@ -162,6 +180,9 @@ class BundleOptions:
     macho_arch = inherited[BuildArch]("arch", "macho_arch")
     deployment_target = inherited[str]("deployment_target", "deployment_target")
     python_optimize = inherited[int]("python.optimize", "python_optimize")
+    python_optimize_overrides = inherited[typing.Dict[str, int]](
+        "python.optimize-overrides", "python_optimize_overrides"
+    )
     python_malloc_debug = inherited[bool]("python.malloc-debug", "python_malloc_debug")
     python_dev_mode = inherited[bool]("python.dev-mode", "python_dev_mode")
     python_verbose = inherited[bool]("python.verbose", "python_verbose")
@@ -172,6 +193,11 @@ class BundleOptions:
     python_use_faulthandler = inherited[bool](
         "python.use-faulthandler", "python_use_faulthandler"
     )
+    python_zip_index = inherited[bool]("python.zip-index", "python_zip_index")
+    python_prune_imports = inherited[bool](
+        "python.prune-imports", "python_prune_imports"
+    )
+    size_budget = inherited[typing.Dict[str, int]]("size-budget", "size_budget")
 
     @property
     def name(self) -> str:
@@ -184,6 +210,7 @@ class BundleOptions:
     plugin = local[bool]("plugin", False)
     extension = local[str]("extension")  # Default depends on "plugin"
     iconfile = local[typing.Optional[pathlib.Path]]("iconfile", None)
+    import_trace = local[typing.Optional[pathlib.Path]]("import-trace", None)
     resources = local[typing.Any]("resources", ())
     plist = local[dict]("plist", {})
     extra_scripts = local[typing.Sequence[pathlib.Path]]("extra-scripts", ())
@@ -216,6 +243,7 @@ class BundleOptions:
         result.append(f"  plugin = {self.plugin!r}\n")
         result.append(f"  extension = {self.extension!r}\n")
         result.append(f"  iconfile = {self.iconfile!r}\n")
+        result.append(f"  import_trace = {self.import_trace!r}\n")
         result.append(f"  resources = {self.resources!r}\n")
         result.append(f"  plist = {self.plist!r}\n")
         result.append(f"  extra_scripts = {self.extra_scripts!r}\n")
@@ -236,12 +264,18 @@ class BundleOptions:
         result.append(f"  macho_arch = {self.macho_arch!r}\n")
         result.append(f"  deployment_target = {self.deployment_target!r}\n")
         result.append(f"  python_optimize = {self.python_optimize!r}\n")
+        result.append(
+            f"  python_optimize_overrides = {self.python_optimize_overrides!r}\n"
+        )
         result.append(f"  python_verbose = {self.python_verbose!r}\n")
         result.append(f"  python_finalize = {self.python_finalize!r}\n")
         result.append(f"  python_malloc_debug = {self.python_malloc_debug!r}\n")
         result.append(f"  python_dev_mode = {self.python_dev_mode!r}\n")
         result.append(f"  python_use_pythonpath = {self.python_use_pythonpath!r}\n")
         result.append(f"  python_use_faulthandler = {self.python_use_faulthandler!r}\n")
+        result.append(f"  python_zip_index = {self.python_zip_index!r}\n")
+        result.append(f"  python_prune_imports = {self.python_prune_imports!r}\n")
+        result.append(f"  size_budget = {self.size_budget!r}\n")
         result.append(">")
         return "".join(result)
 
@@ -255,6 +289,7 @@ class RecipeOptions:
     matplotlib_backends = local[typing.Optional[typing.Sequence[str]]](
         "matplotlib-backends", None
     )
+    encodings = local[typing.Optional[typing.Sequence[str]]]("encodings", None)
 
     def __repr__(self) -> str:
         result = []
@@ -262,6 +297,7 @@ class RecipeOptions:
         result.append(f"  zip_unsafe = {self.zip_unsafe!r}\n")
         result.append(f"  qt_plugins = {self.qt_plugins!r}\n")
         result.append(f"  matplotlib_backends = {self.matplotlib_backends!r}\n")
+        result.append(f"  encodings = {self.encodings!r}\n")
 
         result.append(">")
         return "".join(result)
@@ -278,18 +314,30 @@ class Py2appConfiguration:
         self.bundles = bundles
         self.recipe = recipe_options
         self.debug_macho_usage = False
+        self.cache_dir: typing.Optional[pathlib.Path] = None
+        self.incremental = False
+        self.profile: typing.Optional[pathlib.Path] = None
+        self.jobs = 1
+        self.shared_scan = False
+        self.record_import_trace = False
 
     build_type = local[BuildType]("build_type", BuildType.STANDALONE)
     deployment_target = local[str]("deployment_target", _DEFAULT_TARGET)
     macho_strip = local[bool]("strip", True)
     macho_arch = local[BuildArch]("arch", BuildArch(_DEFAULT_ARCH))
     python_optimize = local[int]("python.optimize", sys.flags.optimize)
+    python_optimize_overrides = local[typing.Dict[str, int]](
+        "python.optimize-overrides", {}
+    )
     python_verbose = local[bool]("python.verbose", bool(sys.flags.verbose))
     python_finalize = local[bool]("python.finalize", True)
     python_malloc_debug = local[bool]("python.malloc-debug", False)
     python_dev_mode = local[bool]("python.dev-mode", False)
     python_use_pythonpath = local[bool]("python.use-pythonpath", False)
     python_use_faulthandler = local[bool]("python.use-faulthandler", False)
+    python_zip_index = local[bool]("python.zip-index", False)
+    python_prune_imports = local[bool]("python.prune-imports", False)
+    size_budget = local[typing.Dict[str, int]]("size-budget", {})
 
     def __repr__(self) -> str:
         result = []
@@ -298,10 +346,16 @@ class Py2appConfiguration:
         result.append(f"  macho_strip = {self.macho_strip!r}\n")
         result.append(f"  macho_arch = {self.macho_arch!r}\n")
         result.append(f"  python_optimize = {self.python_optimize!r}\n")
+        result.append(
+            f"  python_optimize_overrides = {self.python_optimize_overrides!r}\n"
+        )
         result.append(f"  python_verbose = {self.python_verbose!r}\n")
         result.append(f"  python_finalize = {self.python_finalize!r}\n")
         result.append(f"  python_use_pythonpath = {self.python_use_pythonpath!r}\n")
         result.append(f"  python_use_faulthandler = {self.python_use_faulthandler!r}\n")
+        result.append(f"  python_zip_index = {self.python_zip_index!r}\n")
+        result.append(f"  python_prune_imports = {self.python_prune_imports!r}\n")
+        result.append(f"  size_budget = {self.size_budget!r}\n")
         result.append(f"  python_malloc_debug = {self.python_malloc_debug!r}\n")
         result.append(f"  python_dev_mode = {self.python_dev_mode!r}\n")
         result.append(f"  build_type = {self.build_type}\n")
@@ -327,6 +381,43 @@ class Py2appConfiguration:
         return "".join(result)
 
 
+_SIZE_UNITS = {
+    "": 1,
+    "b": 1,
+    "kb": 1000,
+    "mb": 1000**2,
+    "gb": 1000**3,
+    "kib": 1024,
+    "mib": 1024**2,
+    "gib": 1024**3,
+}
+
+
+def _parse_size_budget(value: typing.Any, location: str) -> typing.Dict[str, int]:
+    """
+    Parse a size budget table: a mapping from distribution
+    names (or "total") to a size in bytes. Sizes are integers
+    or strings with a unit, such as "25 MB" or "1.5GiB".
+    """
+    if not isinstance(value, dict):
+        raise ConfigurationError(f"'{location}' is not a table")
+
+    result = {}
+    for name, size in value.items():
+        if isinstance(size, str):
+            m = re.fullmatch(r"\s*([0-9]+(?:[.][0-9]+)?)\s*([a-zA-Z]*)\s*", size)
+            if m is None or m.group(2).lower() not in _SIZE_UNITS:
+                raise ConfigurationError(f"'{location}.{name}' is not a valid size")
+            size = int(float(m.group(1)) * _SIZE_UNITS[m.group(2).lower()])
+        elif not isinstance(size, int) or isinstance(size, bool):
+            raise ConfigurationError(f"'{location}.{name}' is not a valid size")
+
+        if size < 0:
+            raise ConfigurationError(f"'{location}.{name}' is not a valid size")
+        result[name] = size
+    return result
+
+
 def parse_pyproject(
     file_contents: dict, config_root: pathlib.Path
 ) -> Py2appConfiguration:
@@ -349,7 +440,12 @@ def parse_pyproject(
             if not isinstance(config["recipe"], dict):
                 raise ConfigurationError("'tool.py2app.recipe' is not a dictionary")
             for py_key, py_value in config["recipe"].items():
-                if py_key in {"zip-unsafe", "qt-plugins", "matplotlib-backends"}:
+                if py_key in {
+                    "zip-unsafe",
+                    "qt-plugins",
+                    "matplotlib-backends",
+                    "encodings",
+                }:
                     if not isinstance(py_value, list) or not all(
                         isinstance(v, str) for v in py_value
                     ):
@@ -362,6 +458,11 @@ def parse_pyproject(
                         f"'tool.py2app.recipe.{py_key}' is not a valid key"
                     )
 
+        elif key == "size-budget":
+            global_options["size-budget"] = _parse_size_budget(
+                value, "tool.py2app.size-budget"
+            )
+
         elif key == "build-type":
             try:
                 global_options["build_type"] = BuildType(value)
@@ -394,6 +495,8 @@ def parse_pyproject(
                     "use-pythonpath",
                     "use-sitepackages",
                     "use-faulthandler",
+                    "zip-index",
+                    "prune-imports",
                     "verbose",
                     "finalize",
                 }:
@@ -408,6 +511,14 @@ def parse_pyproject(
                             "'tool.py2app.python.optimize' is not an integer"
                         )
                     global_options["python.optimize"] = py_value
+                elif py_key == "optimize-overrides":
+                    if not isinstance(py_value, dict) or not all(
+                        isinstance(v, int) for v in py_value.values()
+                    ):
+                        raise ConfigurationError(
+                            "'tool.py2app.python.optimize-overrides' is not a table of integers"
+                        )
+                    global_options["python.optimize-overrides"] = py_value
                 else:
                     raise ConfigurationError(
                         f"invalid key 'tool.py2app.python.{py_key}'"
@@ -445,7 +556,7 @@ def parse_pyproject(
                     )
                 local_options[key] = value
 
-            elif key in {"script", "iconfile"}:
+            elif key in {"script", "iconfile", "import-trace"}:
                 if not isinstance(value, str):
                     raise ConfigurationError(
                         f"'tool.py2app.bundle.{bundle_name}.{key}' is not a string"
@@ -466,6 +577,11 @@ def parse_pyproject(
                     )
                 local_options[key] = value
 
+            elif key == "size-budget":
+                local_options["size-budget"] = _parse_size_budget(
+                    value, f"tool.py2app.bundle.{bundle_name}.size-budget"
+                )
+
             elif key == "resources":
                 if not isinstance(value, list):
                     raise ConfigurationError(
@@ -575,6 +691,8 @@ def parse_pyproject(
                         "use-pythonpath",
                         "use-sitepackages",
                         "use-faulthandler",
+                        "zip-index",
+                        "prune-imports",
                         "verbose",
                         "finalize",
                     }:
@@ -589,6 +707,14 @@ def parse_pyproject(
                                 f"'tool.py2app.bundle.{bundle_name}.python.optimize' is not an integer"
                             )
                         local_options["python.optimize"] = py_value
+                    elif py_key == "optimize-overrides":
+                        if not isinstance(py_value, dict) or not all(
+                            isinstance(v, int) for v in py_value.values()
+                        ):
+                            raise ConfigurationError(
+                                f"'tool.py2app.bundle.{bundle_name}.python.optimize-overrides' is not a table of integers"
+                            )
+                        local_options["python.optimize-overrides"] = py_value
                     else:
                         raise ConfigurationError(
                             f"invalid key: 'tool.py2app.bundle.{bundle_name}.python.{py_key}'"
@@ -0,0 +1,138 @@
+"""
+Copying file contents without reading whole files into memory.
+
+*copy_file* uses the cheapest mechanism available for the platform
+and filesystem: a copy-on-write clone, an in-kernel copy, or
+as a fallback a copy in bounded chunks.
+"""
+
+__all__ = ("CHUNK_SIZE", "copy_file", "copy_stream")
+
+import errno
+import os
+import pathlib
+import shutil
+import sys
+import typing
+
+# Maximum amount of data copied at a time
+CHUNK_SIZE = 1024 * 1024
+
+# ioctl for cloning a file on Linux (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+# Errors that indicate that a copy mechanism is not
+# available for the source and destination.
+_UNSUPPORTED = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EBADF,
+    errno.ETXTBSY,
+    errno.EPERM,
+}
+
+
+def copy_stream(src: typing.IO[bytes], dst: typing.IO[bytes]) -> int:
+    """
+    Copy the remaining contents of *src* to *dst* in
+    bounded chunks, returns the number of bytes copied.
+    """
+    total = 0
+    while chunk := src.read(CHUNK_SIZE):
+        dst.write(chunk)
+        total += len(chunk)
+    return total
+
+
+def _try_clone(src_fd: int, dst_fd: int) -> bool:
+    """
+    Try to clone *src_fd* into *dst_fd*, returns True
+    on success.
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+
+    import fcntl
+
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    except OSError as exc:
+        if exc.errno in _UNSUPPORTED:
+            return False
+        raise
+    return True
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    return os.copy_file_range(src_fd, dst_fd, count)
+
+
+def _sendfile(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+def _try_kernel_copy(src_fd: int, dst_fd: int, size: int) -> bool:
+    """
+    Try to copy *size* bytes from *src_fd* to *dst_fd* without
+    copying data to user space, returns True on success.
+
+    Both file offsets must be at the start of the file.
+    """
+    functions: typing.List[typing.Callable[[int, int, int, int], int]] = []
+    if hasattr(os, "copy_file_range"):
+        functions.append(_copy_file_range)
+    if sys.platform.startswith("linux"):
+        # sendfile(2) only supports regular files as the
+        # destination on Linux.
+        functions.append(_sendfile)
+
+    for func in functions:
+        offset = 0
+        try:
+            while offset < size:
+                sent = func(src_fd, dst_fd, offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+
+        except OSError as exc:
+            if exc.errno not in _UNSUPPORTED or offset != 0:
+                raise
+            continue
+
+        if offset == size:
+            return True
+
+        # Short copy (file changed while copying), reset the
+        # offsets and let the next mechanism handle this.
+        os.lseek(src_fd, 0, os.SEEK_SET)
+        os.lseek(dst_fd, 0, os.SEEK_SET)
+        os.ftruncate(dst_fd, 0)
+
+    return False
+
+
+def copy_file(src: pathlib.Path, dst: pathlib.Path) -> int:
+    """
+    Copy the contents of *src* to *dst*, replacing *dst* when
+    it exists. Returns the number of bytes copied.
+
+    This does not copy file metadata.
+    """
+    if sys.platform == "darwin":
+        # shutil uses fcopyfile(3) on macOS, which copies in the kernel.
+        shutil.copyfile(src, dst)
+        return dst.stat().st_size
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        if _try_clone(fsrc.fileno(), fdst.fileno()):
+            return size
+
+        if _try_kernel_copy(fsrc.fileno(), fdst.fileno(), size):
+            return size
+
+        return copy_stream(fsrc, fdst)
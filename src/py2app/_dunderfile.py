@@ -0,0 +1,441 @@
+"""
+Static analysis of the uses of ``__file__`` in a module.
+
+Code that uses ``__file__`` to locate files next to the module
+does not work when the module is loaded from a zip archive. Not
+every use of ``__file__`` is a problem though, using the value
+in a log message or a ``__repr__`` works fine. This module
+classifies each use of ``__file__``:
+
+* SAFE: the value is only used as text.
+* REWRITABLE: the value is used as ``pathlib.Path(__file__).parent``
+  to read package data with operations that are also supported by
+  ``importlib.resources.files``, *rewrite_file_uses* replaces the
+  expression by a call to that function.
+* UNSAFE: everything else, for example ``os.path.dirname(__file__)``
+  joined with the name of a data file.
+"""
+
+__all__ = (
+    "REWRITABLE",
+    "SAFE",
+    "UNSAFE",
+    "FileUse",
+    "file_uses",
+    "rewrite_file_uses",
+)
+
+import ast
+import dataclasses
+import typing
+
+SAFE = "safe"
+REWRITABLE = "rewritable"
+UNSAFE = "unsafe"
+
+# Names of functions and methods whose arguments are only
+# used as text.
+_LOG_FUNCTIONS = frozenset(
+    {
+        "print",
+        "debug",
+        "info",
+        "warning",
+        "warn",
+        "error",
+        "exception",
+        "critical",
+        "log",
+    }
+)
+
+# Methods that return a text representation of an object
+_TEXT_METHODS = frozenset({"__repr__", "__str__"})
+
+# Functions that convert a value to text
+_TEXT_FUNCTIONS = frozenset({"str", "repr", "format"})
+
+# Methods of *importlib.resources.abc.Traversable* that
+# can be used to access package data.
+_RESOURCE_METHODS = frozenset(
+    {"read_text", "read_bytes", "open", "is_file", "is_dir", "iterdir"}
+)
+
+# Methods of *pathlib.Path* that can be used between creating
+# the path for ``__file__`` and taking its parent.
+_PATH_METHODS = frozenset({"resolve", "absolute"})
+
+_Parents = typing.Dict[ast.AST, ast.AST]
+
+
+@dataclasses.dataclass(frozen=True)
+class FileUse:
+    """
+    A use of ``__file__`` at line *lineno*. *kind* is SAFE,
+    REWRITABLE or UNSAFE and *code* is the source code of the
+    expression using ``__file__``.
+    """
+
+    lineno: int
+    kind: str
+    code: str
+
+
+def _parents(tree: ast.AST) -> _Parents:
+    return {
+        child: node for node in ast.walk(tree) for child in ast.iter_child_nodes(node)
+    }
+
+
+def _is_dunder_file(node: ast.AST) -> bool:
+    return (
+        isinstance(node, ast.Name)
+        and node.id == "__file__"
+        and isinstance(node.ctx, ast.Load)
+    )
+
+
+def _is_str_constant(node: ast.AST) -> bool:
+    return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+
+def _imports_path(tree: ast.Module) -> bool:
+    """
+    Return True if *tree* contains ``from pathlib import Path``
+    """
+    return any(
+        isinstance(node, ast.ImportFrom)
+        and node.module == "pathlib"
+        and any(alias.name == "Path" and alias.asname is None for alias in node.names)
+        for node in ast.walk(tree)
+    )
+
+
+def _package_dir(
+    name: ast.Name, parents: _Parents, *, path_imported: bool
+) -> typing.Optional[ast.expr]:
+    """
+    Return the expression ``pathlib.Path(__file__).parent`` (with
+    optionally ``.resolve()`` or ``.absolute()`` before ``.parent``)
+    that contains *name*, or None if *name* is not used in such an
+    expression. *path_imported* is true when the module imports
+    the name ``Path`` from pathlib.
+    """
+    call = parents.get(name)
+    if (
+        not isinstance(call, ast.Call)
+        or call.args != [name]
+        or call.keywords
+        or not (
+            (
+                path_imported
+                and isinstance(call.func, ast.Name)
+                and call.func.id == "Path"
+            )
+            or (
+                isinstance(call.func, ast.Attribute)
+                and call.func.attr == "Path"
+                and isinstance(call.func.value, ast.Name)
+                and call.func.value.id == "pathlib"
+            )
+        )
+    ):
+        return None
+
+    node: ast.expr = call
+    while True:
+        parent = parents.get(node)
+        if not isinstance(parent, ast.Attribute) or parent.value is not node:
+            return None
+
+        if parent.attr == "parent":
+            return parent
+
+        method_call = parents.get(parent)
+        if (
+            parent.attr not in _PATH_METHODS
+            or not isinstance(method_call, ast.Call)
+            or method_call.func is not parent
+            or method_call.args
+            or method_call.keywords
+        ):
+            return None
+        node = method_call
+
+
+def _is_resource_access(node: ast.expr, parents: _Parents) -> bool:
+    """
+    Return True if the path *node* is only used to access
+    package data in a way that is supported by the objects
+    returned by *importlib.resources.files*.
+    """
+    while True:
+        parent = parents.get(node)
+
+        if (
+            isinstance(parent, ast.BinOp)
+            and isinstance(parent.op, ast.Div)
+            and parent.left is node
+            and _is_str_constant(parent.right)
+        ):
+            node = parent
+            continue
+
+        if not isinstance(parent, ast.Attribute) or parent.value is not node:
+            return False
+
+        call = parents.get(parent)
+        if not isinstance(call, ast.Call) or call.func is not parent:
+            return False
+
+        if parent.attr == "joinpath":
+            if call.keywords or not all(_is_str_constant(arg) for arg in call.args):
+                return False
+            node = call
+            continue
+
+        return parent.attr in _RESOURCE_METHODS
+
+
+def _is_private(name: str, tree: ast.Module, parents: _Parents) -> bool:
+    """
+    Return True if the global *name* is not part of the public
+    interface of the module: the name starts with an underscore,
+    or the module defines ``__all__`` as a literal sequence of
+    strings that does not include *name*.
+    """
+    if name.startswith("_"):
+        return True
+
+    exported: typing.Set[str] = set()
+    has_all = False
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Name) and node.id == "__all__"):
+            continue
+
+        statement = parents.get(node)
+        if isinstance(node.ctx, ast.Load) or not isinstance(
+            statement, (ast.Assign, ast.AugAssign, ast.AnnAssign)
+        ):
+            # ``__all__`` is used in a way that may change
+            # its value, e.g. ``__all__.append(name)``
+            return False
+
+        value = statement.value
+        if not isinstance(value, (ast.List, ast.Tuple)) or not all(
+            _is_str_constant(elt) for elt in value.elts
+        ):
+            return False
+
+        has_all = True
+        exported.update(
+            elt.value
+            for elt in value.elts
+            if isinstance(elt, ast.Constant) and isinstance(elt.value, str)
+        )
+
+    return has_all and name not in exported
+
+
+def _is_alias_for_data(
+    package_dir: ast.expr, tree: ast.Module, parents: _Parents
+) -> bool:
+    """
+    Return True if *package_dir* is assigned to a private global
+    variable that is not assigned anywhere else and is only used
+    to access package data.
+
+    Public names are excluded because other modules can import
+    the variable and use it as a filesystem path.
+    """
+    assign = parents.get(package_dir)
+    if (
+        not isinstance(assign, ast.Assign)
+        or assign.value is not package_dir
+        or assign not in tree.body
+        or len(assign.targets) != 1
+        or not isinstance(assign.targets[0], ast.Name)
+    ):
+        return False
+
+    name = assign.targets[0].id
+    if not _is_private(name, tree, parents):
+        return False
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id == name:
+            if isinstance(node.ctx, ast.Load):
+                if not _is_resource_access(node, parents):
+                    return False
+            elif node is not assign.targets[0]:
+                return False
+
+        elif isinstance(node, (ast.Global, ast.Nonlocal)) and name in node.names:
+            return False
+
+        elif isinstance(
+            node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)
+        ) and name in {
+            arg.arg for arg in ast.walk(node.args) if isinstance(arg, ast.arg)
+        }:
+            # Shadowed by an argument
+            return False
+
+    return True
+
+
+def _in_text_method(node: ast.AST, parents: _Parents) -> bool:
+    """
+    Return True if *node* is part of a ``__repr__`` or
+    ``__str__`` method.
+    """
+    while node in parents:
+        node = parents[node]
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return node.name in _TEXT_METHODS
+    return False
+
+
+def _is_text_use(name: ast.Name, parents: _Parents) -> bool:
+    """
+    Return True if *name* is only used as text: in a log message,
+    an exception message or the return value of ``__repr__``.
+    """
+    node: ast.AST = name
+    while True:
+        parent = parents.get(node)
+
+        if isinstance(
+            parent,
+            (ast.JoinedStr, ast.FormattedValue, ast.BinOp, ast.Tuple, ast.keyword),
+        ):
+            node = parent
+
+        elif isinstance(parent, ast.Call):
+            if node is parent.func:
+                return False
+
+            func = parent.func
+            if isinstance(func, ast.Name):
+                func_name = func.id
+            elif isinstance(func, ast.Attribute):
+                func_name = func.attr
+            else:
+                return False
+
+            if func_name in _LOG_FUNCTIONS:
+                return True
+
+            raise_stmt = parents.get(parent)
+            if isinstance(raise_stmt, ast.Raise) and raise_stmt.exc is parent:
+                return True
+
+            if func_name not in _TEXT_FUNCTIONS:
+                return False
+            node = parent
+
+        elif isinstance(parent, ast.Return):
+            return _in_text_method(parent, parents)
+
+        else:
+            return False
+
+
+def _source_for(node: ast.AST, parents: _Parents) -> str:
+    """
+    Return the source code for the statement containing
+    *node*, or the expression containing *node* for compound
+    statements.
+    """
+    while not isinstance(node, ast.stmt) and node in parents:
+        parent = parents[node]
+        if isinstance(parent, ast.stmt) and not isinstance(
+            parent,
+            (ast.Expr, ast.Assign, ast.AnnAssign, ast.AugAssign, ast.Return, ast.Raise),
+        ):
+            break
+        node = parent
+
+    code = ast.unparse(node).partition("\n")[0]
+    if len(code) > 80:
+        code = code[:77] + "..."
+    return code
+
+
+def _classify(
+    name: ast.Name, tree: ast.Module, parents: _Parents, *, path_imported: bool
+) -> typing.Tuple[str, typing.Optional[ast.expr]]:
+    """
+    Return the kind of use for *name*, and for REWRITABLE
+    uses the expression to replace.
+    """
+    package_dir = _package_dir(name, parents, path_imported=path_imported)
+    if package_dir is not None and (
+        _is_resource_access(package_dir, parents)
+        or _is_alias_for_data(package_dir, tree, parents)
+    ):
+        return REWRITABLE, package_dir
+
+    if _is_text_use(name, parents):
+        return SAFE, None
+
+    return UNSAFE, None
+
+
+def _analyse(
+    tree: ast.Module,
+) -> typing.List[typing.Tuple[FileUse, typing.Optional[ast.expr]]]:
+    parents = _parents(tree)
+    path_imported = _imports_path(tree)
+    result = []
+    for node in ast.walk(tree):
+        if _is_dunder_file(node):
+            assert isinstance(node, ast.Name)
+            kind, expr = _classify(node, tree, parents, path_imported=path_imported)
+            result.append(
+                (FileUse(node.lineno, kind, _source_for(node, parents)), expr)
+            )
+    result.sort(key=lambda item: item[0].lineno)
+    return result
+
+
+def file_uses(tree: ast.Module) -> typing.List[FileUse]:
+    """
+    Return the uses of ``__file__`` in *tree*, sorted by line number
+    """
+    return [use for use, _ in _analyse(tree)]
+
+
+# Expression used by *rewrite_file_uses*, this avoids adding an
+# import statement to the module.
+_FILES_EXPR = (
+    '__import__("importlib.resources", fromlist=["files"]).files(__spec__.parent)'
+)
+
+
+class _Rewriter(ast.NodeTransformer):
+    def __init__(self, targets: typing.Set[ast.expr]) -> None:
+        self._targets = targets
+
+    def visit(self, node: ast.AST) -> ast.AST:
+        if node in self._targets:
+            replacement = ast.parse(_FILES_EXPR, mode="eval").body
+            return ast.copy_location(replacement, node)
+        return super().visit(node)
+
+
+def rewrite_file_uses(tree: ast.Module) -> ast.Module:
+    """
+    Replace the REWRITABLE uses of ``__file__`` in *tree* by
+    the equivalent call to ``importlib.resources.files``, and
+    return the updated tree.
+
+    The module must be part of a package.
+    """
+    targets = {expr for _, expr in _analyse(tree) if expr is not None}
+    if not targets:
+        return tree
+
+    result = _Rewriter(targets).visit(tree)
+    assert isinstance(result, ast.Module)
+    return ast.fix_missing_locations(result)
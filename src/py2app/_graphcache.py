@@ -0,0 +1,377 @@
+"""
+Persisting the scanned module graph between builds.
+
+Scanning the dependencies of a large application parses and
+compiles every module it uses. *GraphCache* stores the graph
+as it is after scanning (before running recipes) and reuses it
+for later builds with the same interpreter, ``sys.path`` and
+scan configuration.
+
+The cache records the files and directories the scan depends on.
+A cached graph is only used when no directory listing changed,
+nodes for source files whose contents changed are rescanned.
+
+Cached graphs are stored using pickle, loading a graph can run
+arbitrary code. Graphs that are not owned by the current user,
+or that are writable by other users, are ignored.
+
+Restoring a graph depends on private attributes of modulegraph2,
+the cache is disabled for versions of modulegraph2 that haven't
+been checked.
+"""
+
+__all__ = ("GraphCache", "dump_graph", "load_graph")
+
+import contextlib
+import copyreg
+import dataclasses
+import hashlib
+import io
+import marshal
+import os
+import pathlib
+import pickle
+import stat
+import sys
+import tempfile
+import types
+import typing
+
+import modulegraph2
+import packaging.specifiers
+from modulegraph2 import NamespacePackage, Package, Script, SourceModule
+
+from . import __version__
+from ._modulegraph import ModuleGraph
+
+# Version of the cache format, update when the stored data changes.
+FORMAT_VERSION = 1
+
+# Versions of modulegraph2 whose private attributes are known to
+# work with *ModuleGraph.restore_scan_state* and *ModuleGraph.rescan*.
+# Update after checking a new release.
+MODULEGRAPH2_VERSIONS = packaging.specifiers.SpecifierSet(">=2.3,<2.4")
+
+# Private attributes of modulegraph2 used when restoring a graph
+_PRIVATE_ATTRIBUTES = (
+    "_load_script",
+    "_find_or_load_module",
+    "_run_stack",
+    "_post_processing_seen",
+    "_global_lazy_nodes",
+)
+
+# (st_mtime_ns, st_size, sha256 of the contents)
+_FileInfo = typing.Tuple[int, int, str]
+
+# (st_mtime_ns, sha256 of the sorted directory listing), None for
+# a path that does not exist.
+_DirInfo = typing.Optional[typing.Tuple[int, str]]
+
+
+def _load_code(data: bytes) -> types.CodeType:
+    code = marshal.loads(data)
+    assert isinstance(code, types.CodeType)
+    return code
+
+
+def _reduce_code(
+    code: types.CodeType,
+) -> typing.Tuple[typing.Callable[[bytes], types.CodeType], typing.Tuple[bytes]]:
+    return _load_code, (marshal.dumps(code),)
+
+
+class _Pickler(pickle.Pickler):
+    """
+    Pickler that serializes code objects using marshal
+    """
+
+    dispatch_table = copyreg.dispatch_table.copy()
+    dispatch_table[types.CodeType] = _reduce_code
+
+
+def dump_graph(graph: ModuleGraph) -> bytes:
+    """
+    Serialize *graph*, without its hooks, to bytes
+    """
+    stream = io.BytesIO()
+    _Pickler(stream, protocol=pickle.HIGHEST_PROTOCOL).dump(graph.scan_state())
+    return stream.getvalue()
+
+
+def load_graph(data: bytes) -> ModuleGraph:
+    """
+    Return a graph from the data returned by *dump_graph*
+    """
+    graph = ModuleGraph()
+    graph.restore_scan_state(pickle.loads(data))
+    return graph
+
+
+def _is_supported(graph: ModuleGraph) -> bool:
+    """
+    Return True if a cached graph can be restored into *graph*
+    with the installed version of modulegraph2.
+    """
+    return modulegraph2.__version__ in MODULEGRAPH2_VERSIONS and all(
+        hasattr(graph, name) for name in _PRIVATE_ATTRIBUTES
+    )
+
+
+def _is_trusted(st: os.stat_result) -> bool:
+    """
+    Return True if a cache entry with status *st* was written
+    by the current user and cannot be changed by other users.
+    """
+    return st.st_uid == os.getuid() and not (st.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+
+def _file_hash(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as stream:
+        while chunk := stream.read(1024 * 1024):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _dir_info(path: pathlib.Path) -> _DirInfo:
+    """
+    Return the information used to detect changes to the
+    list of importable names in *path*
+    """
+    try:
+        st = path.stat()
+        if not path.is_dir():
+            # Zipfile on sys.path
+            return (st.st_mtime_ns, _file_hash(path))
+
+        listing = "\0".join(
+            sorted(
+                name
+                for name in os.listdir(path)
+                if name != "__pycache__" and not name.startswith(".")
+            )
+        )
+    except OSError:
+        return None
+
+    return (st.st_mtime_ns, hashlib.sha256(os.fsencode(listing)).hexdigest())
+
+
+def _dir_changed(path: pathlib.Path, info: _DirInfo) -> bool:
+    try:
+        st = path.stat()
+    except OSError:
+        return info is not None
+
+    if info is not None and st.st_mtime_ns == info[0]:
+        return False
+
+    # Editors that save by renaming update the modification
+    # time of the directory without changing the listing.
+    current = _dir_info(path)
+    return current is None or info is None or current[1] != info[1]
+
+
+def _scanned_files(graph: ModuleGraph) -> typing.Dict[str, pathlib.Path]:
+    """
+    Return a mapping from node identifier to the source file
+    for nodes whose outgoing edges are determined by scanning
+    that file.
+    """
+    result = {}
+    for node in graph.nodes():
+        source = node.init_module if isinstance(node, Package) else node
+        if (
+            isinstance(source, (SourceModule, Script))
+            and source.filename is not None
+            and source.filename.is_file()
+        ):
+            result[node.identifier] = source.filename
+    return result
+
+
+def _scanned_directories(graph: ModuleGraph) -> typing.Set[pathlib.Path]:
+    """
+    Return the directories whose contents determine which
+    modules can be found.
+    """
+    result = {pathlib.Path(p or os.curdir) for p in sys.path}
+    for node in graph.nodes():
+        if isinstance(node, (Package, NamespacePackage)):
+            result.update(node.search_path)
+    return result
+
+
+@dataclasses.dataclass
+class _CacheEntry:
+    state: typing.Dict[str, typing.Any]
+    files: typing.Dict[str, typing.Tuple[pathlib.Path, _FileInfo]]
+    directories: typing.Dict[pathlib.Path, _DirInfo]
+
+
+class GraphCache:
+    """
+    On-disk cache for scanned module graphs, stored in
+    the "module-graph" subdirectory of *cache_dir*.
+
+    The cache directory can be shared with *BytecodeCache*,
+    which uses a different subdirectory. The directory must
+    only be writable by trusted users.
+    """
+
+    def __init__(self, cache_dir: pathlib.Path):
+        self._cache_dir = cache_dir / "module-graph"
+        self._known: typing.Dict[pathlib.Path, _FileInfo] = {}
+
+        # Statistics for the last call to *load*
+        self.hit = False
+        self.rescanned = 0
+        self.untrusted = False
+        self.unsupported = False
+
+    def key(self, *parts: object) -> str:
+        """
+        Return the cache key for a scan of the current interpreter
+        configuration, *parts* describes the roots and options for
+        the scan.
+        """
+        h = hashlib.sha256()
+        for value in (
+            FORMAT_VERSION,
+            __version__,
+            modulegraph2.__version__,
+            sys.executable,
+            sys.version,
+            sys.flags.optimize,
+            sys.path,
+            os.getcwd(),
+            *parts,
+        ):
+            h.update(repr(value).encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path_for_key(self, key: str) -> pathlib.Path:
+        return self._cache_dir / f"{key}.pickle"
+
+    def load(self, key: str, graph: ModuleGraph) -> bool:
+        """
+        Update the empty *graph* from the cached graph for *key*,
+        rescanning nodes for source files that have changed.
+
+        Returns False when there is no usable cached graph, the
+        caller must scan the graph from scratch in that case.
+        """
+        self.hit = False
+        self.rescanned = 0
+        self.untrusted = False
+        self.unsupported = not _is_supported(graph)
+        if self.unsupported:
+            return False
+
+        path = self._path_for_key(key)
+        try:
+            with open(path, "rb") as stream:
+                if not _is_trusted(os.fstat(stream.fileno())):
+                    self.untrusted = True
+                    return False
+                entry = pickle.load(stream)
+        except Exception:
+            # Missing or unreadable entry, the latter
+            # includes entries that refer to classes that
+            # no longer exist.
+            return False
+
+        if not isinstance(entry, _CacheEntry):
+            return False
+
+        for dirpath, dir_info in entry.directories.items():
+            if _dir_changed(dirpath, dir_info):
+                return False
+
+        changed = []
+        for identifier, (filename, (mtime, size, digest)) in entry.files.items():
+            try:
+                st = filename.stat()
+            except OSError:
+                return False
+
+            if (st.st_mtime_ns, st.st_size) != (mtime, size):
+                try:
+                    new_digest = _file_hash(filename)
+                except OSError:
+                    return False
+
+                if new_digest != digest:
+                    changed.append(identifier)
+                    continue
+                mtime, size = st.st_mtime_ns, st.st_size
+
+            self._known[filename] = (mtime, size, digest)
+
+        graph.restore_scan_state(entry.state)
+        if changed:
+            graph.rescan(changed)
+            self.rescanned = len(changed)
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.hit = True
+        return True
+
+    def store(self, key: str, graph: ModuleGraph) -> None:
+        """
+        Store *graph* in the cache for *key*
+        """
+        if not _is_supported(graph):
+            return
+
+        files = {}
+        try:
+            for identifier, filename in _scanned_files(graph).items():
+                st = filename.stat()
+                known = self._known.get(filename)
+                if known is None or known[:2] != (st.st_mtime_ns, st.st_size):
+                    known = (st.st_mtime_ns, st.st_size, _file_hash(filename))
+                files[identifier] = (filename, known)
+
+        except OSError:
+            # A file changed during the build
+            return
+
+        path = self._path_for_key(key)
+        try:
+            # Create the directory first, the cache might
+            # be in a directory on sys.path.
+            path.parent.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            # Failing to update the cache is not fatal.
+            return
+
+        entry = _CacheEntry(
+            state=graph.scan_state(),
+            files=files,
+            directories={
+                dirpath: _dir_info(dirpath) for dirpath in _scanned_directories(graph)
+            },
+        )
+
+        try:
+            fd, tmpname = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        except OSError:
+            return
+
+        try:
+            with os.fdopen(fd, "wb") as stream:
+                _Pickler(stream, protocol=pickle.HIGHEST_PROTOCOL).dump(entry)
+            os.replace(tmpname, path)
+
+        except (OSError, pickle.PicklingError, TypeError):
+            # TypeError is raised for objects that cannot be
+            # pickled, such as some loaders.
+            with contextlib.suppress(OSError):
+                os.unlink(tmpname)
@@ -0,0 +1,459 @@
+"""
+Support for incremental bundle output.
+
+With incremental output the bundle is built in a staging directory,
+after which *sync_bundle* updates the output bundle to match the
+staging tree. Only files whose contents or mode differ are copied,
+files that are no longer part of the bundle are removed.
+
+The staging tree is kept between builds. *StagingTree* moves the
+tree of the previous build aside at the start of a build, and files
+that are copied into the bundle are moved back from that tree instead
+of copying them again when their source file has not changed since
+the previous build. This includes copies that are changed by later
+build steps, such as Mach-O files whose load commands are rewritten,
+as long as the inputs for those changes are the same (see
+*StagingTree.processed*).
+
+A manifest with the size, modification time and content hash of
+every file in the staging tree and the output bundle is stored next
+to the staging directory. This allows detecting that a file is
+unchanged without reading it.
+"""
+
+__all__ = ("StagingTree", "SyncResult", "stage_file", "sync_bundle")
+
+import dataclasses
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import stat
+import threading
+import typing
+
+from ._copyfile import copy_file
+from ._progress import Progress
+
+MANIFEST_VERSION = 2
+
+# Information about a file in the staging tree that was copied
+# from a source file: {"source": [path, size, mtime_ns, mode],
+# "sha256": digest of the copy}, and "inputs" when the copy
+# was processed by a later build step.
+_CopyInfo = typing.Dict[str, typing.Any]
+
+
+@dataclasses.dataclass
+class SyncResult:
+    """
+    Statistics for a *sync_bundle* call
+    """
+
+    written: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    bytes_written: int = 0
+    hashed: int = 0
+
+
+def _file_hash(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as stream:
+        while chunk := stream.read(1024 * 1024):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _load_manifest(path: pathlib.Path) -> typing.Dict[str, typing.Any]:
+    try:
+        with open(path) as stream:
+            data = json.load(stream)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+        return {}
+
+    files = data.get("files")
+    if not isinstance(files, dict):
+        return {}
+    return files
+
+
+def _save_manifest(path: pathlib.Path, files: typing.Dict[str, typing.Any]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as stream:
+        json.dump({"version": MANIFEST_VERSION, "files": files}, stream, indent=1)
+    os.replace(tmp, path)
+
+
+def _stat_key(st: os.stat_result) -> typing.List[int]:
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _scan_tree(
+    root: pathlib.Path,
+) -> typing.Tuple[typing.Dict[str, os.stat_result], typing.Set[str]]:
+    """
+    Return (files, directories) for the tree at *root*, with
+    paths relative to *root*. Symbolic links are reported as
+    files.
+    """
+    files: typing.Dict[str, os.stat_result] = {}
+    directories: typing.Set[str] = set()
+
+    if not root.is_dir():
+        return files, directories
+
+    todo = [""]
+    while todo:
+        current = todo.pop()
+        with os.scandir(root / current if current else root) as it:
+            for entry in it:
+                relpath = f"{current}/{entry.name}" if current else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    directories.add(relpath)
+                    todo.append(relpath)
+                else:
+                    files[relpath] = entry.stat(follow_symlinks=False)
+    return files, directories
+
+
+def _remove(path: pathlib.Path) -> None:
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+def _install(src: pathlib.Path, dst: pathlib.Path) -> None:
+    """
+    Copy *src* to *dst*, replacing *dst* when it exists. The
+    copy is written next to *dst* and atomically moved into place.
+    """
+    if dst.is_dir() and not dst.is_symlink():
+        shutil.rmtree(dst)
+
+    tmp = dst.with_name(f".{dst.name}.py2app-tmp")
+    try:
+        if src.is_symlink():
+            os.symlink(os.readlink(src), tmp)
+        else:
+            copy_file(src, tmp)
+            shutil.copymode(src, tmp)
+        os.replace(tmp, dst)
+
+    except BaseException:
+        if tmp.exists() or tmp.is_symlink():
+            tmp.unlink()
+        raise
+
+
+class StagingTree:
+    """
+    The staging tree for a bundle at *root*, with the manifest
+    for the tree at *manifest_path*.
+
+    *prepare* must be called before building the bundle, and
+    *finish* after updating the output using *sync_bundle*.
+
+    This class is used from multiple threads.
+    """
+
+    def __init__(self, root: pathlib.Path, manifest_path: pathlib.Path):
+        self.root = root
+        self.manifest_path = manifest_path
+        self._previous = root.with_name(f"{root.name}.previous")
+        self._manifest: typing.Dict[str, typing.Any] = {}
+        self._lock = threading.Lock()
+
+        # Files copied into the staging tree during this build
+        self.copies: typing.Dict[str, _CopyInfo] = {}
+
+        # Copies reused from the previous build, with the
+        # inputs used to process them in that build.
+        self._reused: typing.Dict[
+            str, typing.Optional[typing.Dict[str, typing.Any]]
+        ] = {}
+
+        # Statistics for *copy_file*
+        self.copied = 0
+        self.reused = 0
+
+    def prepare(self) -> None:
+        """
+        Move the staging tree of the previous build aside. The
+        caller creates a new staging tree.
+        """
+        if self._previous.exists():
+            # Left behind by a build that failed
+            shutil.rmtree(self._previous)
+
+        if self.root.is_dir():
+            os.rename(self.root, self._previous)
+
+        self._manifest = _load_manifest(self.manifest_path)
+
+    def finish(self) -> None:
+        """
+        Remove the files of the previous build that were
+        not reused.
+        """
+        if self._previous.exists():
+            shutil.rmtree(self._previous)
+
+    def _reuse(
+        self, relpath: str, source: typing.List[typing.Any], dst: pathlib.Path
+    ) -> typing.Optional[_CopyInfo]:
+        """
+        Move the copy of *source* from the previous build to *dst*,
+        return the information for the copy, or None when there is
+        no valid copy.
+        """
+        known = self._manifest.get(relpath)
+        if (
+            not isinstance(known, dict)
+            or not isinstance(known.get("source"), list)
+            or known["source"][:3] != source
+        ):
+            return None
+
+        previous = self._previous / relpath
+        try:
+            st = os.lstat(previous)
+        except OSError:
+            return None
+
+        if not stat.S_ISREG(st.st_mode) or _stat_key(st) != known.get("staged"):
+            return None
+
+        os.replace(previous, dst)
+
+        # Later build steps can have changed the mode, e.g.
+        # to make the bundle read-only.
+        os.chmod(dst, known["source"][3])
+        info = {"source": known["source"], "sha256": known["sha256"]}
+        if "inputs" in known:
+            info["inputs"] = known["inputs"]
+        with self._lock:
+            self._reused[relpath] = known.get("inputs")
+        return info
+
+    def copy_file(
+        self,
+        src: pathlib.Path,
+        dst: pathlib.Path,
+        copy_function: typing.Callable[[pathlib.Path, pathlib.Path], object] = (
+            copy_file
+        ),
+    ) -> None:
+        """
+        Copy *src* to *dst* in the staging tree using *copy_function*,
+        or reuse the copy from the previous build when *src* has not
+        changed since then.
+        """
+        if src.is_symlink() or not dst.is_relative_to(self.root):
+            copy_function(src, dst)
+            return
+
+        relpath = dst.relative_to(self.root).as_posix()
+        src_st = os.stat(src)
+        source: typing.List[typing.Any] = [
+            os.path.abspath(src),
+            src_st.st_size,
+            src_st.st_mtime_ns,
+        ]
+
+        info = self._reuse(relpath, source, dst)
+        if info is None:
+            copy_function(src, dst)
+            info = {
+                "source": source + [stat.S_IMODE(os.stat(dst).st_mode)],
+                "sha256": _file_hash(dst),
+            }
+            with self._lock:
+                self.copied += 1
+        else:
+            with self._lock:
+                self.reused += 1
+
+        with self._lock:
+            self.copies[relpath] = info
+
+    def _relpath(self, path: pathlib.Path) -> typing.Optional[str]:
+        if not path.is_relative_to(self.root):
+            return None
+        return path.relative_to(self.root).as_posix()
+
+    def reused_source(self, path: pathlib.Path) -> typing.Optional[pathlib.Path]:
+        """
+        Return the source for *path* when it is a copy reused from
+        the previous build, and None otherwise.
+
+        A reused copy can already be processed by later build
+        steps, use the source to get the original contents.
+        """
+        relpath = self._relpath(path)
+        if relpath is None or relpath not in self._reused:
+            return None
+        return pathlib.Path(self.copies[relpath]["source"][0])
+
+    def processed(
+        self, path: pathlib.Path, inputs: typing.Dict[str, typing.Any]
+    ) -> None:
+        """
+        Record that the copy at *path* will be processed using
+        *inputs*, which must be JSON serializable and contain all
+        information that affects the processed file.
+
+        A copy reused from the previous build that was processed
+        using different inputs is replaced by a new copy of its source.
+        Processing must leave a copy that is already processed using
+        the same inputs unchanged.
+        """
+        relpath = self._relpath(path)
+        if relpath is None or relpath not in self.copies:
+            return
+
+        with self._lock:
+            info = self.copies[relpath]
+            previous = self._reused.get(relpath)
+            if previous is not None and previous != inputs:
+                source = info["source"]
+                copy_file(pathlib.Path(source[0]), path)
+                os.chmod(path, source[3])
+                del self._reused[relpath]
+                info["sha256"] = _file_hash(path)
+                self.reused -= 1
+                self.copied += 1
+
+            info["inputs"] = inputs
+
+
+def stage_file(
+    src: pathlib.Path,
+    dst: pathlib.Path,
+    staging: typing.Optional[StagingTree],
+    copy_function: typing.Callable[[pathlib.Path, pathlib.Path], object] = copy_file,
+) -> None:
+    """
+    Copy *src* to *dst*, reusing the copy from the previous build
+    when building in *staging*.
+    """
+    if staging is None:
+        copy_function(src, dst)
+    else:
+        staging.copy_file(src, dst, copy_function)
+
+
+def sync_bundle(
+    staging: pathlib.Path,
+    output: pathlib.Path,
+    manifest_path: pathlib.Path,
+    progress: Progress,
+    copies: typing.Optional[typing.Dict[str, _CopyInfo]] = None,
+) -> SyncResult:
+    """
+    Update the bundle at *output* to match the bundle at *staging*.
+
+    Changed files are copied from *staging* into *output*, the
+    staging tree is not changed. *copies* describes the files that
+    were copied into the staging tree from a source file, see
+    *StagingTree.copies*.
+    """
+    result = SyncResult()
+    manifest = _load_manifest(manifest_path) if output.is_dir() else {}
+    new_manifest: typing.Dict[str, typing.Any] = {}
+
+    staged_files, staged_dirs = _scan_tree(staging)
+    output_files, output_dirs = _scan_tree(output)
+
+    # Remove files and directories that are no longer part of the bundle,
+    # deepest paths first.
+    for relpath in sorted(
+        (output_files.keys() - staged_files.keys()) | (output_dirs - staged_dirs),
+        reverse=True,
+    ):
+        target = output / relpath
+        if target.exists() or target.is_symlink():
+            _remove(target)
+            result.deleted += 1
+
+    for relpath in sorted(staged_dirs):
+        (output / relpath).mkdir(parents=True, exist_ok=True)
+
+    for relpath in progress.iter_task(
+        sorted(staged_files), "Update bundle output", lambda n: n
+    ):
+        src = staging / relpath
+        dst = output / relpath
+        src_st = staged_files[relpath]
+        dst_st = output_files.get(relpath)
+        known = manifest.get(relpath)
+        if not isinstance(known, dict):
+            known = {}
+
+        if stat.S_ISLNK(src_st.st_mode):
+            link = os.readlink(src)
+            new_manifest[relpath] = {"symlink": link}
+            if (
+                dst_st is not None
+                and stat.S_ISLNK(dst_st.st_mode)
+                and os.readlink(dst) == link
+            ):
+                result.unchanged += 1
+            else:
+                _install(src, dst)
+                result.written += 1
+            continue
+
+        # Files that haven't changed since the previous build
+        # are not read again.
+        if known.get("staged") == _stat_key(src_st) and "sha256" in known:
+            digest = known["sha256"]
+        else:
+            digest = _file_hash(src)
+            result.hashed += 1
+
+        entry: typing.Dict[str, typing.Any] = {
+            "sha256": digest,
+            "staged": _stat_key(src_st),
+        }
+
+        # Record the source of files that are an unchanged copy,
+        # or a copy processed using known inputs, those can be
+        # reused by the next build.
+        copy_info = copies.get(relpath) if copies is not None else None
+        if copy_info is not None:
+            if "inputs" in copy_info:
+                entry["source"] = copy_info["source"]
+                entry["inputs"] = copy_info["inputs"]
+            elif copy_info["sha256"] == digest:
+                entry["source"] = copy_info["source"]
+
+        new_manifest[relpath] = entry
+
+        if dst_st is not None and stat.S_ISREG(dst_st.st_mode):
+            if known.get("output") == _stat_key(dst_st) and "sha256" in known:
+                dst_digest = known["sha256"]
+            else:
+                dst_digest = _file_hash(dst)
+                result.hashed += 1
+
+            if dst_digest == digest:
+                if stat.S_IMODE(dst_st.st_mode) != stat.S_IMODE(src_st.st_mode):
+                    os.chmod(dst, stat.S_IMODE(src_st.st_mode))
+                entry["output"] = _stat_key(dst_st)
+                result.unchanged += 1
+                continue
+
+        _install(src, dst)
+        st = dst.stat()
+        entry["output"] = _stat_key(st)
+        result.written += 1
+        result.bytes_written += st.st_size
+
+    _save_manifest(manifest_path, new_manifest)
+    return result
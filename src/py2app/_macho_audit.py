@@ -10,8 +10,9 @@ import os
 import pathlib
 import typing
 
-from macholib import MachO, mach_o
-from macholib.util import is_platform_file
+from macholib import mach_o
+
+from ._machofiles import MachOFileTable
 
 
 def decode_deployment_target(value: int) -> str:
@@ -28,18 +29,22 @@ def decode_deployment_target(value: int) -> str:
     return f"{macro}.{minor}.{micro}"
 
 
-def macho_files(base: pathlib.Path) -> typing.Iterator[pathlib.Path]:
+def macho_files(
+    base: pathlib.Path, table: typing.Optional[MachOFileTable] = None
+) -> typing.Iterator[pathlib.Path]:
     """
     Yield Path objects for all MachO files in the filesystem
-    tree starting at *base*.
+    tree starting at *base*, using *table* to avoid checking
+    files that were seen before.
     """
+    if table is None:
+        table = MachOFileTable()
+
     for root, _, files in os.walk(str(base.resolve())):
         for fn in files:
             p = pathlib.Path(root) / fn
-            if p.is_symlink():
-                continue
             try:
-                if is_platform_file(str(p)):
+                if table.is_macho(p):
                     yield p
             except PermissionError:
                 continue
@@ -47,10 +52,15 @@ def macho_files(base: pathlib.Path) -> typing.Iterator[pathlib.Path]:
 
 def audit_macho_issues(
     bundle_path: pathlib.Path,
+    files: typing.Optional[MachOFileTable] = None,
 ) -> typing.Tuple[typing.Optional[str], typing.Optional[str], typing.List[str]]:
     """
     Returns (architecture, deployment_target, warnings)
 
+    *files* is used to find the Mach-O files in the bundle and
+    to look up their load commands, files that were parsed by
+    earlier phases of the build are not read again.
+
     * ``architecture`` is the the common architecture(set) for files in the bundle
        (``univeral2``, ``x86_64`` or ``arm64``), and is None when there are two
        single-architecture files for different architectures.
@@ -79,28 +89,23 @@ def audit_macho_issues(
     # Default @rpath for stub executables:
     base_rpath = {bundle_path / "Contents/Frameworks"}
 
-    for macho_path in macho_files(bundle_path):
-        m = MachO.MachO(str(macho_path))
+    if files is None:
+        files = MachOFileTable()
+
+    for macho_path in macho_files(bundle_path, files):
+        model = files.model(macho_path)
         cur_archs = set()
-        for hdr in m.headers:
-            hdr_arch = mach_o.CPU_TYPE_NAMES[hdr.header.cputype].lower()
+        for hdr in model.headers:
+            hdr_arch = hdr.arch
             if hdr_arch not in {"x86_64", "arm64"}:
                 continue
             cur_archs.add(hdr_arch)
 
-            # Look for a version command to check the deployment target.
-            for cmd in hdr.commands:
-                if isinstance(cmd[1], mach_o.build_version_command):
-                    deployment_targets[hdr_arch] = max(
-                        cmd[1].minos, deployment_targets[hdr_arch]
-                    )
-                    break
-
-                elif isinstance(cmd[1], mach_o.version_min_command):
-                    deployment_targets[hdr_arch] = max(
-                        cmd[1].version, deployment_targets[hdr_arch]
-                    )
-                    break
+            # Check the deployment target.
+            if hdr.deployment_target is not None:
+                deployment_targets[hdr_arch] = max(
+                    hdr.deployment_target, deployment_targets[hdr_arch]
+                )
             else:
                 # The header does not have a load command with
                 # a deployment version.
@@ -113,89 +118,82 @@ def audit_macho_issues(
 
             # Calculate the RPATH search path for the current file.
             rpath = set(base_rpath)
-            for cmd in hdr.commands:
-                if isinstance(cmd[1], mach_o.rpath_command):
-                    path = MachO.lc_str_value(cmd[1].path, cmd).decode()
-                    if path.startswith("/"):
-                        warnings.append(
-                            f"{str(macho_path)!r} has RPATH entry with absolute path: {path}"
-                        )
-                        continue
+            for path in hdr.rpaths:
+                if path.startswith("/"):
+                    warnings.append(
+                        f"{str(macho_path)!r} has RPATH entry with absolute path: {path}"
+                    )
+                    continue
 
-                    elif path.startswith("@loader_path/"):
-                        _, _, relpath = path.partition("/")
+                elif path.startswith("@loader_path/"):
+                    _, _, relpath = path.partition("/")
 
-                        rpath.add(macho_path.parent / relpath)
+                    rpath.add(macho_path.parent / relpath)
 
-                    elif path.startswith("@rpath/"):
-                        warnings.append(
-                            f"{str(macho_path)!r} has RPATH entry referring to @rpath: {path}"
-                        )
-                        continue
+                elif path.startswith("@rpath/"):
+                    warnings.append(
+                        f"{str(macho_path)!r} has RPATH entry referring to @rpath: {path}"
+                    )
+                    continue
 
-                    elif path.startswith("@executable_path/"):
-                        dirpath = bundle_path / "Contents/MacOS"
-                        _, _, relpath = path.partition("/")
+                elif path.startswith("@executable_path/"):
+                    dirpath = bundle_path / "Contents/MacOS"
+                    _, _, relpath = path.partition("/")
 
-                        rpath.add(macho_path.parent / relpath)
+                    rpath.add(macho_path.parent / relpath)
 
-                    else:
-                        warnings.append(
-                            f"{str(macho_path)!r}: Unhandled special path in link command {mach_o.LC_NAMES[cmd[0].cmd]}: {path}"
-                        )
+                else:
+                    warnings.append(
+                        f"{str(macho_path)!r}: Unhandled special path in link command {mach_o.LC_NAMES[mach_o.LC_RPATH]}: {path}"
+                    )
 
             # Validate commands that load a shared library or framework
-            for cmd in hdr.commands:
+            for lc, name in hdr.dylibs:
                 if (
-                    isinstance(cmd[1], mach_o.dylib_command)
-                    and cmd[0].cmd != mach_o.LC_ID_DYLIB
+                    not name.startswith("/usr/lib")
+                    and not name.startswith("/System/Library/Frameworks")
+                    and not name.startswith("@")
                 ):
-                    name = MachO.lc_str_value(cmd[1].name, cmd).decode()
-                    if (
-                        not name.startswith("/usr/lib")
-                        and not name.startswith("/System/Library/Frameworks")
-                        and not name.startswith("@")
-                    ):
+                    warnings.append(
+                        f"{str(macho_path)!r} links to library {name!r} outside of system locations"
+                    )
+                elif name.startswith("@loader_path/"):
+                    _, _, relpath = name.partition("/")
+
+                    if not (macho_path.parent / relpath).exists():
                         warnings.append(
-                            f"{str(macho_path)!r} links to library {name!r} outside of system locations"
+                            f"{str(macho_path)!r} links to library {name!r} that "
+                            f"doesn't exist at {str(macho_path.parent / relpath)!r}"
                         )
-                    elif name.startswith("@loader_path/"):
-                        _, _, relpath = name.partition("/")
-
-                        if not (macho_path.parent / relpath).exists():
-                            warnings.append(
-                                f"{str(macho_path)!r} links to library {name!r} that "
-                                f"doesn't exist at {str(macho_path.parent / relpath)!r}"
-                            )
-
-                    elif name.startswith("@rpath/"):
-                        _, _, relpath = name.partition("/")
-
-                        for rp in rpath:
-                            if (rp / relpath).exists():
-                                break
-                        else:
-                            warnings.append(
-                                f"{str(macho_path)!r} links to library {name!r} that "
-                                f"doesn't exist on rpath: {', '.join(map(str, sorted(rpath)))}"
-                            )
-
-                    elif name.startswith("@executable_path/"):
-                        # These shouldn't be present in practice as that would
-                        # break when using virtual environments.
-
-                        dirpath = bundle_path / "Contents/MacOS"
-                        _, _, relpath = name.partition("/")
-                        if not os.path.exists(dirpath / relpath):
-                            warnings.append(
-                                f"{str(macho_path)!r} uses {name!r} to link to non-existing {str(dirpath / relpath)!r}"
-                            )
-
-                    elif name.startswith("@"):
+
+                elif name.startswith("@rpath/"):
+                    _, _, relpath = name.partition("/")
+
+                    for rp in rpath:
+                        if (rp / relpath).exists():
+                            break
+                    else:
                         warnings.append(
-                            f"{str(macho_path)!r}: Unhandled special path in link command {mach_o.LC_NAMES[cmd[0].cmd]}: {name}"
+                            f"{str(macho_path)!r} links to library {name!r} that "
+                            f"doesn't exist on rpath: {', '.join(map(str, sorted(rpath)))}"
                         )
 
+                elif name.startswith("@executable_path/"):
+                    # These shouldn't be present in practice as that would
+                    # break when using virtual environments.
+
+                    dirpath = bundle_path / "Contents/MacOS"
+                    _, _, relpath = name.partition("/")
+                    if not os.path.exists(dirpath / relpath):
+                        warnings.append(
+                            f"{str(macho_path)!r} uses {name!r} to link to non-existing {str(dirpath / relpath)!r}"
+                        )
+
+                elif name.startswith("@"):
+                    warnings.append(
+                        f"{str(macho_path)!r}: Unhandled special path in link command {mach_o.LC_NAMES[lc]}: {name}"
+                    )
+
         if "x86_64" in cur_archs and "arm64" in cur_archs:
             continue
         elif "x86_64" in cur_archs:
@@ -0,0 +1,394 @@
+"""
+Finding and describing Mach-O files in a bundle.
+
+Checking if a file is a Mach-O file requires opening the file
+and reading its header, and parsing the load commands requires
+reading all of them. A build looks at the Mach-O files in the
+bundle several times: when copying dependencies, when auditing
+the result and when signing the bundle.
+
+*MachOFileTable* remembers for every file it has seen during
+a build if it is a Mach-O file and the facts from its load
+commands that later phases need (*MachOModel*). Entries are
+keyed on the inode of the file and are only valid as long as
+the modification time and size are unchanged. Phases that rewrite
+a file update the entry from the in-memory ``MachO`` object.
+
+Building a ``macholib.MachO.MachO`` object for a file is fairly
+expensive, and is only needed to rewrite a file. *scan_macho*
+extracts the facts for the model directly from a memory mapping
+of the file.
+"""
+
+__all__ = ("MachOFileTable", "MachOHeader", "MachOModel", "scan_macho")
+
+import dataclasses
+import mmap
+import os
+import pathlib
+import stat
+import struct
+import typing
+
+import macholib.mach_o
+import macholib.MachO
+from macholib.util import is_platform_file
+
+
+def _arch_name(cputype: int) -> str:
+    return macholib.mach_o.CPU_TYPE_NAMES.get(cputype, str(cputype)).lower()
+
+
+@dataclasses.dataclass(frozen=True)
+class MachOHeader:
+    """
+    The facts about one architecture in a Mach-O file.
+
+    *deployment_target* is the encoded version from the first
+    LC_BUILD_VERSION or LC_VERSION_MIN_* command, *rpaths* are
+    the LC_RPATH entries and *dylibs* the (load command, path)
+    for commands that load a library.
+    """
+
+    arch: str
+    deployment_target: typing.Optional[int]
+    install_name: typing.Optional[str]
+    rpaths: typing.Tuple[str, ...]
+    dylibs: typing.Tuple[typing.Tuple[int, str], ...]
+
+
+@dataclasses.dataclass(frozen=True)
+class MachOModel:
+    """
+    The facts about a Mach-O file that are used by
+    the build phases, one entry per architecture.
+    """
+
+    headers: typing.Tuple[MachOHeader, ...]
+
+    @classmethod
+    def from_macho(cls, macho: macholib.MachO.MachO) -> "MachOModel":
+        """
+        Return the model for a parsed Mach-O file
+        """
+        headers = []
+        for hdr in macho.headers:
+            deployment_target = None
+            install_name = None
+            rpaths = []
+            dylibs = []
+            for lc, cmd, data in hdr.commands:
+                if isinstance(cmd, macholib.mach_o.build_version_command):
+                    if deployment_target is None:
+                        deployment_target = cmd.minos
+
+                elif isinstance(cmd, macholib.mach_o.version_min_command):
+                    if deployment_target is None:
+                        deployment_target = cmd.version
+
+                elif isinstance(cmd, macholib.mach_o.rpath_command):
+                    rpaths.append(
+                        macholib.MachO.lc_str_value(cmd.path, (lc, cmd, data)).decode()
+                    )
+
+                elif lc.cmd == macholib.mach_o.LC_ID_DYLIB:
+                    install_name = macholib.MachO.lc_str_value(
+                        cmd.name, (lc, cmd, data)
+                    ).decode()
+
+                elif lc.cmd in _DYLIB_COMMANDS:
+                    dylibs.append(
+                        (
+                            lc.cmd,
+                            macholib.MachO.lc_str_value(
+                                cmd.name, (lc, cmd, data)
+                            ).decode(),
+                        )
+                    )
+
+            headers.append(
+                MachOHeader(
+                    arch=_arch_name(hdr.header.cputype),
+                    deployment_target=deployment_target,
+                    install_name=install_name,
+                    rpaths=tuple(rpaths),
+                    dylibs=tuple(dylibs),
+                )
+            )
+        return cls(tuple(headers))
+
+
+_Buffer = typing.Union[bytes, mmap.mmap]
+
+_FAT_HEADER = struct.Struct(">II")
+_FAT_ARCH = struct.Struct(">iiIII")
+_FAT_ARCH_64 = struct.Struct(">iiQQII")
+
+# Load commands that refer to a library, these are the
+# commands that macholib rewrites (``macholib.MachO._RELOCATABLE``).
+# The name is the first field for all of these commands.
+_DYLIB_COMMANDS = frozenset(
+    {
+        macholib.mach_o.LC_LOAD_DYLIB,
+        macholib.mach_o.LC_LOAD_UPWARD_DYLIB,
+        macholib.mach_o.LC_LOAD_WEAK_DYLIB,
+        macholib.mach_o.LC_PREBOUND_DYLIB,
+        macholib.mach_o.LC_REEXPORT_DYLIB,
+    }
+)
+
+# Load commands using *version_min_command*
+_VERSION_MIN_COMMANDS = frozenset(
+    {
+        macholib.mach_o.LC_VERSION_MIN_MACOSX,
+        macholib.mach_o.LC_VERSION_MIN_IPHONEOS,
+        macholib.mach_o.LC_VERSION_MIN_TVOS,
+        macholib.mach_o.LC_VERSION_MIN_WATCHOS,
+    }
+)
+
+
+def _lc_str(data: _Buffer, start: int, end: int) -> str:
+    """
+    Return the NUL terminated string in *data* at *start*,
+    which is located in the load command ending at *end*.
+    """
+    nul = data.find(b"\0", start, end)
+    if nul == -1:
+        nul = end
+    return data[start:nul].decode()
+
+
+def _scan_header(data: _Buffer, offset: int, size: int) -> MachOHeader:
+    """
+    Return the model for the Mach-O header at *offset* in *data*
+    """
+    (magic,) = struct.unpack_from("<I", data, offset)
+    if magic == macholib.mach_o.MH_MAGIC_64:
+        endian, header_size = "<", 32
+    elif magic == macholib.mach_o.MH_CIGAM_64:
+        endian, header_size = ">", 32
+    elif magic == macholib.mach_o.MH_MAGIC:
+        endian, header_size = "<", 28
+    elif magic == macholib.mach_o.MH_CIGAM:
+        endian, header_size = ">", 28
+    else:
+        raise ValueError(f"Unknown Mach-O header: 0x{magic:08x}")
+
+    _, cputype, _, _, ncmds, sizeofcmds = struct.unpack_from(
+        f"{endian}IiiIII", data, offset
+    )
+
+    deployment_target = None
+    install_name = None
+    rpaths = []
+    dylibs = []
+
+    pos = offset + header_size
+    end = pos + sizeofcmds
+    if end > offset + size:
+        raise ValueError("Load commands extend beyond the end of the file")
+
+    for _ in range(ncmds):
+        cmd, cmdsize = struct.unpack_from(f"{endian}II", data, pos)
+        if cmdsize < 8 or pos + cmdsize > end:
+            raise ValueError(f"Invalid load command size {cmdsize}")
+
+        if cmd == macholib.mach_o.LC_ID_DYLIB or cmd in _DYLIB_COMMANDS:
+            (name_offset,) = struct.unpack_from(f"{endian}I", data, pos + 8)
+            name = _lc_str(data, pos + name_offset, pos + cmdsize)
+            if cmd == macholib.mach_o.LC_ID_DYLIB:
+                install_name = name
+            else:
+                dylibs.append((cmd, name))
+
+        elif cmd == macholib.mach_o.LC_RPATH:
+            (path_offset,) = struct.unpack_from(f"{endian}I", data, pos + 8)
+            rpaths.append(_lc_str(data, pos + path_offset, pos + cmdsize))
+
+        elif cmd == macholib.mach_o.LC_BUILD_VERSION:
+            if deployment_target is None:
+                (deployment_target,) = struct.unpack_from(f"{endian}I", data, pos + 12)
+
+        elif cmd in _VERSION_MIN_COMMANDS:
+            if deployment_target is None:
+                (deployment_target,) = struct.unpack_from(f"{endian}I", data, pos + 8)
+
+        pos += cmdsize
+
+    return MachOHeader(
+        arch=_arch_name(cputype),
+        deployment_target=deployment_target,
+        install_name=install_name,
+        rpaths=tuple(rpaths),
+        dylibs=tuple(dylibs),
+    )
+
+
+def _scan(data: _Buffer) -> MachOModel:
+    (magic, nfat_arch) = _FAT_HEADER.unpack_from(data, 0)
+    if magic == macholib.mach_o.FAT_MAGIC:
+        slices = [
+            _FAT_ARCH.unpack_from(data, _FAT_HEADER.size + idx * _FAT_ARCH.size)[2:4]
+            for idx in range(nfat_arch)
+        ]
+    elif magic == macholib.mach_o.FAT_MAGIC_64:
+        slices = [
+            _FAT_ARCH_64.unpack_from(data, _FAT_HEADER.size + idx * _FAT_ARCH_64.size)[
+                2:4
+            ]
+            for idx in range(nfat_arch)
+        ]
+    else:
+        slices = [(0, len(data))]
+
+    return MachOModel(
+        tuple(_scan_header(data, offset, size) for offset, size in slices)
+    )
+
+
+def scan_macho(path: typing.Union[os.PathLike[str], str]) -> MachOModel:
+    """
+    Return the model for the Mach-O file at *path*.
+
+    This reads the load commands from a memory mapping of the
+    file and is a lot cheaper than ``MachOModel.from_macho``
+    for a ``MachO`` object, but the result is the same.
+    Raises ValueError when the file is not a valid Mach-O file.
+    """
+    with open(path, "rb") as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            try:
+                return _scan(data)
+            except struct.error as exc:
+                raise ValueError(f"{os.fspath(path)!r} is truncated") from exc
+
+
+@dataclasses.dataclass
+class _Entry:
+    mtime_ns: int
+    size: int
+    is_macho: bool
+    model: typing.Optional[MachOModel] = None
+
+
+class MachOFileTable:
+    """
+    Memoized information about Mach-O files, shared between
+    the phases of a build.
+    """
+
+    def __init__(self) -> None:
+        # Mapping from (st_dev, st_ino) to the information for the file
+        self._table: typing.Dict[typing.Tuple[int, int], _Entry] = {}
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.scanned = 0
+        self.parsed = 0
+
+    def _entry(
+        self, path: typing.Union[os.PathLike[str], str], st: os.stat_result
+    ) -> _Entry:
+        key = (st.st_dev, st.st_ino)
+        entry = self._table.get(key)
+        if entry is not None and (entry.mtime_ns, entry.size) == (
+            st.st_mtime_ns,
+            st.st_size,
+        ):
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        # A Mach-O file starts with a 4 byte magic number.
+        entry = _Entry(
+            st.st_mtime_ns,
+            st.st_size,
+            st.st_size >= 4 and is_platform_file(os.fspath(path)),
+        )
+        self._table[key] = entry
+        return entry
+
+    def is_macho(
+        self,
+        path: typing.Union[os.PathLike[str], str],
+        st: typing.Optional[os.stat_result] = None,
+    ) -> bool:
+        """
+        Return True if *path* is a Mach-O file, symbolic links
+        are never Mach-O files. *st* is the result of ``os.lstat``
+        for *path* when the caller already has it.
+        """
+        if st is None:
+            try:
+                st = os.lstat(path)
+            except FileNotFoundError:
+                return False
+
+        if not stat.S_ISREG(st.st_mode):
+            return False
+
+        return self._entry(path, st).is_macho
+
+    def iter_files(
+        self, root: typing.Union[os.PathLike[str], str]
+    ) -> typing.Iterator[pathlib.Path]:
+        """
+        Yield all Mach-O files in the tree starting at *root*,
+        ignoring symbolic links.
+        """
+        for dirpath, _dirs, files in os.walk(root):
+            for fn in files:
+                path = pathlib.Path(dirpath) / fn
+                try:
+                    st = os.lstat(path)
+                except FileNotFoundError:
+                    continue
+                if self.is_macho(path, st):
+                    yield path
+
+    def parse(self, path: typing.Union[os.PathLike[str], str]) -> macholib.MachO.MachO:
+        """
+        Parse the Mach-O file at *path*, and remember its model.
+
+        Use this instead of *model* when the file will be rewritten.
+        """
+        macho = macholib.MachO.MachO(os.fspath(path))
+        self.parsed += 1
+        self.update(path, macho)
+        return macho
+
+    def model(self, path: typing.Union[os.PathLike[str], str]) -> MachOModel:
+        """
+        Return the model for the Mach-O file at *path*, scanning
+        the file when it changed since it was last seen.
+        """
+        entry = self._entry(path, os.stat(path))
+        if entry.model is None:
+            entry.model = scan_macho(path)
+            self.scanned += 1
+        return entry.model
+
+    def update(
+        self, path: typing.Union[os.PathLike[str], str], macho: macholib.MachO.MachO
+    ) -> None:
+        """
+        Update the entry for *path* from *macho*, which must be
+        the current contents of the file. Phases that rewrite a
+        Mach-O file call this after writing the file.
+        """
+        self.store(path, MachOModel.from_macho(macho))
+
+    def store(
+        self, path: typing.Union[os.PathLike[str], str], model: MachOModel
+    ) -> None:
+        """
+        Set the model for *path*, which must describe the current
+        contents of the file. This is used when the file was
+        rewritten in another process.
+        """
+        st = os.stat(path)
+        self._table[(st.st_dev, st.st_ino)] = _Entry(
+            st.st_mtime_ns, st.st_size, True, model
+        )
@@ -3,7 +3,10 @@ Wrapper around class:`modulegraph2.ModuleGraph` with additional
 functionality useful for py2app.
 """
 
+import ast
 import contextlib
+import copy
+import dataclasses
 import importlib.resources
 import io
 import os
@@ -14,6 +17,7 @@ from modulegraph2 import (
     AliasNode,
     BaseNode,
     BuiltinModule,
+    DependencyInfo,
     ExcludedModule,
     ExtensionModule,
     FrozenModule,
@@ -23,16 +27,27 @@ from modulegraph2 import (
     Package,
     PyPIDistribution,
     Script,
+    SourceModule,
+    VirtualNode,
 )
+from packaging.utils import canonicalize_name
 
 from ._config import Resource
+from ._dunderfile import REWRITABLE, UNSAFE, FileUse, file_uses
+from ._pruning import Target, dead_imports, may_have_guards
 
 ATTR_ZIPSAFE = "py2app.zipsafe"
+ATTR_ZIPUNSAFE_REASON = "py2app.zipunsafe_reason"
+ATTR_FILE_USES = "py2app.file_uses"
+ATTR_REWRITE_FILE = "py2app.rewrite_file"
 ATTR_BOOTSTRAP = "py2app.bootstrap"
 ATTR_IGNORE_RESOURCES = "py2app.ignore_resources"
 ATTR_RESOURCES = "py2app.resources"
 ATTR_EXPECTED_MISSING = "py2app.expected_missing"
 
+# Edge attributes for explicit imports (for example by recipes)
+EXPLICIT_DEPENDENCY = DependencyInfo(False, True, False, None)
+
 
 def load_bootstrap(bootstrap: typing.Union[str, io.StringIO]) -> str:
     """
@@ -50,12 +65,63 @@ def load_bootstrap(bootstrap: typing.Union[str, io.StringIO]) -> str:
         )
 
 
+@dataclasses.dataclass
+class PruneResult:
+    """
+    Statistics for a *ModuleGraph.prune_dead_imports* call
+    """
+
+    edges: int = 0
+    nodes: int = 0
+    bytes: int = 0
+
+
+def _node_size(node: typing.Union[BaseNode, PyPIDistribution]) -> int:
+    """
+    Return the size of the code file for *node*, or 0
+    """
+    if isinstance(node, Package):
+        node = node.init_module
+    if not isinstance(node, BaseNode) or node.filename is None:
+        return 0
+    try:
+        return node.filename.stat().st_size if node.filename.is_file() else 0
+    except OSError:
+        return 0
+
+
+def _copy_node(node: typing.Any) -> typing.Any:
+    """
+    Return a copy of the module node *node* with its own
+    extension attributes, other attributes are shared with
+    *node*. Distributions are not copied.
+    """
+    if not isinstance(node, BaseNode):
+        return node
+
+    result = copy.copy(node)
+    result.extension_attributes = dict(node.extension_attributes)
+    if isinstance(result, Package):
+        result.init_module = _copy_node(result.init_module)
+    return result
+
+
+def _root_name(identifier: str) -> str:
+    """
+    Return the name of the toplevel package for *identifier*
+    """
+    return identifier.partition(".")[0]
+
+
 class _ChangeTracker:
-    __slots__ = ("updated",)
+    __slots__ = ("updated", "added")
 
     def __init__(self) -> None:
         self.updated = False
 
+        # Identifiers of nodes added to the graph
+        self.added: typing.Set[str] = set()
+
 
 class ModuleGraph(modulegraph2.ModuleGraph):
     """
@@ -74,12 +140,23 @@ class ModuleGraph(modulegraph2.ModuleGraph):
             use_stdlib_implies=use_stdlib_implies, use_builtin_hooks=use_builtin_hooks
         )
         self.__tracked_changes: typing.List[_ChangeTracker] = []
+        self.__initial_lazy_nodes: typing.Dict[str, typing.Any] = {}
+
+        # Index of the distributions used by nodes in the graph, using
+        # the canonical name of the distribution as the key. The value
+        # is the distribution and the number of nodes using it.
+        self.__distributions: typing.Dict[str, typing.Tuple[PyPIDistribution, int]] = {}
+
+        # Cache for *__zipunsafe_table*, None when it must be recomputed.
+        self.__zipunsafe: typing.Optional[typing.Dict[str, typing.Dict[str, str]]] = (
+            None
+        )
 
     @contextlib.contextmanager
     def tracked_changes(self) -> typing.Iterator[_ChangeTracker]:
         """
         Contextmanager for detecting if the graph was updated by adding
-        nodes or edges to the graph.
+        nodes or edges to the graph, and which nodes were added.
         """
         # XXX: This currently assumes code uses the modulegraph2 API and
         #      does not add nodes or edges through the lower-level
@@ -100,6 +177,109 @@ class ModuleGraph(modulegraph2.ModuleGraph):
         for tracker in self.__tracked_changes:
             tracker.updated = True
 
+    def add_node(self, node: typing.Union[BaseNode, PyPIDistribution]) -> None:
+        super().add_node(node)
+        self.__index_node(node, 1)
+        self.__zipunsafe = None
+        for tracker in self.__tracked_changes:
+            tracker.added.add(node.identifier)
+
+    def remove_node(self, node: typing.Union[str, BaseNode, PyPIDistribution]) -> None:
+        value = self.find_node(node)
+        super().remove_node(node)
+        self.__zipunsafe = None
+        if value is not None:
+            self.__index_node(value, -1)
+
+    # Changes to the edges or roots of the graph can change which
+    # nodes are reachable, and hence which packages are zipsafe.
+
+    def add_edge(
+        self,
+        source: typing.Union[str, BaseNode, PyPIDistribution],
+        destination: typing.Union[str, BaseNode, PyPIDistribution],
+        edge_attributes: DependencyInfo,
+    ) -> None:
+        super().add_edge(source, destination, edge_attributes)
+        self.__zipunsafe = None
+
+    def remove_edge(
+        self,
+        source: typing.Union[str, BaseNode, PyPIDistribution],
+        destination: typing.Union[str, BaseNode, PyPIDistribution],
+        edge_attributes: DependencyInfo,
+    ) -> None:
+        super().remove_edge(source, destination, edge_attributes)
+        self.__zipunsafe = None
+
+    def remove_all_edges(
+        self,
+        source: typing.Union[str, BaseNode, PyPIDistribution],
+        destination: typing.Union[str, BaseNode, PyPIDistribution],
+    ) -> None:
+        super().remove_all_edges(source, destination)
+        self.__zipunsafe = None
+
+    def add_root(self, node: typing.Union[str, BaseNode, PyPIDistribution]) -> None:
+        super().add_root(node)
+        self.__zipunsafe = None
+
+    def remove_root(self, node: typing.Union[str, BaseNode, PyPIDistribution]) -> None:
+        super().remove_root(node)
+        self.__zipunsafe = None
+
+    def __index_node(
+        self, node: typing.Union[BaseNode, PyPIDistribution], delta: int
+    ) -> None:
+        """
+        Update the distribution index for adding (*delta* is 1) or
+        removing (*delta* is -1) *node*.
+        """
+        if isinstance(node, PyPIDistribution) or node.distribution is None:
+            return
+
+        key = canonicalize_name(node.distribution.name)
+        distribution, count = self.__distributions.get(key, (node.distribution, 0))
+        if count + delta > 0:
+            self.__distributions[key] = (distribution, count + delta)
+        else:
+            self.__distributions.pop(key, None)
+
+    def find_distribution(self, name: str) -> typing.Optional[PyPIDistribution]:
+        """
+        Return the distribution named *name* if it is used by
+        a node in the graph, and None otherwise.
+
+        Unlike *distributions* this also reports distributions that
+        are only used by nodes that are not reachable from a graph root.
+        """
+        try:
+            return self.__distributions[canonicalize_name(name)][0]
+        except KeyError:
+            return None
+
+    def iter_graph(
+        self,
+        *,
+        node: typing.Union[str, BaseNode, PyPIDistribution, None] = None,
+        _visited: typing.Optional[typing.Set[str]] = None,
+    ) -> typing.Iterator[typing.Union[BaseNode, PyPIDistribution]]:
+        """
+        Yield all nodes in the graph reachable from *node*
+        or any of the graph roots.
+
+        Unlike the base class the graph roots are visited in
+        a stable order, which results in reproducible bundle
+        output.
+        """
+        if node is not None:
+            yield from super().iter_graph(node=node, _visited=_visited)
+            return
+
+        visited: typing.Set[str] = set() if _visited is None else _visited
+        for root in sorted(self._roots):
+            yield from super().iter_graph(node=root, _visited=visited)
+
     def add_module(self, module_name: str) -> BaseNode:
         node = self.find_node(module_name)
         if node is not None:
@@ -136,11 +316,14 @@ class ModuleGraph(modulegraph2.ModuleGraph):
         if node is not None:
             assert isinstance(node, BaseNode)
             try:
-                self.edge_data(importing_module, node)
+                edges = self.edge_data(importing_module, node)
             except KeyError:
                 pass
 
             else:
+                # Make sure the edge is not optional, an explicit import
+                # should never be pruned by *prune_dead_imports*.
+                edges.add(EXPLICIT_DEPENDENCY)
                 return node
 
         self.__set_updated()
@@ -250,11 +433,136 @@ class ModuleGraph(modulegraph2.ModuleGraph):
 
         return None
 
-    def mark_zipunsafe(self, node: typing.Union[BaseNode, PyPIDistribution]) -> None:
+    def mark_zipunsafe(
+        self,
+        node: typing.Union[BaseNode, PyPIDistribution],
+        reason: typing.Optional[str] = None,
+    ) -> None:
         """
-        Mark *node* as unsafe to be executed from a zip archive
+        Mark *node* as unsafe to be executed from a zip archive,
+        *reason* explains why and is shown in *zipunsafe_report*.
         """
+        reason = reason or "marked as zip-unsafe"
         node.extension_attributes[ATTR_ZIPSAFE] = False
+        node.extension_attributes[ATTR_ZIPUNSAFE_REASON] = reason
+
+        if self.__zipunsafe is not None:
+            self.__zipunsafe.setdefault(_root_name(node.identifier), {})[
+                node.identifier
+            ] = reason
+
+    def file_uses(
+        self, node: typing.Union[BaseNode, PyPIDistribution]
+    ) -> typing.Optional[typing.List[FileUse]]:
+        """
+        Return the uses of ``__file__`` in the code for *node*,
+        or None when they cannot be determined because the source
+        code is not available.
+        """
+        if isinstance(node, Package):
+            node = node.init_module
+
+        if not isinstance(node, Module) or not node.uses_dunder_file:
+            return []
+
+        try:
+            return node.extension_attributes[ATTR_FILE_USES]
+        except KeyError:
+            pass
+
+        uses = None
+        if isinstance(node, SourceModule) and node.filename is not None:
+            try:
+                tree = ast.parse(node.filename.read_bytes(), str(node.filename))
+            except (OSError, SyntaxError, ValueError):
+                pass
+            else:
+                uses = file_uses(tree)
+
+        node.extension_attributes[ATTR_FILE_USES] = uses
+        return uses
+
+    def rewrite_file_uses(self, node: typing.Union[BaseNode, PyPIDistribution]) -> None:
+        """
+        Rewrite the uses of ``__file__`` in *node* that access package
+        data using ``pathlib.Path(__file__).parent`` to use
+        ``importlib.resources.files`` when the node is compiled.
+
+        This has no effect on the zip safety of *node* when it has
+        uses of ``__file__`` that cannot be rewritten.
+        """
+        source = node.init_module if isinstance(node, Package) else node
+        if not isinstance(source, BaseNode) or source.extension_attributes.get(
+            ATTR_REWRITE_FILE, False
+        ):
+            return
+
+        source.extension_attributes[ATTR_REWRITE_FILE] = True
+        self.import_module(source, "importlib.resources")
+        self.__zipunsafe = None
+
+    def __zipunsafe_reason(
+        self, node: typing.Union[BaseNode, PyPIDistribution]
+    ) -> typing.Optional[str]:
+        """
+        Return why *node* itself cannot be executed from a zip
+        archive, or None when it can. This does not look at other
+        modules in the same package.
+        """
+        if not isinstance(node, (Module, Package, NamespacePackage)):
+            return None
+
+        for source in (
+            (node, node.init_module) if isinstance(node, Package) else (node,)
+        ):
+            value = source.extension_attributes.get(ATTR_ZIPSAFE, None)
+            if value is not None:
+                assert isinstance(value, bool)
+                return (
+                    None
+                    if value
+                    else source.extension_attributes.get(
+                        ATTR_ZIPUNSAFE_REASON, "marked as zip-unsafe"
+                    )
+                )
+
+        uses = self.file_uses(node)
+        if uses is None:
+            return "uses __file__"
+
+        source = node.init_module if isinstance(node, Package) else node
+        rewritten = source.extension_attributes.get(ATTR_REWRITE_FILE, False)
+        unsafe = [
+            use
+            for use in uses
+            if use.kind == UNSAFE or (use.kind == REWRITABLE and not rewritten)
+        ]
+        if unsafe:
+            return "uses __file__: " + "; ".join(
+                f"line {use.lineno}: {use.code}" for use in unsafe
+            )
+
+        return None
+
+    def __zipunsafe_table(self) -> typing.Dict[str, typing.Dict[str, str]]:
+        """
+        Return the reasons nodes reachable from the graph roots are
+        not zipsafe, as a mapping from toplevel package name to a
+        mapping from node identifier to the reason.
+
+        The table is computed in a single pass over the graph and is
+        kept until nodes are added to or removed from the graph,
+        *mark_zipunsafe* updates the table in place.
+        """
+        if self.__zipunsafe is None:
+            table: typing.Dict[str, typing.Dict[str, str]] = {}
+            for identifier in sorted(self.__reachable(self.__adjacency())):
+                reason = self.__zipunsafe_reason(self._nodes[identifier])
+                if reason is not None:
+                    table.setdefault(_root_name(identifier), {})[identifier] = reason
+            self.__zipunsafe = table
+
+        return self.__zipunsafe
 
     def is_zipsafe(self, node: typing.Union[BaseNode, PyPIDistribution]) -> bool:
         """
@@ -268,71 +576,310 @@ class ModuleGraph(modulegraph2.ModuleGraph):
         if not isinstance(node, (Module, Package, NamespacePackage)):
             return True
 
-        try:
-            value = node.extension_attributes[ATTR_ZIPSAFE]
-        except KeyError:
-            pass
-        else:
+        value = node.extension_attributes.get(ATTR_ZIPSAFE, None)
+        if value is not None:
             assert isinstance(value, bool)
             return value
 
-        if isinstance(node, Module) and node.uses_dunder_file:
+        if self.__zipunsafe_reason(node) is not None:
             return False
 
-        elif isinstance(node, Package):
-            if ATTR_ZIPSAFE in node.init_module.extension_attributes:
-                if not node.init_module.extension_attributes[ATTR_ZIPSAFE]:
-                    node.extension_attributes[ATTR_ZIPSAFE] = False
-                    return False
-            elif (
-                isinstance(node.init_module, Module)
-                and node.init_module.uses_dunder_file
-            ):
-                node.extension_attributes[ATTR_ZIPSAFE] = False
-                return False
-
         #
         # Package, and all modules in them, are either zipsafe or
-        # note. We cannot have a package that is zipsafe but containing
-        # modules or subpackages that aren't.
+        # not. We cannot have a package that is zipsafe but containing
+        # modules or subpackages that aren't. An explicit mark on the
+        # toplevel package overrides the status of its contents.
         #
+        base = self.find_node(_root_name(node.identifier))
 
-        if "." in node.identifier:
-            # The name is in package, use the root package to start
-            # the scan.
-            base = self.find_node(node.identifier.partition(".")[0])
-
-            # Node is inside a package, the package itself should
-            # be part of the graph.
-            assert base is not None
-        elif isinstance(node, (Package, NamespacePackage)):
-            base = node
-        else:
-            # By default standalone modules are zipsafe
-            return True
-
-        base_identifier = f"{base.identifier}."
+        # Node is inside a package, the package itself should
+        # be part of the graph.
+        assert base is not None
 
-        # This function uses the 'py2app.zipsafe' attribute to cache
-        # the zipsafe status of a package.
-        try:
-            value = base.extension_attributes[ATTR_ZIPSAFE]
-        except KeyError:
-            pass
-        else:
+        value = base.extension_attributes.get(ATTR_ZIPSAFE, None)
+        if value is not None:
             assert isinstance(value, bool)
             return value
 
-        for subnode in self.iter_graph():
-            if not subnode.identifier.startswith(base_identifier):
+        return base.identifier not in self.__zipunsafe_table()
+
+    def zipunsafe_report(self) -> typing.Dict[str, typing.Dict[str, str]]:
+        """
+        Return why packages will be kept outside of the zip archive:
+        a mapping from toplevel package name to a mapping from the
+        identifiers of the modules that caused this to the reason
+        (for example "uses __file__").
+
+        Packages that are explicitly marked as zipsafe are not
+        included, even if some of their modules are not.
+        """
+        report = {}
+        for name, reasons in sorted(self.__zipunsafe_table().items()):
+            base = self.find_node(name)
+            if base is not None and base.extension_attributes.get(ATTR_ZIPSAFE) is True:
                 continue
+            report[name] = dict(reasons)
+        return report
+
+    def __adjacency(self) -> typing.Dict[str, typing.Set[str]]:
+        """
+        Return a mapping from node identifiers to the identifiers
+        of nodes with an incoming edge from that node.
+        """
+        adjacency: typing.Dict[str, typing.Set[str]] = {
+            identifier: set() for identifier in self._nodes
+        }
+        for source, destination in self._edges:
+            adjacency[source].add(destination)
+        return adjacency
+
+    def __reachable(
+        self, adjacency: typing.Dict[str, typing.Set[str]]
+    ) -> typing.Set[str]:
+        """
+        Return the identifiers of nodes reachable from the graph roots
+        """
+        reachable = set(self._roots)
+        todo = list(self._roots)
+        while todo:
+            for identifier in adjacency[todo.pop()]:
+                if identifier not in reachable:
+                    reachable.add(identifier)
+                    todo.append(identifier)
+        return reachable
+
+    def prune_dead_imports(self, target: Target) -> PruneResult:
+        """
+        Remove import edges that can never be followed on *target*,
+        and then remove the nodes that are no longer reachable from
+        the graph roots.
+
+        Only edges for conditional imports are removed, and only
+        when all imports of the name in the importing module are in
+        branches that are dead on *target*, such as imports guarded
+        by ``typing.TYPE_CHECKING`` or ``sys.platform == "win32"``.
+        """
+        result = PruneResult()
+
+        # The graph is traversed using an adjacency map because
+        # *outgoing* and *iter_graph* have to scan all edges of the
+        # graph for every node.
+        adjacency = self.__adjacency()
+        reachable = self.__reachable(adjacency)
+
+        for identifier in sorted(reachable):
+            node = self._nodes[identifier]
+            if isinstance(node, Package):
+                source_node = node.init_module
+                package: typing.Optional[str] = node.identifier
+            elif isinstance(node, SourceModule):
+                source_node = node
+                package = node.identifier.rpartition(".")[0]
+            elif isinstance(node, Script):
+                source_node = node
+                package = None
+            else:
+                continue
+
+            if (
+                not isinstance(source_node, (SourceModule, Script))
+                or source_node.filename is None
+            ):
+                continue
+
+            try:
+                source = source_node.filename.read_bytes()
+            except OSError:
+                continue
+
+            if not may_have_guards(source):
+                # Avoid parsing modules without guards
+                continue
+
+            try:
+                tree = ast.parse(source, str(source_node.filename))
+            except (SyntaxError, ValueError):
+                continue
+
+            dead = dead_imports(tree, package, target)
+            if not dead:
+                continue
+
+            for imported in adjacency[identifier] & dead:
+                # Edges added by recipes and implied dependencies
+                # are never optional.
+                if not all(
+                    isinstance(edge, DependencyInfo) and edge.is_optional
+                    for edge in self._edges[(identifier, imported)]
+                ):
+                    continue
+
+                del self._edges[(identifier, imported)]
+                adjacency[identifier].discard(imported)
+                result.edges += 1
+
+        if not result.edges:
+            return result
+
+        removed = self.__remove_unreachable(reachable, adjacency)
+        result.nodes = len(removed)
+        result.bytes = sum(_node_size(node) for node in removed)
+        return result
+
+    def __remove_unreachable(
+        self, reachable: typing.Set[str], adjacency: typing.Dict[str, typing.Set[str]]
+    ) -> typing.List[typing.Union[BaseNode, PyPIDistribution]]:
+        """
+        Remove the nodes in *reachable* that are no longer reachable
+        from the graph roots, and return the removed nodes. Nodes that
+        were already unreachable are left alone.
+        """
+        removed = reachable - self.__reachable(adjacency)
+        nodes = [self._nodes.pop(identifier) for identifier in removed]
+        self.__zipunsafe = None
+        for node in nodes:
+            self.__index_node(node, -1)
+
+        for key in [
+            key for key in self._edges if key[0] in removed or key[1] in removed
+        ]:
+            del self._edges[key]
+
+        return nodes
+
+    def subgraph(self, roots: typing.Iterable[str]) -> "ModuleGraph":
+        """
+        Return a new graph with the part of this graph that is
+        reachable from *roots*, which must be nodes in this graph.
+
+        The nodes in the new graph are copies, updating their
+        extension attributes does not affect this graph.
+        """
+        adjacency = self.__adjacency()
+
+        roots = set(roots)
+        reachable = set(roots)
+        todo = list(roots)
+        while todo:
+            for identifier in adjacency[todo.pop()]:
+                if identifier not in reachable:
+                    reachable.add(identifier)
+                    todo.append(identifier)
+
+        nodes = {
+            identifier: _copy_node(self._nodes[identifier]) for identifier in reachable
+        }
+        for node in nodes.values():
+            # Refer to the copies of nodes referenced by other nodes
+            for attr, cls in (
+                ("actual_module", AliasNode),
+                ("providing_module", VirtualNode),
+            ):
+                if not isinstance(node, cls):
+                    continue
+                referenced = getattr(node, attr)
+                if isinstance(referenced, BaseNode) and referenced.identifier in nodes:
+                    setattr(node, attr, nodes[referenced.identifier])
+
+        result = ModuleGraph()
+        result.restore_scan_state(
+            {
+                "roots": roots,
+                "nodes": nodes,
+                "edges": {
+                    key: set(value)
+                    for key, value in self._edges.items()
+                    if key[0] in reachable
+                },
+                "post_processing_seen": set(self._post_processing_seen),
+                "global_lazy_nodes": dict(self._global_lazy_nodes),
+            }
+        )
+        return result
+
+    def scan_state(self) -> typing.Dict[str, typing.Any]:
+        """
+        Return the state of the graph that is needed to
+        continue with a copy of the graph in a later build.
+
+        Hooks are not part of the state.
+        """
+        return {
+            "roots": self._roots,
+            "nodes": self._nodes,
+            "edges": self._edges,
+            "post_processing_seen": self._post_processing_seen,
+            "global_lazy_nodes": self._global_lazy_nodes,
+        }
+
+    def restore_scan_state(self, state: typing.Dict[str, typing.Any]) -> None:
+        """
+        Replace the contents of the graph by *state*, which was
+        returned by *scan_state*. The hooks of the graph are kept.
+        """
+        self.__initial_lazy_nodes = dict(self._global_lazy_nodes)
+
+        self._roots = state["roots"]
+        self._nodes = state["nodes"]
+        self._edges = state["edges"]
+        self._post_processing_seen = state["post_processing_seen"]
+        self._global_lazy_nodes = state["global_lazy_nodes"]
+
+        self.__zipunsafe = None
+        self.__distributions = {}
+        for node in self._nodes.values():
+            self.__index_node(node, 1)
+
+    def rescan(self, identifiers: typing.Iterable[str]) -> None:
+        """
+        Replace the nodes for *identifiers* by loading them again,
+        for example because their source code changed. Imports in
+        the new nodes are processed, and nodes that are no longer
+        reachable are removed from the graph.
+
+        Incoming edges of the replaced nodes are kept.
+        """
+        adjacency = self.__adjacency()
+        reachable = self.__reachable(adjacency)
+
+        for identifier in identifiers:
+            node = self.find_node(identifier)
+            if node is None:
+                continue
+
+            incoming = [
+                (source, edges)
+                for (source, destination), edges in self._edges.items()
+                if destination == identifier
+            ]
+            is_root = identifier in self._roots
+
+            self.remove_node(identifier)
+            self._post_processing_seen.discard(identifier)
+            if identifier in self.__initial_lazy_nodes:
+                # Implied actions are removed when they are used
+                self._global_lazy_nodes[identifier] = self.__initial_lazy_nodes[
+                    identifier
+                ]
+
+            new_node: BaseNode
+            if isinstance(node, Script):
+                assert node.filename is not None
+                new_node = self._load_script(node.filename)
+            else:
+                new_node = self._find_or_load_module(None, identifier)
+
+            for source, edges in incoming:
+                if source in self._nodes:
+                    for edge in edges:
+                        self.add_edge(source, new_node, edge)
+
+            if is_root:
+                self.add_root(new_node)
 
-            if subnode.extension_attributes.get(ATTR_ZIPSAFE, None) is False:
-                base.extension_attributes[ATTR_ZIPSAFE] = False
-                return False
+            self._run_stack()
 
-        base.extension_attributes[ATTR_ZIPSAFE] = True
-        return True
+        self.__remove_unreachable(reachable, self.__adjacency())
 
     def collect_nodes(
         self,
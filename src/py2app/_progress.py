@@ -1,30 +1,142 @@
+import contextlib
+import dataclasses
+import json
+import os
+import pathlib
+import threading
+import time
 import typing
 
+import rich.console
 import rich.progress
 
 T = typing.TypeVar("T")
 
 
+@dataclasses.dataclass
+class Span:
+    """
+    Timing information for a task or other unit of work.
+
+    Times are in nanoseconds, *cpu_start* and *cpu_end* are the
+    CPU time of the process (all threads) and *process* and *thread*
+    identify the process and thread that started the span.
+    """
+
+    name: str
+    category: str
+    process: int
+    thread: int
+    start: int
+    cpu_start: int
+    end: typing.Optional[int] = None
+    cpu_end: typing.Optional[int] = None
+
+    def close(self) -> None:
+        if self.end is None:
+            self.end = time.perf_counter_ns()
+            self.cpu_end = time.process_time_ns()
+
+    @property
+    def wall_time(self) -> float:
+        """Wall clock time in seconds"""
+        end = time.perf_counter_ns() if self.end is None else self.end
+        return (end - self.start) / 1e9
+
+    @property
+    def cpu_time(self) -> float:
+        """CPU time in seconds"""
+        end = time.process_time_ns() if self.cpu_end is None else self.cpu_end
+        return (end - self.cpu_start) / 1e9
+
+
 class Progress:
-    def __init__(self, level: int = 1) -> None:
+    def __init__(self, level: int = 1, *, live: bool = True) -> None:
+        # *live* is false for builds in worker processes, those
+        # only print messages.
         self._progress = rich.progress.Progress(
             *rich.progress.Progress.get_default_columns()[:-1],
             rich.progress.TimeElapsedColumn(),
             rich.progress.TextColumn("{task.fields[current]}"),
             transient=True,
+            disable=not live,
         )
         self._progress.start()
         self._level = level
         self.have_error = False
 
+        self._epoch = time.perf_counter_ns()
+        self._spans: typing.List[Span] = []
+        self._task_spans: typing.Dict[rich.progress.TaskID, Span] = {}
+        self._lock = threading.Lock()
+
     def stop(self) -> None:
         self._progress.stop()
 
+    @property
+    def level(self) -> int:
+        return self._level
+
+    @property
+    def spans(self) -> typing.List[Span]:
+        """
+        All spans recorded so far, in the order they were started
+        """
+        with self._lock:
+            return list(self._spans)
+
+    def add_spans(self, spans: typing.Iterable[Span]) -> None:
+        """
+        Add spans recorded by another *Progress* instance,
+        for example in a worker process.
+        """
+        with self._lock:
+            self._spans.extend(spans)
+
+    def _start_span(self, name: str, category: str) -> Span:
+        span = Span(
+            name=name,
+            category=category,
+            process=os.getpid(),
+            thread=threading.get_ident(),
+            start=time.perf_counter_ns(),
+            cpu_start=time.process_time_ns(),
+        )
+        with self._lock:
+            self._spans.append(span)
+        return span
+
+    def _end_task_span(self, task_id: rich.progress.TaskID) -> None:
+        span = self._task_spans.pop(task_id, None)
+        if span is not None:
+            span.close()
+            self.trace(
+                f"{span.name}: {span.wall_time:.2f}s wall, {span.cpu_time:.2f}s CPU"
+            )
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = "span") -> typing.Iterator[Span]:
+        """
+        Record the wall and CPU time for the body of the
+        with statement, without showing it in the progress
+        display. Spans can be nested and used from other threads.
+        """
+        span = self._start_span(name, category)
+        try:
+            yield span
+        finally:
+            span.close()
+
     def add_task(self, name: str, count: int | None) -> rich.progress.TaskID:
-        return self._progress.add_task(name, total=count, current="", start=True)
+        task_id = self._progress.add_task(name, total=count, current="", start=True)
+        self._task_spans[task_id] = self._start_span(name, "task")
+        return task_id
 
     def step_task(self, task_id: rich.progress.TaskID) -> None:
         self._progress.advance(task_id)
+        task = self._progress.tasks[task_id]
+        if task.total is not None and task.completed >= task.total:
+            self._end_task_span(task_id)
 
     def iter_task(
         self, items: typing.Sequence[T], label: str, current: typing.Callable[[T], str]
@@ -37,6 +149,7 @@ class Progress:
             self.step_task(task_id)
 
         self.update(task_id, current="")
+        self._end_task_span(task_id)
 
     def update(self, task_id: rich.progress.TaskID, **kwds: typing.Any) -> None:
         self._progress.update(task_id, **kwds)
@@ -45,16 +158,63 @@ class Progress:
         task = self._progress.tasks[task_id]
         if task.total is None:
             self._progress.update(task_id, total=task.completed, current="")
+        self._end_task_span(task_id)
+
+    def trace_events(self) -> typing.List[typing.Dict[str, typing.Any]]:
+        """
+        Return the recorded spans as a list of "complete" events in
+        the Chrome trace event format. Spans that are still open are
+        reported up to the current time.
+        """
+        now = time.perf_counter_ns()
+        cpu_now = time.process_time_ns()
+
+        events = []
+        for span in self.spans:
+            end = now if span.end is None else span.end
+            cpu_end = cpu_now if span.cpu_end is None else span.cpu_end
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": (span.start - self._epoch) / 1000,
+                    "dur": (end - span.start) / 1000,
+                    "pid": span.process,
+                    "tid": span.thread,
+                    "args": {"cpu_ms": (cpu_end - span.cpu_start) / 1e6},
+                }
+            )
+        return events
+
+    def write_profile(self, path: pathlib.Path) -> None:
+        """
+        Write the recorded spans to *path* as a trace event file,
+        which can be loaded into chrome://tracing or Perfetto.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as stream:
+            json.dump(
+                {"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, stream
+            )
 
     def print(  # noqa: A003
-        self, message: str, *, highlight: typing.Optional[bool] = None
+        self,
+        message: rich.console.RenderableType,
+        *,
+        highlight: typing.Optional[bool] = None,
     ) -> None:
         if highlight is not None:
             self._progress.print(message, highlight=highlight)
         else:
             self._progress.print(message)
 
-    def info(self, message: str, *, highlight: typing.Optional[bool] = None) -> None:
+    def info(
+        self,
+        message: rich.console.RenderableType,
+        *,
+        highlight: typing.Optional[bool] = None,
+    ) -> None:
         if self._level >= 1:
             self.print(message, highlight=highlight)
 
@@ -0,0 +1,244 @@
+"""
+Static analysis of import statements that can never be
+executed in a bundle.
+
+A bundle only runs on macOS, which means that imports guarded
+by tests for other platforms are dead code. The same is true
+for imports guarded by ``typing.TYPE_CHECKING``. This module
+evaluates the guards of ``if`` statements for a *Target* and
+reports which imported names only occur in dead branches.
+
+Guards that cannot be evaluated statically keep both branches
+alive.
+"""
+
+__all__ = ("Target", "dead_imports", "evaluate_guard", "may_have_guards")
+
+import ast
+import dataclasses
+import typing
+
+# Byte strings that must occur in the source of a module
+# for it to contain a guard that can be evaluated.
+_GUARD_MARKERS = (
+    b"TYPE_CHECKING",
+    b"sys.platform",
+    b"os.name",
+    b"platform.system",
+    b"platform.machine",
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class Target:
+    """
+    Description of the system the bundle runs on, using the
+    values of the expressions that are evaluated in guards.
+
+    *machine* is None when the bundle supports more than one
+    architecture.
+    """
+
+    platform: str = "darwin"
+    os_name: str = "posix"
+    system: str = "Darwin"
+    machine: typing.Optional[str] = None
+
+
+def may_have_guards(source: bytes) -> bool:
+    """
+    Cheap test if *source* may contain a guard that can
+    be evaluated statically.
+    """
+    return any(marker in source for marker in _GUARD_MARKERS)
+
+
+def _dotted_name(expr: ast.expr) -> typing.Optional[str]:
+    """
+    Return the dotted name for a chain of attribute
+    lookups (e.g. ``sys.platform``), or None.
+    """
+    parts = []
+    while isinstance(expr, ast.Attribute):
+        parts.append(expr.attr)
+        expr = expr.value
+    if not isinstance(expr, ast.Name):
+        return None
+    parts.append(expr.id)
+    return ".".join(reversed(parts))
+
+
+def _known_value(expr: ast.expr, target: Target) -> typing.Optional[str]:
+    """
+    Return the value of *expr* on *target* if it is one of the
+    expressions whose value is known, or None.
+    """
+    if isinstance(expr, ast.Call):
+        if expr.args or expr.keywords:
+            return None
+        name = _dotted_name(expr.func)
+        if name == "platform.system":
+            return target.system
+        elif name == "platform.machine":
+            return target.machine
+        return None
+
+    name = _dotted_name(expr)
+    if name == "sys.platform":
+        return target.platform
+    elif name == "os.name":
+        return target.os_name
+    return None
+
+
+def _string_constants(expr: ast.expr) -> typing.Optional[typing.List[str]]:
+    """
+    Return the strings in a string constant, or a tuple, list
+    or set of string constants. Returns None for other expressions.
+    """
+    if isinstance(expr, ast.Constant) and isinstance(expr.value, str):
+        return [expr.value]
+
+    if isinstance(expr, (ast.Tuple, ast.List, ast.Set)):
+        values = []
+        for elt in expr.elts:
+            if not isinstance(elt, ast.Constant) or not isinstance(elt.value, str):
+                return None
+            values.append(elt.value)
+        return values
+
+    return None
+
+
+def _evaluate_compare(expr: ast.Compare, target: Target) -> typing.Optional[bool]:
+    if len(expr.ops) != 1:
+        return None
+
+    left, op, right = expr.left, expr.ops[0], expr.comparators[0]
+    if isinstance(op, (ast.Eq, ast.NotEq)):
+        value = _known_value(left, target)
+        constants = _string_constants(right)
+        if value is None or constants is None:
+            # Also support ``"win32" == sys.platform``
+            value = _known_value(right, target)
+            constants = _string_constants(left)
+        if value is None or constants is None or len(constants) != 1:
+            return None
+        return (value == constants[0]) == isinstance(op, ast.Eq)
+
+    elif isinstance(op, (ast.In, ast.NotIn)):
+        value = _known_value(left, target)
+        constants = _string_constants(right)
+        if value is None or constants is None or isinstance(right, ast.Constant):
+            # "x in 'string'" is a substring test, not supported.
+            return None
+        return (value in constants) == isinstance(op, ast.In)
+
+    return None
+
+
+def evaluate_guard(expr: ast.expr, target: Target) -> typing.Optional[bool]:
+    """
+    Return the value of the guard *expr* on *target*, or None when
+    the value cannot be determined statically.
+    """
+    if isinstance(expr, ast.Name):
+        return False if expr.id == "TYPE_CHECKING" else None
+
+    elif isinstance(expr, ast.Attribute):
+        return False if expr.attr == "TYPE_CHECKING" else None
+
+    elif isinstance(expr, ast.UnaryOp) and isinstance(expr.op, ast.Not):
+        value = evaluate_guard(expr.operand, target)
+        return None if value is None else not value
+
+    elif isinstance(expr, ast.BoolOp):
+        values = [evaluate_guard(value, target) for value in expr.values]
+        if isinstance(expr.op, ast.And):
+            if False in values:
+                return False
+            return True if all(values) else None
+        else:
+            if True in values:
+                return True
+            return False if all(value is False for value in values) else None
+
+    elif isinstance(expr, ast.Compare):
+        return _evaluate_compare(expr, target)
+
+    elif isinstance(expr, ast.Call) and isinstance(expr.func, ast.Attribute):
+        # ``sys.platform.startswith("win")``
+        if expr.func.attr == "startswith" and len(expr.args) == 1 and not expr.keywords:
+            known = _known_value(expr.func.value, target)
+            constants = _string_constants(expr.args[0])
+            if known is None or constants is None:
+                return None
+            return known.startswith(tuple(constants))
+
+    return None
+
+
+def _imported_names(
+    stmt: typing.Union[ast.Import, ast.ImportFrom], package: typing.Optional[str]
+) -> typing.Iterator[str]:
+    """
+    Yield the absolute names of the modules that can be imported by
+    *stmt*, including the names in the name list of a "from" import.
+    *package* is the package used to resolve relative imports.
+    """
+    if isinstance(stmt, ast.Import):
+        for alias in stmt.names:
+            yield alias.name
+        return
+
+    if stmt.level:
+        if not package:
+            return
+        parts = package.rsplit(".", stmt.level - 1)
+        if len(parts) != stmt.level:
+            # Relative import beyond the toplevel package
+            return
+        base = parts[0]
+        module = f"{base}.{stmt.module}" if stmt.module else base
+    else:
+        assert stmt.module is not None
+        module = stmt.module
+
+    yield module
+    for alias in stmt.names:
+        if alias.name != "*":
+            yield f"{module}.{alias.name}"
+
+
+def dead_imports(
+    tree: ast.Module, package: typing.Optional[str], target: Target
+) -> typing.Set[str]:
+    """
+    Return the absolute names of modules that are only imported
+    in branches of *tree* that are never executed on *target*.
+
+    *package* is the name of the package containing the module,
+    or the name of the package itself for a package ``__init__``.
+    """
+    live: typing.Set[str] = set()
+    dead: typing.Set[str] = set()
+
+    todo: typing.List[typing.Tuple[ast.AST, bool]] = [(tree, False)]
+    while todo:
+        node, is_dead = todo.pop()
+
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            (dead if is_dead else live).update(_imported_names(node, package))
+            continue
+
+        if isinstance(node, ast.If) and not is_dead:
+            value = evaluate_guard(node.test, target)
+            todo.extend((child, value is False) for child in node.body)
+            todo.extend((child, value is True) for child in node.orelse)
+            continue
+
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.stmt, ast.excepthandler, ast.match_case)):
+                todo.append((child, is_dead))
+
+    return dead - live
@@ -5,4 +5,12 @@ All submodules from this package must be
 imported in __init__
 """
 
-from . import lxml, opencv, platformdirs, sphinx, stdlib, truststore  # noqa: F401
+from . import (  # noqa: F401
+    dunder_file,
+    lxml,
+    opencv,
+    platformdirs,
+    sphinx,
+    stdlib,
+    truststore,
+)
@@ -0,0 +1,36 @@
+from modulegraph2 import Package, SourceModule
+
+from .._config import RecipeOptions
+from .._dunderfile import REWRITABLE, UNSAFE
+from .._modulegraph import ModuleGraph
+from .._recipes import recipe
+
+
+@recipe("rewrite __file__ uses for package data")
+def rewrite_dunder_file(graph: ModuleGraph, options: RecipeOptions) -> None:
+    """
+    Modules in a package that only use ``__file__`` to read package
+    data through ``pathlib.Path(__file__).parent`` can be executed
+    from a zip archive when those uses are rewritten to use
+    ``importlib.resources``.
+    """
+    for node in list(graph.nodes()):
+        if isinstance(node, Package):
+            source = node.init_module
+        elif isinstance(node, SourceModule) and "." in node.identifier:
+            source = node
+        else:
+            # Toplevel modules have no package to
+            # load resources from.
+            continue
+
+        if not isinstance(source, SourceModule) or not source.uses_dunder_file:
+            continue
+
+        uses = graph.file_uses(node)
+        if (
+            uses
+            and all(use.kind != UNSAFE for use in uses)
+            and any(use.kind == REWRITABLE for use in uses)
+        ):
+            graph.rewrite_file_uses(node)
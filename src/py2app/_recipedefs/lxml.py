@@ -29,4 +29,4 @@ def lxml(graph: ModuleGraph, options: RecipeOptions) -> None:
 
     m = graph.find_node("lxml.isoschematron")
     if m is not None:
-        graph.mark_zipunsafe(m)
+        graph.mark_zipunsafe(m, "lxml recipe: loads schema files using __file__")
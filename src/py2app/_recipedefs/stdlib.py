@@ -2,11 +2,15 @@
 Recipes related to the standard library
 """
 
-import importlib.resources
+import ast
+import encodings
+import encodings.aliases
+import importlib.util
 import pathlib
 import sys
 import textwrap
 import typing
+from itertools import chain
 
 from modulegraph2 import (
     BaseNode,
@@ -14,11 +18,14 @@ from modulegraph2 import (
     MissingModule,
     NamespacePackage,
     Package,
+    Script,
+    SourceModule,
 )
 
 from .._config import RecipeOptions, Resource
 from .._modulegraph import ATTR_ZIPSAFE, ModuleGraph
 from .._recipes import recipe
+from .._resources import contains_dylib
 
 # References between modules in the standard
 # library that should be ignored when building
@@ -83,16 +90,146 @@ def _mods(
     return tuple(v[0] for v in values)
 
 
+# Codecs included for the "minimal" preset of the "encodings"
+# recipe option, in addition to codecs found in the graph.
+#
+# "cp437" is the default encoding for member names in zipfile,
+# which is used to read python-libraries.zip at runtime (including
+# by importlib.resources and importlib.metadata).
+MINIMAL_ENCODINGS = ("utf-8", "ascii", "latin-1", "cp437")
+
+
+def _string_constants(node: ast.expr) -> typing.Iterator[str]:
+    """
+    Yield the string constants that are possible values
+    of expression *node*, e.g. "cp437" for
+    ``self.encoding or "cp437"``.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        yield node.value
+    elif isinstance(node, ast.BoolOp):
+        for value in node.values:
+            yield from _string_constants(value)
+    elif isinstance(node, ast.IfExp):
+        yield from _string_constants(node.body)
+        yield from _string_constants(node.orelse)
+
+
+def _codec_literals(tree: ast.AST) -> typing.Iterator[str]:
+    """
+    Yield the string constants used as codec names in *tree*: arguments
+    for ``.encode()`` and ``.decode()``, ``encoding=`` keyword arguments
+    and defaults for parameters named "encoding".
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            if (
+                isinstance(node.func, ast.Attribute)
+                and node.func.attr in ("encode", "decode")
+                and node.args
+            ):
+                yield from _string_constants(node.args[0])
+
+            for keyword in node.keywords:
+                if keyword.arg is not None and keyword.arg.endswith("encoding"):
+                    yield from _string_constants(keyword.value)
+
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            arguments = node.args
+            positional = arguments.posonlyargs + arguments.args
+
+            # Defaults are for the last positional parameters
+            for arg, default in chain(
+                zip(reversed(positional), reversed(arguments.defaults)),
+                zip(arguments.kwonlyargs, arguments.kw_defaults),
+            ):
+                if default is not None and arg.arg.endswith("encoding"):
+                    yield from _string_constants(default)
+
+
+ATTR_CODEC_NAMES = "py2app.codec_names"
+
+
+def codec_module(name: str) -> typing.Optional[str]:
+    """
+    Return the name of the module in the *encodings* package
+    that implements codec *name*, or None if there is no
+    such module.
+
+    This uses the same lookup as :func:`encodings.search_function`.
+    """
+    normalized = encodings.normalize_encoding(name.lower())
+    module = (
+        encodings.aliases.aliases.get(normalized)
+        or encodings.aliases.aliases.get(normalized.replace(".", "_"))
+        or normalized
+    )
+    if not module.isidentifier():
+        return None
+
+    if importlib.util.find_spec(f"encodings.{module}") is None:
+        return None
+    return f"encodings.{module}"
+
+
+def codec_names(node: BaseNode) -> typing.FrozenSet[str]:
+    """
+    Return the codec names used as string literals in the source
+    code for *node*. The result is cached in the node.
+    """
+    try:
+        return node.extension_attributes[ATTR_CODEC_NAMES]
+    except KeyError:
+        pass
+
+    source_node = node.init_module if isinstance(node, Package) else node
+    names: typing.FrozenSet[str] = frozenset()
+    if (
+        isinstance(source_node, (SourceModule, Script))
+        and source_node.filename is not None
+    ):
+        try:
+            tree = ast.parse(
+                source_node.filename.read_bytes(), str(source_node.filename)
+            )
+        except (OSError, SyntaxError, ValueError):
+            pass
+        else:
+            names = frozenset(_codec_literals(tree))
+
+    node.extension_attributes[ATTR_CODEC_NAMES] = names
+    return names
+
+
 @recipe("ensure encodings are included")
 def ensure_encodings(graph: ModuleGraph, options: RecipeOptions) -> None:
     # Python's unicode machinery can import encodings in the background,
-    # prefer loading the entire package to avoid confusion.
-    #
-    # XXX: Add RecipeOptions to control which encodings get included,
-    #      minimal set would be ascii and utf-8. Reason for this: the
-    #      encodings package is 2.5 MB (uncompressed).
+    # without an explicit list of encodings the entire package is
+    # included to avoid confusion (the encodings package is 2.5 MB
+    # uncompressed).
     node = graph.add_module("encodings")
-    graph.import_package(node, "encodings")
+    if options.encodings is None:
+        graph.import_package(node, "encodings")
+        return
+
+    requested: typing.Set[str] = set()
+    for name in options.encodings:
+        if name == "minimal":
+            requested.update(MINIMAL_ENCODINGS)
+        else:
+            requested.add(name)
+
+    for subnode in list(graph.nodes()):
+        if isinstance(subnode, BaseNode):
+            requested.update(codec_names(subnode))
+
+    for name in sorted(requested):
+        module = codec_module(name)
+        if module is None:
+            # Not a codec, or a codec that's not in
+            # the encodings package.
+            continue
+        graph.import_module(node, module)
 
 
 @recipe("clean stdlib references", modules=_mods(UNNEEDED_REFS))
@@ -146,27 +283,6 @@ def mark_expected_missing(graph: ModuleGraph, options: RecipeOptions) -> None:
                 graph.set_expected_missing(m2)
 
 
-def _contains_dylib(resources: importlib.resources.abc.Traversable) -> bool:
-    """
-    Return true if *resources* contains a dylib somewhere in
-    the resource tree.
-    """
-    if resources.is_file():
-        return resources.name.endswith(".dylib")
-
-    todo = list(resources.iterdir())
-    while todo:
-        current = todo.pop()
-        if current.is_file():
-            if current.name.endswith(".dylib"):
-                return True
-            continue
-
-        for child in current.iterdir():
-            todo.append(child)
-    return False
-
-
 @recipe("fixup for ctypes", modules=["ctypes"])
 def use_prescript_for_importlib(graph: ModuleGraph, options: RecipeOptions) -> None:
     m = graph.find_node("ctypes")
@@ -196,9 +312,10 @@ def use_prescript_for_importlib(graph: ModuleGraph, options: RecipeOptions) -> N
             # Toplevel module, cannot have package data.
             continue
 
-        package_resources = importlib.resources.files(package.name)
-        if _contains_dylib(package_resources):
-            graph.mark_zipunsafe(using_module)
+        if contains_dylib(package):
+            graph.mark_zipunsafe(
+                using_module, "ctypes recipe: package contains a dynamic library"
+            )
 
     graph.add_bootstrap(m, "py2app.bootstrap:setup_ctypes.py")
 
@@ -16,11 +16,14 @@ Support for recipes
   recipes out of tree.
 """
 
+import collections
 import dataclasses
 import typing
 
 import packaging
 import packaging.specifiers
+from modulegraph2 import BaseNode, PyPIDistribution
+from packaging.utils import canonicalize_name
 
 from ._config import RecipeOptions
 from ._modulegraph import ModuleGraph
@@ -49,8 +52,17 @@ class RecipeInfo:
     # should be reachable for the recipe to trigger.
     modules: typing.Sequence[str] = ()
 
+    # The compiled form of 'version_spec'
+    specifier: typing.Optional[packaging.specifiers.SpecifierSet] = dataclasses.field(
+        init=False, default=None, repr=False
+    )
 
-RECIPE_REGISTRY = []
+    def __post_init__(self) -> None:
+        if self.version_spec is not None:
+            self.specifier = packaging.specifiers.SpecifierSet(self.version_spec, True)
+
+
+RECIPE_REGISTRY: typing.List[RecipeInfo] = []
 
 
 def recipe(
@@ -81,20 +93,14 @@ def iter_recipes(graph: ModuleGraph) -> typing.Iterator[RecipeInfo]:
     Yield all recipes that are relevant for the *graph*
     """
 
-    # Collecting the distributions is fairly expensive, but must
-    # be done very time this function is called because the graph
-    # may have been changed between uses.
-    distributions = {d.name: d.version for d in graph.distributions()}
-
     for recipe in RECIPE_REGISTRY:
         if recipe.distribution is not None:
-            if recipe.distribution not in distributions:
+            distribution = graph.find_distribution(recipe.distribution)
+            if distribution is None:
                 continue
 
-            if recipe.version_spec is not None:
-                if distributions[
-                    recipe.distribution
-                ] not in packaging.specifiers.SpecifierSet(recipe.version_spec, True):
+            if recipe.specifier is not None:
+                if distribution.version not in recipe.specifier:
                     continue
 
         if recipe.modules:
@@ -108,32 +114,115 @@ def iter_recipes(graph: ModuleGraph) -> typing.Iterator[RecipeInfo]:
         yield recipe
 
 
+@dataclasses.dataclass
+class RecipeStats:
+    """
+    Statistics for a recipe in a *process_recipes* call
+    """
+
+    runs: int = 0
+    seconds: float = 0.0
+
+
+def _is_triggered_by(
+    recipe: RecipeInfo, nodes: typing.Iterable[typing.Union[BaseNode, PyPIDistribution]]
+) -> bool:
+    """
+    Return true if adding *nodes* to the graph can affect
+    the result of *recipe*: the nodes match a guard of the
+    recipe, or the recipe doesn't have guards.
+    """
+    if recipe.distribution is None and not recipe.modules:
+        return True
+
+    distribution = (
+        canonicalize_name(recipe.distribution)
+        if recipe.distribution is not None
+        else None
+    )
+    for node in nodes:
+        if distribution is not None:
+            if isinstance(node, PyPIDistribution):
+                if canonicalize_name(node.name) == distribution:
+                    return True
+            elif (
+                node.distribution is not None
+                and canonicalize_name(node.distribution.name) == distribution
+            ):
+                return True
+
+        for name in recipe.modules:
+            if node.identifier == name or node.identifier.startswith(f"{name}."):
+                return True
+
+    return False
+
+
 def process_recipes(
     graph: ModuleGraph, options: RecipeOptions, progress: Progress
-) -> None:
+) -> typing.Dict[str, RecipeStats]:
     """
-    Run all recipes that are relevant for *graph*
+    Run all recipes that are relevant for *graph*, and return
+    statistics per recipe.
 
-    Recipes will be evaluated multiple times because
-    recipes might update the graph, which might require
-    other recipes to be (re)run
+    Every relevant recipe runs once. When a recipe adds nodes
+    to the graph, the recipes whose guards match those nodes run
+    again, as do recipes that became relevant.
     """
     task_id = progress.add_task("Processing recipes", count=None)
 
+    stats: typing.Dict[str, RecipeStats] = {}
+    has_run: typing.Set[int] = set()
+
+    queue = collections.deque(iter_recipes(graph))
+    queued = {id(recipe) for recipe in queue}
+
     steps = 0
-    while True:
-        with graph.tracked_changes() as tracker:
-            for recipe in iter_recipes(graph):
-                progress.update(task_id, current=recipe.name)
-                progress.step_task(task_id)
-                steps += 1
+    while queue:
+        recipe = queue.popleft()
+        queued.discard(id(recipe))
 
+        progress.update(task_id, current=recipe.name)
+        progress.step_task(task_id)
+        steps += 1
+
+        with graph.tracked_changes() as tracker:
+            with progress.span(recipe.name, "recipe") as span:
                 recipe.callback(graph, options)
 
-        if tracker.updated:
-            progress.info(f"Recipe {recipe.name!r} updated the dependency graph")
-        else:
-            break
+        has_run.add(id(recipe))
+        recipe_stats = stats.setdefault(recipe.name, RecipeStats())
+        recipe_stats.runs += 1
+        recipe_stats.seconds += span.wall_time
+
+        if not tracker.updated:
+            continue
+
+        progress.info(f"Recipe {recipe.name!r} updated the dependency graph")
+        if not tracker.added:
+            # Recipe guards only depend on the presence of nodes
+            continue
+
+        added = [
+            node
+            for node in map(graph.find_node, sorted(tracker.added))
+            if node is not None
+        ]
+        for candidate in iter_recipes(graph):
+            if id(candidate) in queued:
+                continue
+            if id(candidate) not in has_run or _is_triggered_by(candidate, added):
+                queue.append(candidate)
+                queued.add(id(candidate))
 
     progress.update(task_id, count=steps, current="")
     progress.task_done(task_id)
+
+    for name, recipe_stats in sorted(
+        stats.items(), key=lambda item: item[1].seconds, reverse=True
+    ):
+        progress.trace(
+            f"Recipe {name!r}: {recipe_stats.runs} runs, "
+            f"{recipe_stats.seconds:.3f}s"
+        )
+    return stats
@@ -0,0 +1,104 @@
+"""
+Locating package resources (data files) for nodes in
+the module graph.
+
+This uses the package search path recorded by modulegraph2
+and never imports the package itself, which avoids running
+user code in the build process.
+"""
+
+__all__ = ("contains_dylib", "iter_resources", "resource_roots")
+
+import os
+import pathlib
+import typing
+
+from modulegraph2 import NamespacePackage, Package
+
+# XXX: What to do about ".dylib" (and the ".dylibs" folder in a lot of wheels...)
+# XXX: Recipes should be able to affect this:
+#      - Exclude/include specific resources (e.g. email/architecture.rst)
+#      - Mark packages as not having resources
+# XXX: Should do something with filesystem rights bits as well?
+EXCL_EXTENSIONS = {
+    ".py",
+    ".pyi",
+    ".so",
+}
+EXCL_NAMES = {".svn", "__pycache__"}
+
+
+def resource_roots(
+    node: typing.Union[Package, NamespacePackage]
+) -> typing.List[pathlib.Path]:
+    """
+    Return the directories that can contain resources
+    for *node*.
+
+    Packages that are not stored in the filesystem (for
+    example packages in a zipfile) don't have resource
+    directories.
+    """
+    return [p for p in node.search_path if p.is_dir()]
+
+
+def _is_excluded(name: str) -> bool:
+    return any(name.endswith(ext) for ext in EXCL_EXTENSIONS)
+
+
+def iter_resources(
+    node: typing.Union[Package, NamespacePackage]
+) -> typing.Iterator[typing.Tuple[str, pathlib.Path]]:
+    """
+    Yield (relative name, path) for all resources in a package,
+    including those in subdirectories.
+
+    Subdirectories that contain Python code are assumed to be
+    subpackages and are skipped.
+    """
+    for root in resource_roots(node):
+        with os.scandir(root) as it:
+            entries = sorted(it, key=lambda e: e.name)
+
+        for entry in entries:
+            if entry.name in EXCL_NAMES or _is_excluded(entry.name):
+                continue
+
+            if entry.is_file():
+                yield entry.name, pathlib.Path(entry.path)
+
+            elif entry.is_dir():
+                # A resource directory could also be a subpackage. Only
+                # include subresources when the resource itself doesn't contain
+                # python files.
+                with os.scandir(entry.path) as it:
+                    children = sorted(it, key=lambda e: e.name)
+
+                if any(_is_excluded(child.name) for child in children):
+                    continue
+
+                todo = [(entry.name, child) for child in reversed(children)]
+                while todo:
+                    relpath, current = todo.pop()
+                    if current.is_file():
+                        yield f"{relpath}/{current.name}", pathlib.Path(current.path)
+                    elif current.is_dir():
+                        with os.scandir(current.path) as it:
+                            todo.extend(
+                                (f"{relpath}/{current.name}", child)
+                                for child in sorted(
+                                    it, key=lambda e: e.name, reverse=True
+                                )
+                            )
+
+
+def contains_dylib(node: typing.Union[Package, NamespacePackage]) -> bool:
+    """
+    Return true if the package directory for *node* contains
+    a dylib somewhere in the tree.
+    """
+    for root in resource_roots(node):
+        for _dirpath, _dirs, files in os.walk(root):
+            if any(fn.endswith(".dylib") for fn in files):
+                return True
+    return False
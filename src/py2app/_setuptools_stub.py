@@ -694,16 +694,7 @@ class py2app(Command):
         print(self.config)
 
         progress = _progress.Progress()
-        task_id = progress.add_task("Processing bundles", len(self.config.bundles))
-
-        for bundle in self.config.bundles:
-            progress.update(
-                task_id,
-                current=f"{bundle.build_type.value} {'plugin' if bundle.plugin else 'application'} {bundle.name!r}",
-            )
-            _builder.build_bundle(self.config, bundle, progress)
-            progress.step_task(task_id)
-        progress.update(task_id, current="")
+        _builder.build_bundles(self.config, progress)
         progress._progress.stop()
 
         if progress.have_error:
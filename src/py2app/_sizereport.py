@@ -0,0 +1,336 @@
+"""
+Reporting where the bytes in a bundle come from.
+
+*size_report* attributes every file in a bundle, and every
+member of the Python library archive, to a distribution, a
+toplevel package that is not part of a distribution, a native
+library or to the bundle itself (launcher, resources, ...).
+"""
+
+__all__ = (
+    "SizeEntry",
+    "SizeReport",
+    "check_size_budget",
+    "format_size",
+    "print_size_report",
+    "size_report",
+)
+
+import dataclasses
+import json
+import os
+import pathlib
+import typing
+import zipfile
+
+import rich.table
+from modulegraph2 import BaseNode, PyPIDistribution
+from packaging.utils import canonicalize_name
+
+from ._bundlepaths import BundlePaths
+from ._modulegraph import ModuleGraph
+from ._progress import Progress
+
+KIND_DISTRIBUTION = "distribution"
+KIND_PACKAGE = "package"
+KIND_NATIVE = "native"
+KIND_BUNDLE = "bundle"
+
+# Key in a size budget for the size of the entire bundle
+BUDGET_TOTAL = "total"
+
+_Owner = typing.Tuple[str, str]
+
+
+@dataclasses.dataclass
+class SizeEntry:
+    """
+    Size information for one owner of files in a bundle.
+
+    *size* is the uncompressed size, *stored_size* the number
+    of bytes used in the bundle. *zip_size* and *fs_size* split
+    the stored size in bytes in the Python library archive and
+    bytes in regular files.
+    """
+
+    kind: str
+    name: str
+    files: int = 0
+    size: int = 0
+    stored_size: int = 0
+    zip_size: int = 0
+    fs_size: int = 0
+
+    def add(self, size: int, stored_size: int, *, in_zip: bool) -> None:
+        self.files += 1
+        self.size += size
+        self.stored_size += stored_size
+        if in_zip:
+            self.zip_size += stored_size
+        else:
+            self.fs_size += stored_size
+
+
+@dataclasses.dataclass
+class SizeReport:
+    """
+    Size information for a bundle, *total* is the size of
+    all files in the bundle.
+    """
+
+    entries: typing.List[SizeEntry]
+    total: int
+
+    def to_json(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "total": self.total,
+            "entries": [dataclasses.asdict(entry) for entry in self.entries],
+        }
+
+    def write(self, path: pathlib.Path) -> None:
+        """
+        Write the report to *path* in JSON format
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as stream:
+            json.dump(self.to_json(), stream, indent=1)
+
+
+class _Owners:
+    """
+    Map paths in the Python library to their owner,
+    using the distribution of nodes in the graph.
+    """
+
+    def __init__(self, graph: ModuleGraph) -> None:
+        self._graph = graph
+        self._cache: typing.Dict[str, _Owner] = {}
+        self._dist_info: typing.Dict[str, str] = {
+            canonicalize_name(dist.name): dist.name
+            for dist in graph.nodes()
+            if isinstance(dist, PyPIDistribution)
+        }
+
+    def for_module(self, name: str) -> _Owner:
+        """
+        Return the owner for the module or package *name*,
+        which need not be in the graph.
+        """
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+
+        owner: _Owner
+        node = self._graph.find_node(name)
+        if isinstance(node, BaseNode) and node.distribution is not None:
+            owner = (KIND_DISTRIBUTION, node.distribution.name)
+        elif "." in name:
+            owner = self.for_module(name.rpartition(".")[0])
+        elif name == "bundle-scripts":
+            owner = (KIND_BUNDLE, "scripts")
+        else:
+            owner = (KIND_PACKAGE, name)
+
+        self._cache[name] = owner
+        return owner
+
+    def for_path(self, relpath: str) -> _Owner:
+        """
+        Return the owner for a path relative to the root
+        of the Python library.
+        """
+        parts = relpath.split("/")
+        if parts[0].endswith(".dist-info"):
+            name = parts[0].removesuffix(".dist-info").partition("-")[0]
+            return (
+                KIND_DISTRIBUTION,
+                self._dist_info.get(canonicalize_name(name), name),
+            )
+
+        if parts[-1] == "__init__.pyc":
+            del parts[-1]
+        elif parts[-1].endswith((".pyc", ".so")):
+            parts[-1] = parts[-1].rpartition(".")[0]
+        else:
+            # Package resource
+            del parts[-1]
+
+        return self.for_module(".".join(parts)) if parts else (KIND_BUNDLE, "other")
+
+
+def _iter_files(root: pathlib.Path) -> typing.Iterator[typing.Tuple[str, int]]:
+    """
+    Yield (relative path, size) for all files below *root*,
+    without following symbolic links.
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        reldir = os.path.relpath(dirpath, root)
+        for fn in sorted(filenames):
+            size = os.lstat(os.path.join(dirpath, fn)).st_size
+            yield (fn if reldir == "." else f"{reldir}/{fn}"), size
+
+        # Symbolic links to directories are reported as files
+        for dn in list(dirnames):
+            if os.path.islink(os.path.join(dirpath, dn)):
+                dirnames.remove(dn)
+                size = os.lstat(os.path.join(dirpath, dn)).st_size
+                yield (dn if reldir == "." else f"{reldir}/{dn}"), size
+
+
+def size_report(paths: BundlePaths, graph: ModuleGraph) -> SizeReport:
+    """
+    Return the size report for the bundle at *paths*, whose
+    Python code is described by *graph*.
+    """
+    owners = _Owners(graph)
+    entries: typing.Dict[_Owner, SizeEntry] = {}
+
+    def add(owner: _Owner, size: int, stored_size: int, *, in_zip: bool) -> None:
+        try:
+            entry = entries[owner]
+        except KeyError:
+            entry = entries[owner] = SizeEntry(*owner)
+        entry.add(size, stored_size, in_zip=in_zip)
+
+    if paths.pylib_zipped.exists():
+        overhead = paths.pylib_zipped.stat().st_size
+        with zipfile.ZipFile(paths.pylib_zipped) as zf:
+            for zinfo in zf.infolist():
+                if zinfo.is_dir():
+                    continue
+                add(
+                    owners.for_path(zinfo.filename),
+                    zinfo.file_size,
+                    zinfo.compress_size,
+                    in_zip=True,
+                )
+                overhead -= zinfo.compress_size
+
+        # Headers and the central directory
+        entries[(KIND_BUNDLE, "archive overhead")] = SizeEntry(
+            KIND_BUNDLE, "archive overhead", 1, overhead, overhead, overhead, 0
+        )
+
+    total = 0
+    for relpath, size in _iter_files(paths.root):
+        total += size
+        path = paths.root / relpath
+
+        if path == paths.pylib_zipped:
+            # Archive members are handled above
+            continue
+
+        elif path.is_relative_to(paths.pylib):
+            owner = owners.for_path(path.relative_to(paths.pylib).as_posix())
+
+        elif path.is_relative_to(paths.extlib):
+            owner = owners.for_path(path.relative_to(paths.extlib).as_posix())
+
+        elif path.is_relative_to(paths.framework):
+            owner = (KIND_NATIVE, path.relative_to(paths.framework).parts[0])
+
+        else:
+            owner = (KIND_BUNDLE, relpath.partition("/")[0])
+
+        add(owner, size, size, in_zip=False)
+
+    return SizeReport(
+        entries=sorted(
+            entries.values(), key=lambda e: (-e.stored_size, e.kind, e.name)
+        ),
+        total=total,
+    )
+
+
+def check_size_budget(
+    report: SizeReport, budget: typing.Dict[str, int]
+) -> typing.List[str]:
+    """
+    Return messages for the items in *budget* that are exceeded
+    in *report*. The budget maps distribution names, or "total"
+    for the entire bundle, to a size in bytes.
+    """
+    stored = {
+        canonicalize_name(entry.name): entry.stored_size
+        for entry in report.entries
+        if entry.kind == KIND_DISTRIBUTION
+    }
+
+    messages = []
+    for name, limit in sorted(budget.items()):
+        if name == BUDGET_TOTAL:
+            label = "The bundle"
+            actual = report.total
+        else:
+            label = f"Distribution {name!r}"
+            actual = stored.get(canonicalize_name(name), 0)
+
+        if actual > limit:
+            messages.append(
+                f"{label} uses {format_size(actual)}, "
+                f"the budget is {format_size(limit)}"
+            )
+    return messages
+
+
+def format_size(size: float) -> str:
+    """
+    Return a human readable representation of *size* bytes
+    """
+    for unit in ("B", "kB", "MB"):
+        if size < 1000:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1000
+    return f"{size:.1f} GB"
+
+
+def print_size_report(report: SizeReport, progress: Progress, limit: int = 20) -> None:
+    """
+    Print the *limit* largest entries of the size report as
+    a table.
+    """
+    table = rich.table.Table(title="Bundle size", title_justify="left")
+    table.add_column("Kind")
+    table.add_column("Name")
+    table.add_column("Files", justify="right")
+    table.add_column("Size", justify="right")
+    table.add_column("Stored", justify="right")
+    table.add_column("In archive", justify="right")
+    table.add_column("Outside archive", justify="right")
+
+    for entry in report.entries[:limit]:
+        table.add_row(
+            entry.kind,
+            entry.name,
+            str(entry.files),
+            format_size(entry.size),
+            format_size(entry.stored_size),
+            format_size(entry.zip_size),
+            format_size(entry.fs_size),
+        )
+
+    rest = report.entries[limit:]
+    if rest:
+        table.add_row(
+            "",
+            f"{len(rest)} more",
+            str(sum(entry.files for entry in rest)),
+            format_size(sum(entry.size for entry in rest)),
+            format_size(sum(entry.stored_size for entry in rest)),
+            format_size(sum(entry.zip_size for entry in rest)),
+            format_size(sum(entry.fs_size for entry in rest)),
+        )
+
+    table.add_section()
+    table.add_row(
+        "",
+        "Total",
+        str(sum(entry.files for entry in report.entries)),
+        "",
+        format_size(report.total),
+        "",
+        "",
+    )
+    progress.info(table)
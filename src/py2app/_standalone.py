@@ -19,7 +19,11 @@ copies dependent Mach-O libraries into a bundle.
 
 __all__ = ("macho_standalone", "set_deployment_target", "rewrite_libpython")
 
+import concurrent.futures
 import contextlib
+import dataclasses
+import heapq
+import multiprocessing
 import os
 import pathlib
 import shutil
@@ -29,27 +33,29 @@ import typing
 
 import macholib.mach_o
 import macholib.MachO
-from macholib.util import in_system_path, is_platform_file
+from macholib.util import in_system_path
 
 from ._bundlepaths import BundlePaths
-from ._config import BundleOptions
+from ._config import BuildArch, BundleOptions
+from ._incremental import StagingTree, stage_file
+from ._machofiles import MachOFileTable, MachOModel
 from ._modulegraph import ModuleGraph
 from ._progress import Progress
+from ._thinning import thin_binaries
 
+# Minimal number of files to rewrite before using worker
+# processes, starting workers is not free.
+MIN_PARALLEL_REWRITES = 8
 
-def iter_platform_files(path: pathlib.Path) -> typing.Iterator[pathlib.Path]:
+
+def iter_platform_files(
+    path: pathlib.Path, files: typing.Optional[MachOFileTable] = None
+) -> typing.Iterator[pathlib.Path]:
     """
-    Yield all Mach-O files in the tree starting at *path*
+    Yield all Mach-O files in the tree starting at *path*,
+    using *files* to avoid checking files that were seen before.
     """
-    for root_str, _dirs, files in os.walk(path):
-        root = pathlib.Path(root_str)
-        for fn in files:
-            current = root / fn
-            if current.is_symlink():
-                continue
-
-            if is_platform_file(str(current)):
-                yield current
+    yield from (files if files is not None else MachOFileTable()).iter_files(path)
 
 
 @contextlib.contextmanager
@@ -66,10 +72,14 @@ def writable(path: pathlib.Path) -> typing.Iterator[None]:
         path.chmod(mode)
 
 
-def rewrite_headers(path: pathlib.Path, macho: macholib.MachO.MachO) -> None:
+def rewrite_headers(
+    path: pathlib.Path,
+    macho: macholib.MachO.MachO,
+    files: typing.Optional[MachOFileTable] = None,
+) -> None:
     """
     Rewrite the Mach-O headers for *path* using the (updated) information
-    in *macho*.
+    in *macho*, and update the entry for *path* in *files*.
     """
     with writable(path):
         with path.open("rb+") as fp:
@@ -79,6 +89,9 @@ def rewrite_headers(path: pathlib.Path, macho: macholib.MachO.MachO) -> None:
             fp.seek(0, 2)
             fp.flush()
 
+    if files is not None:
+        files.update(path, macho)
+
 
 def copy_library(src: pathlib.Path, dst: pathlib.Path) -> None:
     """
@@ -89,10 +102,15 @@ def copy_library(src: pathlib.Path, dst: pathlib.Path) -> None:
 
 
 def copy_framework(
-    src: pathlib.Path, dst: pathlib.Path, version: str = "Current"
+    src: pathlib.Path,
+    dst: pathlib.Path,
+    version: str = "Current",
+    staging: typing.Optional[StagingTree] = None,
 ) -> None:
     """
     Copy a framework at *src* to the folder *dst*, only including the specified version
+
+    Files are copied using *staging* when building incrementally.
     """
     if src.suffix != ".framework":
         raise RuntimeError("{src} is not a framework")
@@ -108,7 +126,10 @@ def copy_framework(
     dst = dst / "Versions" / version
     src = src / "Versions" / version
 
-    shutil.copytree(src, dst)
+    def copy_function(src: str, dst: str) -> None:
+        stage_file(pathlib.Path(src), pathlib.Path(dst), staging, shutil.copy2)
+
+    shutil.copytree(src, dst, copy_function=copy_function)
 
 
 def is_framework_path(path: pathlib.Path) -> bool:
@@ -142,16 +163,218 @@ def framework_info(path: pathlib.Path) -> typing.Tuple[pathlib.Path, str]:
     raise RuntimeError(f"Cannot determine framework info for {path}")
 
 
+@dataclasses.dataclass
+class _RewriteResult:
+    """
+    The result of rewriting the load commands of a Mach-O file:
+    the messages for the user as (level, message) and the model
+    for the updated file.
+    """
+
+    messages: typing.List[typing.Tuple[str, str]]
+    model: MachOModel
+
+
+def _needs_rewrite(
+    model: MachOModel, path: str, changes: typing.Dict[str, str]
+) -> bool:
+    """
+    Return True if *_rewrite_load_commands* would change the
+    file at *path* described by *model*.
+    """
+    for header in model.headers:
+        if header.install_name is not None and header.install_name != changes[path]:
+            return True
+
+        if any(changes.get(name, name) != name for _cmd, name in header.dylibs):
+            return True
+
+        if any(not rpath.startswith("@") for rpath in header.rpaths):
+            return True
+
+    return False
+
+
+def _rewrite_load_commands(
+    path: pathlib.Path, changes: typing.Dict[str, str]
+) -> _RewriteResult:
+    """
+    Rewrite the load commands of *path* using the mapping
+    *changes*, and replace LC_RPATH entries that refer
+    to absolute paths.
+
+    This function is called in worker processes and therefore
+    returns the messages instead of reporting them.
+    """
+    messages: typing.List[typing.Tuple[str, str]] = []
+    m = macholib.MachO.MachO(str(path))
+
+    def changefunc(name: str) -> str:
+        result = changes.get(name, name)
+        if result != name:
+            messages.append(("trace", f"{path}: Rewrite {name} to {result}"))
+        return result
+
+    changed = m.rewriteLoadCommands(changefunc)
+
+    # Check for LC_RPATH entries that refer to absolute paths, those result in bundles
+    # that can load libraries outside of the bundle. Seen in at least one wheel on PyPI.
+    for header in m.headers:
+        for idx, (lc, cmd, data) in enumerate(header.commands):
+            if lc.cmd == macholib.mach_o.LC_RPATH:
+                assert isinstance(cmd, macholib.mach_o.rpath_command)
+                rpath = macholib.MachO.lc_str_value(cmd.path, (lc, cmd, data)).decode()
+                if rpath.startswith("@"):
+                    continue
+
+                messages.append(
+                    (
+                        "warning",
+                        f"{str(path)!r}: replacing non-portable LC_RPATH entry {rpath!r}",
+                    )
+                )
+                header.rewriteDataForCommand(idx, b"@executable_path/../Frameworks")
+
+                changed = True
+
+    if changed:
+        rewrite_headers(path, m)
+    return _RewriteResult(messages, MachOModel.from_macho(m))
+
+
+def _discover_dependencies(
+    paths: BundlePaths,
+    progress: Progress,
+    files: MachOFileTable,
+    staging: typing.Optional[StagingTree] = None,
+) -> typing.Dict[pathlib.Path, typing.Dict[str, str]]:
+    """
+    Copy the Mach-O files that are needed by the Mach-O files in
+    the bundle into the bundle, and return the mapping from
+    referenced library paths to their new load path for every
+    Mach-O file in the bundle.
+
+    Files are processed in sorted order to get a reproducible
+    order of messages.
+
+    With *staging* copies from the previous build are reused, the
+    load commands for those are read from their source because the
+    copy has already been rewritten.
+    """
+    todo = sorted(iter_platform_files(paths.root, files))
+    queued = set(todo)
+    heapq.heapify(todo)
+    result: typing.Dict[pathlib.Path, typing.Dict[str, str]] = {}
+    task_id = progress.add_task("Copy MachO dependencies", count=len(todo))
+
+    def add(path: pathlib.Path) -> None:
+        if path not in queued:
+            queued.add(path)
+            heapq.heappush(todo, path)
+            progress.update(task_id, total=len(queued))
+
+    while todo:
+        current = heapq.heappop(todo)
+        progress.step_task(task_id)
+        progress.update(task_id, current=current)
+
+        with progress.span(current.name, "macho"):
+            changes = {str(current): f"@rpath/{current.name}"}
+            result[current] = changes
+            source = staging.reused_source(current) if staging is not None else None
+            for header in files.model(
+                source if source is not None else current
+            ).headers:
+                for _cmd, name in header.dylibs:
+                    if in_system_path(name):
+                        continue
+
+                    if name.startswith("@loader_path/"):
+                        filename = current.parent / name.partition("/")[2]
+                        if not filename.exists():
+                            progress.error(
+                                f"Required MachO library file {filename} does not exist"
+                            )
+                            continue
+                        continue
+
+                    filename = pathlib.Path(name)
+
+                    if not filename.exists():
+                        progress.error(
+                            f"Required MachO library file {filename} does not exist"
+                        )
+                        continue
+
+                    if is_framework_path(filename):
+                        fwk, version = framework_info(filename)
+                        rpath = f"@rpath/{fwk.name}/Versions/{version}/{fwk.stem}"
+
+                        if str(fwk / "Versions" / version) == sys.base_prefix:
+                            # Python framework, perform a minimal copy to avoid including
+                            # the entire standard library.
+                            #
+                            # The code copies the embedded Python library as if
+                            # it were a libpython.dylib.
+                            target_path = paths.framework / f"libpython{version}.dylib"
+                            rpath = f"@rpath/{target_path.name}"
+
+                            changes[str(filename)] = rpath
+
+                            if target_path not in queued:
+                                stage_file(filename, target_path, staging, copy_library)
+                                add(target_path)
+
+                            continue
+
+                        changes[str(filename)] = rpath
+
+                        if not (fwk / "Versions" / version).is_dir():
+                            copy_framework(fwk, paths.framework, version, staging)
+
+                            # Only the copied framework can contain
+                            # new Mach-O files.
+                            for p in iter_platform_files(
+                                paths.framework / fwk.name, files
+                            ):
+                                add(p)
+
+                    else:
+                        target_path = paths.framework / filename.name
+                        rpath = f"@rpath/{filename.name}"
+
+                        changes[str(filename)] = rpath
+
+                        if target_path not in queued:
+                            stage_file(filename, target_path, staging, copy_library)
+                            add(target_path)
+
+    progress.update(task_id, current="")
+    progress.task_done(task_id)
+    return result
+
+
 def macho_standalone(
     paths: BundlePaths,
     graph: ModuleGraph,
     bundle: BundleOptions,
     ext_map: typing.Dict[pathlib.Path, pathlib.Path],
     progress: Progress,
+    files: typing.Optional[MachOFileTable] = None,
+    jobs: int = 1,
+    staging: typing.Optional[StagingTree] = None,
 ) -> None:
     """
     Integrate dependent shared libraries into the bundle.
 
+    *files* is used to find Mach-O files in the bundle, and
+    should be shared with later phases of the build. With
+    more than one job the load commands are rewritten in
+    up to *jobs* worker processes. With *staging* copies of
+    libraries and frameworks from the previous build are
+    reused when their source and the changes to the copy
+    are the same.
+
     This will:
         - Copy shared libraries into the 'Frameworks' directory
           of the bundle;
@@ -160,6 +383,8 @@ def macho_standalone(
           recipes!)
         - Set the link path in load commands to a path starting
           with '@rpath'
+        - Remove other architectures from universal binaries when
+          building for a single architecture
     """
     # XXX:
     # - 'Excludes'
@@ -173,134 +398,100 @@ def macho_standalone(
     #
     # XXX: What if "Python.framework" is in "includes" or "excludes"?
     # XXX: Logic for dealing with "excludes"
+    if files is None:
+        files = MachOFileTable()
+
     include = {pathlib.Path(p) for p in bundle.macho_include}
     # exclude = {pathlib.Path(p) for p in bundle.macho_exclude}
 
     for fn in include:
         if fn.stem == ".framework":
-            copy_framework(fn, paths.framework / fn.name)
+            copy_framework(fn, paths.framework / fn.name, staging=staging)
 
         else:
-            copy_library(fn, paths.framework / fn.name)
-
-    todo = set(iter_platform_files(paths.root))
-    seen = set()
-    task_id = progress.add_task("Copy MachO dependencies", count=len(todo))
-
-    while todo:
-        current = todo.pop()
-        progress.step_task(task_id)
-        progress.update(task_id, current=current)
-
-        seen.add(current)
-        m = macholib.MachO.MachO(str(current))
-        changes = {str(current): f"@rpath/{current.name}"}
-        for header in m.headers:
-            for _idx, _name, filename in header.walkRelocatables():
-                if in_system_path(filename):
-                    continue
-
-                if filename.startswith("@loader_path/"):
-                    filename = pathlib.Path(current.parent / filename.partition("/")[2])
-                    if not filename.exists():
-                        progress.error(
-                            f"Required MachO library file {filename} does not exist"
-                        )
-                        continue
-                    continue
-
-                filename = pathlib.Path(filename)
-
-                if not filename.exists():
-                    progress.error(
-                        f"Required MachO library file {filename} does not exist"
-                    )
-                    continue
-
-                if is_framework_path(filename):
-                    fwk, version = framework_info(filename)
-                    rpath = f"@rpath/{fwk.name}/Versions/{version}/{fwk.stem}"
-
-                    if str(fwk / "Versions" / version) == sys.base_prefix:
-                        # Python framework, perform a minimal copy to avoid including
-                        # the entire standard library.
-                        #
-                        # The code copies the embedded Python library as if
-                        # it were a libpython.dylib.
-                        target_path = paths.framework / f"libpython{version}.dylib"
-                        rpath = f"@rpath/{target_path.name}"
-
-                        changes[str(filename)] = rpath
-
-                        if target_path not in seen and target_path not in todo:
-                            todo.add(target_path)
-                            progress.update(task_id, total=len(todo) + len(seen))
-                            copy_library(filename, target_path)
-
-                        continue
-
-                    changes[str(filename)] = rpath
-
-                    if not (fwk / "Versions" / version).is_dir():
-                        copy_framework(fwk, paths.framework, version)
-                        for p in iter_platform_files(paths.root):
-                            if p not in seen and p not in todo:
-                                todo.add(p)
-                                progress.update(task_id, total=len(todo) + len(seen))
-
-                else:
-                    target_path = paths.framework / filename.name
-                    rpath = f"@rpath/{filename.name}"
-
-                    changes[str(filename)] = rpath
-
-                    if target_path not in seen and target_path not in todo:
-                        todo.add(target_path)
-                        progress.update(task_id, total=len(todo) + len(seen))
-                        copy_library(filename, target_path)
-
-        def changefunc(name: str) -> str:
-            result = changes.get(name, name)  # noqa: B023
-            if result != name:
-                progress.trace(f"{current}: Rewrite {name} to {result}")  # noqa: B023
-            return result
-
-        changed = m.rewriteLoadCommands(changefunc)
-
-        # Check for LC_RPATH entries that refer to absolute paths, those result in bundles
-        # that can load libraries outside of the bundle. Seen in at least one wheel on PyPI.
-        for header in m.headers:
-            for idx, (lc, cmd, data) in enumerate(header.commands):
-                if lc.cmd == macholib.mach_o.LC_RPATH:
-                    assert isinstance(cmd, macholib.mach_o.rpath_command)
-                    path = macholib.MachO.lc_str_value(
-                        cmd.path, (lc, cmd, data)
-                    ).decode()
-                    if path.startswith("@"):
-                        continue
-
-                    progress.warning(
-                        f"{str(current)!r}: replacing non-portable LC_RPATH entry {path!r}"
-                    )
-                    header.rewriteDataForCommand(idx, b"@executable_path/../Frameworks")
-
-                    changed = True
+            stage_file(fn, paths.framework / fn.name, staging, copy_library)
+
+    # Phase 1: copy all dependencies into the bundle, this
+    # determines the changes for every Mach-O file.
+    all_changes = _discover_dependencies(paths, progress, files, staging)
+
+    if staging is not None:
+        # Thinning and rewriting the load commands only depend on
+        # these inputs, and leave files that are already processed
+        # unchanged.
+        for path, changes in sorted(all_changes.items()):
+            staging.processed(
+                path, {"arch": bundle.macho_arch.value, "changes": changes}
+            )
+
+    if bundle.macho_arch != BuildArch.UNIVERSAL2:
+        thin_binaries(sorted(all_changes), bundle.macho_arch.value, progress, files)
+
+    # Phase 2: rewrite the load commands. Files are independent
+    # of each other at this point.
+    work = [
+        (path, changes)
+        for path, changes in sorted(all_changes.items())
+        if _needs_rewrite(files.model(path), str(path), changes)
+    ]
+    task_id = progress.add_task("Rewrite MachO load commands", count=len(work))
+
+    executor: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None
+    if jobs > 1 and len(work) >= MIN_PARALLEL_REWRITES:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            min(jobs, len(work)), mp_context=multiprocessing.get_context("spawn")
+        )
+    try:
+        futures: typing.List["concurrent.futures.Future[_RewriteResult]"] = []
+        for path, changes in work:
+            if executor is not None:
+                futures.append(executor.submit(_rewrite_load_commands, path, changes))
+            else:
+                future: "concurrent.futures.Future[_RewriteResult]" = (
+                    concurrent.futures.Future()
+                )
+                try:
+                    future.set_result(_rewrite_load_commands(path, changes))
+                except Exception as exc:
+                    future.set_exception(exc)
+                futures.append(future)
+
+        # Report in the order of *work*, independent of the
+        # order in which the workers finish.
+        for (path, _), future in zip(work, futures):
+            progress.update(task_id, current=path)
+            try:
+                rewrite_result = future.result()
+            except Exception as exc:
+                progress.error(f"{path}: cannot rewrite load commands: {exc}")
+            else:
+                for level, message in rewrite_result.messages:
+                    if level == "warning":
+                        progress.warning(message)
+                    else:
+                        progress.trace(message)
+                files.store(path, rewrite_result.model)
+            progress.step_task(task_id)
 
-        if changed:
-            rewrite_headers(current, m)
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
-    progress.update(task_id, current=None)
     progress.update(task_id, current="")
     progress.task_done(task_id)
 
 
-def get_libpython(path: pathlib.Path) -> pathlib.Path | None:
+def get_libpython(
+    path: pathlib.Path, files: typing.Optional[MachOFileTable] = None
+) -> pathlib.Path | None:
     """
     Return the libpython that 'path' was linked with.
     """
-    m = macholib.MachO.MachO(str(path))
-    for header in m.headers:
-        for _idx, _name, filename in header.walkRelocatables():
+    if files is None:
+        files = MachOFileTable()
+
+    for header in files.model(path).headers:
+        for _cmd, filename in header.dylibs:
             p = pathlib.Path(filename)
             if p.name == "Python":
                 return p
@@ -338,11 +529,15 @@ def rewrite_libpython(
     paths: BundlePaths,
     bundle: BundleOptions,
     progress: Progress,
+    files: typing.Optional[MachOFileTable] = None,
 ) -> None:
     """
     Rewrite the references to libpython in the bundle launchers to
     whichever libpython the current executable is linked with.
     """
+    if files is None:
+        files = MachOFileTable()
+
     system_path = get_system_libpython()
     if system_path is None:
         progress.error(
@@ -360,18 +555,18 @@ def rewrite_libpython(
         all_paths, "Rewrite reference to libpython in loader", lambda n: n.stem
     ):
         target = paths.main / path.stem
-        loader_path = get_libpython(target)
+        loader_path = get_libpython(target, files)
         if loader_path is None:
             progress.error(f"{target} is not linked to a python library")
             continue
 
         changes = {str(loader_path): str(system_path)}
 
-        m = macholib.MachO.MachO(str(target))
+        m = files.parse(target)
 
         changed = m.rewriteLoadCommands(changefunc)
         if changed:
-            rewrite_headers(target, m)
+            rewrite_headers(target, m, files)
 
 
 def set_deployment_target(
@@ -379,17 +574,21 @@ def set_deployment_target(
     bundle: BundleOptions,
     progress: Progress,
     deployment_target: str,
+    files: typing.Optional[MachOFileTable] = None,
 ) -> None:
     """
     Set the deployment target for stub executables to *deployment_target*
     """
+    if files is None:
+        files = MachOFileTable()
+
     all_paths = [bundle.script]
     all_paths.extend(bundle.extra_scripts)
     for path in progress.iter_task(
         all_paths, f"Set deployment target to {deployment_target}", lambda n: n.stem
     ):
         target = paths.main / path.stem
-        m = macholib.MachO.MachO(str(target))
+        m = files.parse(target)
 
         # major << 16 | minor << 8 | micro
         parts = [int(p) for p in deployment_target.split(".")]
@@ -408,4 +607,4 @@ def set_deployment_target(
                     changed = True
 
         if changed:
-            rewrite_headers(target, m)
+            rewrite_headers(target, m, files)
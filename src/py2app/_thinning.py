@@ -0,0 +1,158 @@
+"""
+Removing unused architectures from universal binaries.
+
+Universal binaries contain a complete Mach-O file for every
+supported architecture. When a bundle is built for a single
+architecture the other slices are dead weight, they roughly
+double the size of native code in the bundle and the time
+needed for code signing.
+
+*thin_file* extracts a single slice from a universal binary
+using the fat header structures from macholib, without depending
+on the ``lipo`` tool. This works on any platform.
+"""
+
+__all__ = ("thin_file", "thin_binaries")
+
+import os
+import pathlib
+import shutil
+import typing
+
+import macholib.mach_o
+
+from ._copyfile import CHUNK_SIZE
+from ._machofiles import MachOFileTable, scan_macho
+from ._progress import Progress
+
+# Capability bits in the CPU subtype, such as the pointer
+# authentication ABI flag for arm64e.
+_CPU_SUBTYPE_MASK = 0xFF000000
+
+
+def _fat_slices(
+    fp: typing.IO[bytes],
+) -> typing.Optional[typing.List[typing.Tuple[str, int, int, int]]]:
+    """
+    Return (architecture, subtype, offset, size) for the slices in
+    the universal binary *fp*, or None when *fp* is not a universal
+    binary. The subtype does not include the capability bits.
+    """
+    header = macholib.mach_o.fat_header.from_fileobj(fp)
+    if header.magic == macholib.mach_o.FAT_MAGIC:
+        archs: typing.Sequence[
+            typing.Union[macholib.mach_o.fat_arch, macholib.mach_o.fat_arch64]
+        ] = [macholib.mach_o.fat_arch.from_fileobj(fp) for _ in range(header.nfat_arch)]
+    elif header.magic == macholib.mach_o.FAT_MAGIC_64:
+        archs = [
+            macholib.mach_o.fat_arch64.from_fileobj(fp) for _ in range(header.nfat_arch)
+        ]
+    else:
+        return None
+
+    return [
+        (
+            macholib.mach_o.CPU_TYPE_NAMES.get(arch.cputype, str(arch.cputype)).lower(),
+            arch.cpusubtype & ~_CPU_SUBTYPE_MASK,
+            arch.offset,
+            arch.size,
+        )
+        for arch in archs
+    ]
+
+
+def thin_file(path: pathlib.Path, arch: str) -> typing.Optional[int]:
+    """
+    Replace the universal binary at *path* by its slice for
+    *arch*, and return the number of bytes saved.
+
+    Returns 0 when *path* is not a universal binary, and None
+    when it is a universal binary without a slice for *arch*.
+
+    When there are multiple slices for *arch* the one with the
+    lowest CPU subtype is kept, that is the generic variant of
+    the architecture (e.g. "arm64" instead of "arm64e").
+    """
+    with open(path, "rb") as fp:
+        slices = _fat_slices(fp)
+        if slices is None:
+            return 0
+
+        matches = [
+            (subtype, offset, size)
+            for name, subtype, offset, size in slices
+            if name == arch
+        ]
+        if not matches:
+            return None
+        _, offset, size = min(matches)
+
+        # Write the slice next to the file, and atomically
+        # replace the file when done.
+        tmp_path = path.with_name(f".{path.name}.thin")
+        try:
+            with open(tmp_path, "wb") as out:
+                fp.seek(offset)
+                remaining = size
+                while remaining:
+                    chunk = fp.read(min(remaining, CHUNK_SIZE))
+                    if not chunk:
+                        raise ValueError(f"{str(path)!r} is truncated")
+                    out.write(chunk)
+                    remaining -= len(chunk)
+
+            shutil.copymode(path, tmp_path)
+            saved = os.fstat(fp.fileno()).st_size - size
+            os.replace(tmp_path, path)
+
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    return saved
+
+
+def thin_binaries(
+    macho_paths: typing.Sequence[pathlib.Path],
+    arch: str,
+    progress: Progress,
+    files: MachOFileTable,
+) -> None:
+    """
+    Thin the universal binaries in *macho_paths* to *arch*,
+    and report the bytes saved per file.
+
+    *files* is used to find the universal binaries without
+    reading the files, and is updated with the model of the
+    thinned files.
+    """
+    universal = [path for path in macho_paths if len(files.model(path).headers) > 1]
+    if not universal:
+        return
+
+    total = 0
+    count = 0
+    for path in progress.iter_task(
+        universal, f"Thin universal binaries to {arch}", lambda p: p.name
+    ):
+        try:
+            saved = thin_file(path, arch)
+        except (OSError, ValueError) as exc:
+            progress.error(f"Cannot thin {str(path)!r}: {exc}")
+            continue
+
+        if saved is None:
+            progress.warning(f"{str(path)!r} does not contain code for {arch}")
+            continue
+
+        # Scan the thinned file to get the headers of the slice
+        # that was kept.
+        files.store(path, scan_macho(path))
+        progress.trace(f"{path}: removed {saved} bytes for other architectures")
+        total += saved
+        count += 1
+
+    progress.info(
+        f"Thinned {count} universal binaries to {arch}, saved {total} bytes",
+        highlight=False,
+    )
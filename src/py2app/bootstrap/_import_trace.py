@@ -0,0 +1,33 @@
+def _setup_import_trace() -> None:
+    import os
+    import sys
+
+    path = os.environ.get("PY2APP_IMPORT_TRACE")
+    if not path:
+        return
+
+    # The trace is written while importing to ensure that it is
+    # complete even when the process doesn't exit cleanly.
+    stream = open(path, "w", encoding="utf-8", buffering=1)
+    seen = set()
+
+    def record(name: str) -> None:
+        if name not in seen:
+            seen.add(name)
+            stream.write(f"{name}\n")
+
+    for name in list(sys.modules):
+        record(name)
+
+    class ImportTracer:
+        @staticmethod
+        def find_spec(
+            fullname: str, path: "object" = None, target: "object" = None
+        ) -> None:
+            record(fullname)
+            return None
+
+    sys.meta_path.insert(0, ImportTracer)  # type: ignore
+
+
+_setup_import_trace()
@@ -3,17 +3,25 @@
 import importlib
 import os
 import sys
-from importlib.abc import MetaPathFinder
+from importlib.abc import Loader, MetaPathFinder
+
+# Names of the extension modules in "lib-dynload", set by py2app
+# before this code. None means the names are not known.
+PY2APP_EXTENSIONS: "frozenset[str] | None"
 
 
 class Py2AppExtensionLoader(MetaPathFinder):
-    def __init__(self, libdir: str) -> None:
+    def __init__(self, libdir: str, names: "frozenset[str] | None") -> None:
         self._libdir = libdir
+        self._names = names
 
     # XXX: type annations would require importing typing
     def find_spec(self, fullname, path, target=None):  # type: ignore
         ext_path = f"{self._libdir}/{fullname}.so"
-        if not os.path.exists(ext_path):
+        if self._names is not None:
+            if fullname not in self._names:
+                return None
+        elif not os.path.exists(ext_path):
             return None
 
         loader = importlib.machinery.ExtensionFileLoader(fullname, ext_path)
@@ -22,6 +30,153 @@ class Py2AppExtensionLoader(MetaPathFinder):
         )
 
 
-for p in sys.path:
-    if p.endswith("/lib-dynload"):
-        sys.meta_path.insert(0, Py2AppExtensionLoader(p))
+def _install_extension_loaders() -> None:
+    # The names of extensions are only known for the
+    # "lib-dynload" folder in the bundle.
+    resources = getattr(sys, "py2app_bundle_resources", None)
+    bundle_libdir = f"{resources}/lib-dynload"
+
+    for p in sys.path:
+        if p.endswith("/lib-dynload"):
+            names = PY2APP_EXTENSIONS if p == bundle_libdir else None  # noqa: F821
+            sys.meta_path.insert(0, Py2AppExtensionLoader(p, names))
+
+
+_install_extension_loaders()
+
+
+# Importer for python-libraries.zip using the index written
+# by py2app, this avoids file I/O for every import and loads
+# code directly from a memory mapping of the archive.
+INDEX_VERSION = 1
+
+
+class Py2AppIndexedLoader(Loader):
+    def __init__(self, finder, fullname, entry, path):  # type: ignore
+        self._finder = finder
+        self._offset, self._length, self._is_package = entry
+        self._path = path
+        self.archive = finder.archive
+
+        # Compatible with zipimporter, used by importlib.readers.ZipReader
+        self.prefix = fullname.rpartition(".")[0].replace(".", "/")
+        if self.prefix:
+            self.prefix += "/"
+
+    def create_module(self, spec):  # type: ignore
+        return None
+
+    def exec_module(self, module):  # type: ignore
+        exec(self.get_code(module.__name__), module.__dict__)
+
+    def is_package(self, fullname):  # type: ignore
+        return self._is_package
+
+    def get_code(self, fullname):  # type: ignore
+        # Skip the 16 byte header of the ".pyc" data
+        return self._finder.load_code(self._offset + 16, self._length - 16)
+
+    def get_source(self, fullname):  # type: ignore
+        return None
+
+    def get_filename(self, fullname):  # type: ignore
+        return f"{self.archive}/{self._path}"
+
+    def get_data(self, pathname):  # type: ignore
+        return self._finder.get_data(pathname)
+
+    def get_resource_reader(self, fullname):  # type: ignore
+        if not self._is_package:
+            return None
+
+        from importlib.readers import ZipReader
+
+        return ZipReader(self, fullname)  # type: ignore
+
+
+class Py2AppIndexedImporter(MetaPathFinder):
+    def __init__(self, archive: str, index: str) -> None:
+        import marshal
+        import mmap
+
+        with open(index, "rb") as stream:
+            version, size, self._modules, self._files = marshal.loads(stream.read())
+
+        if version != INDEX_VERSION:
+            raise ImportError(f"Unsupported index version for {archive}")
+
+        with open(archive, "rb") as stream:
+            if os.fstat(stream.fileno()).st_size != size:
+                raise ImportError(f"Stale index for {archive}")
+
+            self._map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._view = memoryview(self._map)
+        self._loads = marshal.loads
+        self.archive = archive
+
+    def find_spec(self, fullname, path, target=None):  # type: ignore
+        entry = self._modules.get(fullname)
+        if entry is None:
+            return None
+
+        relpath = fullname.replace(".", "/")
+        if entry[2]:
+            filename = f"{relpath}/__init__.pyc"
+        else:
+            filename = f"{relpath}.pyc"
+
+        spec = importlib.machinery.ModuleSpec(
+            name=fullname,
+            loader=Py2AppIndexedLoader(self, fullname, entry, filename),
+            origin=f"{self.archive}/{filename}",
+            is_package=entry[2],
+        )
+        spec.has_location = True
+        if entry[2]:
+            spec.submodule_search_locations = [f"{self.archive}/{relpath}"]
+        return spec
+
+    def load_code(self, offset, length):  # type: ignore
+        end = offset + length
+        return self._loads(self._view[offset:end])
+
+    def get_data(self, pathname):  # type: ignore
+        relpath = pathname.removeprefix(self.archive + "/")
+        try:
+            offset, length = self._files[relpath]
+        except KeyError:
+            raise OSError(0, "", pathname) from None
+        end = offset + length
+        return self._map[offset:end]
+
+    def invalidate_caches(self) -> None:
+        pass
+
+
+def _install_indexed_importer() -> None:
+    for p in sys.path:
+        if not p.endswith("/python-libraries.zip"):
+            continue
+
+        index = p[: -len(".zip")] + ".idx"
+        if not os.path.exists(index):
+            continue
+
+        try:
+            finder = Py2AppIndexedImporter(p, index)
+        except (ImportError, OSError, ValueError, EOFError):
+            # Fall back to zipimport
+            continue
+
+        # Insert before the regular path based finder, which
+        # would use zipimport.
+        for idx, cur in enumerate(sys.meta_path):
+            if cur is importlib.machinery.PathFinder:
+                sys.meta_path.insert(idx, finder)
+                break
+        else:
+            sys.meta_path.append(finder)
+
+
+_install_indexed_importer()
@@ -8,7 +8,6 @@ def _run() -> None:
     global __file__
     import marshal
     import site  # noqa: F401
-    import zipfile
 
     base = sys.py2app_bundle_resources  # type: ignore[attr-defined]
 
@@ -18,7 +17,17 @@ def _run() -> None:
     path = f"{base}/python-libraries.zip/bundle-scripts/{script}"
     sys.argv[0] = __file__ = path
 
-    zf = zipfile.ZipFile(f"{base}/python-libraries.zip", "r")
-    source = zf.read(f"bundle-scripts/{script}")
+    archive = f"{base}/python-libraries.zip"
+    for finder in sys.meta_path:
+        # Use the indexed importer when available, this avoids
+        # reading the zipfile directory.
+        if getattr(finder, "archive", None) == archive:
+            source = finder.get_data(path)  # type: ignore[attr-defined]
+            break
+    else:
+        import zipfile
+
+        zf = zipfile.ZipFile(archive, "r")
+        source = zf.read(f"bundle-scripts/{script}")
 
     exec(marshal.loads(source[16:]), globals(), globals())
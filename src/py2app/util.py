@@ -14,11 +14,11 @@ import typing
 from py_compile import compile  # noqa: A004
 
 import macholib.util
-from macholib.util import is_platform_file
 from modulegraph import zipio
 from modulegraph.find_modules import PY_SUFFIXES
 from modulegraph.modulegraph import Node
 
+from ._machofiles import MachOFileTable
 from ._progress import Progress
 
 if sys.version_info[:2] < (3, 10):
@@ -646,12 +646,14 @@ def mapc(
         subprocess.check_call([get_tool("mapc"), os.fspath(src), os.fspath(dst)])
 
 
-def _macho_find(path: typing.Union[os.PathLike[str], str]) -> typing.Iterator[str]:
-    for basename, _dirs, files in os.walk(path):
-        for fn in files:
-            path = os.path.join(basename, fn)
-            if is_platform_file(path):
-                yield path
+def _macho_find(
+    path: typing.Union[os.PathLike[str], str],
+    table: typing.Optional[MachOFileTable] = None,
+) -> typing.Iterator[str]:
+    if table is None:
+        table = MachOFileTable()
+    for found in table.iter_files(path):
+        yield str(found)
 
 
 def _dosign(
@@ -681,7 +683,9 @@ def _dosign(
 
 
 def codesign_adhoc(
-    bundle: typing.Union[os.PathLike[str], str], progress: Progress
+    bundle: typing.Union[os.PathLike[str], str],
+    progress: Progress,
+    files: typing.Optional[MachOFileTable] = None,
 ) -> None:
     """
     (Re)sign a bundle
@@ -703,7 +707,7 @@ def codesign_adhoc(
     # except subprocess.CalledProcessError:
     #    pass
 
-    platfiles = list(_macho_find(bundle))
+    platfiles = list(_macho_find(bundle, files))
 
     task_id = progress.add_task("Signing code", len(platfiles) + 1)
     while platfiles:
@@ -711,7 +715,8 @@ def codesign_adhoc(
             failed = []
             try:
                 progress.trace(f"Signing {file}")
-                _dosign(file, progress=progress)
+                with progress.span(os.path.basename(file), "codesign"):
+                    _dosign(file, progress=progress)
                 progress.step_task(task_id)
             except subprocess.CalledProcessError:
                 progress.info(f"Signing {file} failed")
@@ -1,10 +1,29 @@
+import typing
+
 CPU_TYPE_NAMES: dict[int, str]
 LC_NAMES: dict[int, str]
 
 LC_VERSION_MIN_MACOSX = 0x24
+LC_VERSION_MIN_IPHONEOS = 0x25
+LC_VERSION_MIN_TVOS = 0x2F
+LC_VERSION_MIN_WATCHOS = 0x30
+LC_BUILD_VERSION = 0x32
 LC_ID_DYLIB = 0x00
+LC_LOAD_DYLIB = 0x0C
+LC_LOAD_WEAK_DYLIB = 0x80000018
+LC_REEXPORT_DYLIB = 0x8000001F
+LC_LAZY_LOAD_DYLIB = 0x20
+LC_LOAD_UPWARD_DYLIB = 0x80000023
+LC_PREBOUND_DYLIB = 0x10
 LC_RPATH = 0x00
 
+MH_MAGIC = 0xFEEDFACE
+MH_CIGAM = 0xCEFAEDFE
+MH_MAGIC_64 = 0xFEEDFACF
+MH_CIGAM_64 = 0xCFFAEDFE
+FAT_MAGIC = 0xCAFEBABE
+FAT_MAGIC_64 = 0xCAFEBABF
+
 
 class build_version_command:
     platform: int
@@ -27,3 +46,37 @@ class dylib_command:
 
 class rpath_command:
     path: int
+
+
+class fat_header:
+    magic: int
+    nfat_arch: int
+
+    @classmethod
+    def from_fileobj(cls, fileobj: typing.IO[bytes]) -> "fat_header":
+        raise NotImplementedError
+
+
+class fat_arch:
+    cputype: int
+    cpusubtype: int
+    offset: int
+    size: int
+    align: int
+
+    @classmethod
+    def from_fileobj(cls, fileobj: typing.IO[bytes]) -> "fat_arch":
+        raise NotImplementedError
+
+
+class fat_arch64:
+    cputype: int
+    cpusubtype: int
+    offset: int
+    size: int
+    align: int
+    reserved: int
+
+    @classmethod
+    def from_fileobj(cls, fileobj: typing.IO[bytes]) -> "fat_arch64":
+        raise NotImplementedError